@@ -0,0 +1,105 @@
+import bisect
+import collections
+import re
+from typing import List, Tuple, Dict
+
+from alignment import score_quality, example
+from alignment.approaches.approach_03 import align_span_sequences
+
+StringAlignment = Tuple[List[str], List[str]]
+Match = Tuple[int, int]
+
+
+def normalize_sentence(sentence: str) -> str:
+    # case, punctuation and whitespace differences do not make sentences different
+    return " ".join(re.sub(r"[^\w\s]", "", sentence.lower()).split())
+
+
+def find_exact_matches(sequence_1: List[str], sequence_2: List[str]) -> List[Match]:
+    # pairs of sentences that are identical after normalization and unique within both sequences
+    normalized_1 = [normalize_sentence(sentence) for sentence in sequence_1]
+    normalized_2 = [normalize_sentence(sentence) for sentence in sequence_2]
+    counts_1 = collections.Counter(normalized_1)
+    counts_2 = collections.Counter(normalized_2)
+    indices_2 = {sentence: j for j, sentence in enumerate(normalized_2) if counts_2[sentence] == 1}
+
+    return [
+        (i, indices_2[sentence])
+        for i, sentence in enumerate(normalized_1)
+        if sentence and counts_1[sentence] == 1 and sentence in indices_2
+    ]
+
+
+def longest_increasing_matches(matches: List[Match]) -> List[Match]:
+    # patience sorting over the sequence_2 indices of matches sorted by their sequence_1 indices
+    tail_values: List[int] = []
+    tail_indices: List[int] = []
+    previous_indices = [-1] * len(matches)
+    for index, (_, j) in enumerate(matches):
+        position = bisect.bisect_left(tail_values, j)
+        if position > 0:
+            previous_indices[index] = tail_indices[position - 1]
+        if position == len(tail_values):
+            tail_values.append(j)
+            tail_indices.append(index)
+        else:
+            tail_values[position] = j
+            tail_indices[position] = index
+
+    longest_matches = []
+    index = tail_indices[-1] if tail_indices else -1
+    while index != -1:
+        longest_matches.append(matches[index])
+        index = previous_indices[index]
+    return longest_matches[::-1]
+
+
+def align_sequences(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        seed_weights: Dict[str, float],
+        improvement_weights: Dict[str, float],
+) -> List[StringAlignment]:
+    matches = find_exact_matches(sequence_1, sequence_2)
+    anchors = longest_increasing_matches(matches)
+
+    # every exact match is aligned, but only the in-order ones split the sequences into gaps; the others were moved,
+    # so they are just taken out of the gaps they sit in
+    alignments = {i: ([sequence_1[i]], [sequence_2[j]]) for i, j in matches}
+    matched_1 = {i for i, _ in matches}
+    matched_2 = {j for _, j in matches}
+
+    boundaries = [(-1, -1), *anchors, (len(sequence_1), len(sequence_2))]
+    for (start_1, start_2), (end_1, end_2) in zip(boundaries, boundaries[1:]):
+        indices_1 = [i for i in range(start_1 + 1, end_1) if i not in matched_1]
+        indices_2 = [j for j in range(start_2 + 1, end_2) if j not in matched_2]
+        if not indices_1 or not indices_2:
+            continue
+
+        gap_span_alignments = align_span_sequences(
+            [sequence_1[i] for i in indices_1],
+            [sequence_2[j] for j in indices_2],
+            seed_weights,
+            improvement_weights,
+        )
+        for span_alignment in gap_span_alignments:
+            gap_indices_1 = indices_1[span_alignment.span_1.start:span_alignment.span_1.end]
+            gap_indices_2 = indices_2[span_alignment.span_2.start:span_alignment.span_2.end]
+            alignments[gap_indices_1[0]] = (
+                [sequence_1[i] for i in gap_indices_1],
+                [sequence_2[j] for j in gap_indices_2],
+            )
+
+    return [alignments[i] for i in sorted(alignments)]
+
+
+if __name__ == '__main__':
+    score_quality.display_results(
+        alignments=align_sequences(
+            example.sequence_1,
+            example.sequence_2,
+            seed_weights={"fuzz": 1.0, "distance": 0.05},
+            improvement_weights={"fuzz": 1.0},
+        ),
+        expected_alignments=example.expected_alignments,
+    )
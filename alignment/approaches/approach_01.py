@@ -1,19 +1,15 @@
 from typing import List, Tuple
 
 import numpy as np
-from fuzzywuzzy import fuzz
 
 from alignment import score_quality, example
+from alignment.score_matrix import generate_fuzz_ratio_matrix
 
 AlignmentType = Tuple[List[str], List[str]]
 
 
 def generate_score_matrix(sequence_1: List[str], sequence_2: List[str]) -> np.array:
-    alignment_score_matrix = np.zeros((len(sequence_1), len(sequence_2)))
-    for i, string_1 in enumerate(sequence_1):
-        for j, string_2 in enumerate(sequence_2):
-            alignment_score_matrix[i, j] = fuzz.ratio(string_1, string_2)
-    return alignment_score_matrix
+    return generate_fuzz_ratio_matrix(sequence_1, sequence_2, normalize=False)
 
 
 def choose_alignments(
@@ -1,3 +1,4 @@
+import bisect
 import dataclasses
 from typing import List, Tuple, Optional, Iterator
 
@@ -5,26 +6,23 @@ import numpy as np
 from fuzzywuzzy import fuzz
 
 from alignment import score_quality, example
+from alignment.score_matrix import generate_fuzz_ratio_matrix
 
 StringAlignment = Tuple[List[str], List[str]]
 
 
 def generate_score_matrix(sequence_1: List[str], sequence_2: List[str]) -> np.array:
-    alignment_score_matrix = np.zeros((len(sequence_1), len(sequence_2)))
-    for i, string_1 in enumerate(sequence_1):
-        for j, string_2 in enumerate(sequence_2):
-            alignment_score_matrix[i, j] = fuzz.ratio(string_1, string_2)
-    return alignment_score_matrix
+    return generate_fuzz_ratio_matrix(sequence_1, sequence_2, normalize=False)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class Span:
     start: int
     end: Optional[int] = None
 
     def __post_init__(self):
         if self.end is None:
-            self.end = self.start + 1
+            object.__setattr__(self, "end", self.start + 1)
 
     def slice(self) -> Iterator['Span']:
         for i in range(self.start, self.end + 1):
@@ -43,9 +41,6 @@ class Span:
 
         return self.end == other.start
 
-    def __eq__(self, other: 'Span') -> bool:
-        return self.start == other.start and self.end == other.end
-
     def __lt__(self, other):
         if self == other:
             return False
@@ -53,11 +48,12 @@ class Span:
         return self.start < other.start or (self.start == other.start and self.end < other.end)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class SpanAlignment:
     span_1: Span
     span_2: Span
-    score: Optional[float] = None
+    # the score is not part of an alignment's identity, so equal spans compare (and hash) equal regardless of score
+    score: Optional[float] = dataclasses.field(default=None, compare=False)
 
     def overlaps(self, other: 'SpanAlignment') -> bool:
         return self.span_1.overlaps(other.span_1) or self.span_2.overlaps(other.span_2)
@@ -76,8 +72,8 @@ class SpanAlignment:
             for span_2 in self.span_2.slice():
                 yield SpanAlignment(span_1, span_2)
 
-    def __eq__(self, other: 'SpanAlignment') -> bool:
-        return self.span_1 == other.span_1 and self.span_2 == other.span_2
+    def with_score(self, score: Optional[float]) -> 'SpanAlignment':
+        return SpanAlignment(self.span_1, self.span_2, score)
 
     def __lt__(self, other: 'SpanAlignment') -> bool:
         if self == other:
@@ -86,6 +82,28 @@ class SpanAlignment:
         return self.span_1 < other.span_1 or (self.span_1 == other.span_1 and self.span_2 < other.span_2)
 
 
+class OccupiedSpans:
+    # chosen spans are disjoint, so keeping them sorted by start means an overlap check only has to look at the
+    # neighbours of the insertion point
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+
+    def overlaps(self, start: int, end: int) -> bool:
+        index = bisect.bisect_right(self.starts, start)
+        if index > 0 and self.starts[index - 1] < end and start < self.ends[index - 1]:
+            return True
+        return index < len(self.starts) and self.starts[index] < end
+
+    def add(self, start: int, end: int) -> None:
+        # empty spans never arise from slicing, and treating them as occupying nothing keeps the stored spans disjoint
+        if start >= end:
+            return
+        index = bisect.bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+
+
 def choose_span_alignments(score_matrix: np.array) -> List[SpanAlignment]:
     span_alignments = []
     for i, score_slice in enumerate(score_matrix):
@@ -106,7 +124,9 @@ def suggest_potential_span_alignments(
         SpanAlignment(Span(length_sequence_1 - 1), Span(length_sequence_2 - 1)),
     ]
 
-    additional_span_alignments = []
+    # dicts keep insertion order, so they double as ordered sets with constant-time membership checks
+    seed_span_alignments = set(span_alignments[1:-1])
+    additional_span_alignments = {}
     for index in range(1, len(span_alignments) - 1):
         span_alignment = span_alignments[index]
         previous_span_alignment = span_alignments[index - 1]
@@ -120,10 +140,9 @@ def suggest_potential_span_alignments(
             Span(previous_span_alignment.span_2.start, next_span_alignment.span_2.end),
         )
         for new_span_alignment in new_parent_span_alignment.slice():
-            if new_span_alignment not in span_alignments[1:-1]:
-                if new_span_alignment not in additional_span_alignments:
-                    additional_span_alignments.append(new_span_alignment)
-    return additional_span_alignments
+            if new_span_alignment not in seed_span_alignments:
+                additional_span_alignments.setdefault(new_span_alignment)
+    return list(additional_span_alignments)
 
 
 def span_alignments_to_string_alignments(
@@ -146,24 +165,27 @@ def score_alignments(
         sequence_1: List[str],
         sequence_2: List[str],
 ) -> List[SpanAlignment]:
+    scored_span_alignments = []
     for span_alignment in span_alignments:
         # note: this join method is a little lazy
         string_1 = " ".join(sequence_1[span_alignment.span_1.start:span_alignment.span_1.end])
         string_2 = " ".join(sequence_2[span_alignment.span_2.start:span_alignment.span_2.end])
-        span_alignment.score = fuzz.ratio(string_1, string_2)
-    return span_alignments
+        scored_span_alignments.append(span_alignment.with_score(fuzz.ratio(string_1, string_2)))
+    return scored_span_alignments
 
 
 def choose_final_span_alignments(span_alignments: List[SpanAlignment]) -> List[SpanAlignment]:
     span_alignments = sorted(span_alignments, key=lambda i: i.score, reverse=True)
+    occupied_1 = OccupiedSpans()
+    occupied_2 = OccupiedSpans()
     chosen_alignments = []
-    while span_alignments:
-        chosen_alignment = span_alignments.pop(0)
-        chosen_alignments.append(chosen_alignment)
-        span_alignments = [
-            i for i in span_alignments
-            if not i.overlaps(chosen_alignment)
-        ]
+    for span_alignment in span_alignments:
+        span_1, span_2 = span_alignment.span_1, span_alignment.span_2
+        if occupied_1.overlaps(span_1.start, span_1.end) or occupied_2.overlaps(span_2.start, span_2.end):
+            continue
+        occupied_1.add(span_1.start, span_1.end)
+        occupied_2.add(span_2.start, span_2.end)
+        chosen_alignments.append(span_alignment)
     return chosen_alignments
 
 
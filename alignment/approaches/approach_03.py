@@ -1,28 +1,74 @@
+import bisect
+import collections
 import dataclasses
-from typing import List, Tuple, Optional, Iterator, Dict, Callable
+import itertools
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional, Iterator, Iterable, Dict, Callable, Union, NamedTuple, Any
 
 import numpy as np
-from fuzzywuzzy import fuzz
 
-from alignment import score_quality, example
+from alignment import score_quality, example, profiling
+from alignment.score_matrix import (
+    SparseScoreMatrix,
+    generate_band_columns,
+    generate_fuzz_ratio_matrix,
+    unique_strings,
+)
+from alignment.embeddings import generate_embedding_similarity_matrix
+from alignment.tfidf import TermWeights, fit_tfidf, generate_tfidf_similarity_matrix
 
 StringAlignment = Tuple[List[str], List[str]]
+ScoreMatrix = Union[np.array, SparseScoreMatrix]
 
 
 def generate_score_matrix(
         sequence_1: List[str],
         sequence_2: List[str],
         weights: Dict[str, float],
+        columns: Optional[np.array] = None,
+        function_kwargs: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Union[np.array, SparseScoreMatrix]:
+    validate_weights(weights)
+    scores = generate_combination_score_matrix(sequence_1, sequence_2, weights, columns, function_kwargs)
+    matrix = scores if columns is None else SparseScoreMatrix(scores, columns, (len(sequence_1), len(sequence_2)))
+    return apply_update_functions(matrix, weights)
+
+
+def generate_combination_score_matrix(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        weights: Dict[str, float],
+        columns: Optional[np.array] = None,
+        function_kwargs: Optional[Dict[str, Dict[str, Any]]] = None,
 ) -> np.array:
-    combination_functions: Dict[str, Callable[[List[str], List[str]], np.array]] = {
-        "fuzz": generate_fuzz_score_matrix,
-    }
+    # the weighted sum of the combination functions alone; when columns are provided, only those cells of each row
+    # are scored. function_kwargs[name] are extra keyword arguments of the combination function `name`
+    column_kwargs = {} if columns is None else {"columns": columns}
+    function_kwargs = function_kwargs or {}
+    scores = np.zeros((len(sequence_1), len(sequence_2)) if columns is None else columns.shape)
+
+    for name, function in COMBINATION_FUNCTIONS.items():
+        weight = weights.get(name, 0)
+        if weight == 0:
+            continue
+        with profiling.stage(f"combination.{name}", cells=scores.size):
+            scores += weight * function(sequence_1, sequence_2, **column_kwargs, **function_kwargs.get(name, {}))
+    return scores
+
+
+def apply_update_functions(matrix: ScoreMatrix, weights: Dict[str, float]) -> ScoreMatrix:
+    for name, function in UPDATE_FUNCTIONS.items():
+        weight = weights.get(name, 0)
+        if weight == 0:
+            continue
+        with profiling.stage(f"update.{name}", cells=np.size(getattr(matrix, "values", matrix))):
+            matrix = function(matrix, weight)
+    return matrix
 
-    update_functions: Dict[str, Callable[[np.array, float], np.array]] = {
-        "distance": update_score_matrix_with_distance,
-    }
 
-    matrix_function_names = set(combination_functions) | set(update_functions)
+def validate_weights(weights: Dict[str, float]) -> None:
+    matrix_function_names = set(COMBINATION_FUNCTIONS) | set(UPDATE_FUNCTIONS)
     invalid_function_names = set(weights) - matrix_function_names
     if invalid_function_names:
         raise ValueError(
@@ -30,56 +76,121 @@ def generate_score_matrix(
             f"Accepted values are: {list(matrix_function_names)}"
         )
 
-    matrix = np.zeros((len(sequence_1), len(sequence_2)))
 
-    for name, function in combination_functions.items():
-        weight = weights.get(name, 0)
-        if weight == 0:
-            continue
-        matrix += weight * function(sequence_1, sequence_2)
+def generate_banded_score_matrix(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        weights: Dict[str, float],
+        band_width: int,
+        adaptive: bool = True,
+        function_kwargs: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> SparseScoreMatrix:
+    while True:
+        columns = generate_band_columns(len(sequence_1), len(sequence_2), band_width)
+        matrix = generate_score_matrix(sequence_1, sequence_2, weights, columns, function_kwargs)
+        if not adaptive or columns.shape[1] >= len(sequence_2):
+            return matrix
+
+        # a best match on the edge of the band suggests a better match may lie outside it, unless the edge is also the
+        # edge of the full matrix
+        best_columns = matrix.argmax()
+        on_band_edge = ((best_columns == columns[:, 0]) & (best_columns > 0)) | (
+            (best_columns == columns[:, -1]) & (best_columns < len(sequence_2) - 1)
+        )
+        if not on_band_edge.any():
+            return matrix
+        band_width *= 2
 
-    for name, function in update_functions.items():
-        weight = weights.get(name, 0)
-        if weight == 0:
-            continue
-        matrix = function(matrix, weight)
 
-    return matrix
+def generate_fuzz_score_matrix(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        columns: Optional[np.array] = None,
+        workers: int = 1,
+) -> np.array:
+    return generate_fuzz_ratio_matrix(sequence_1, sequence_2, workers=workers, columns=columns)
 
 
-def generate_fuzz_score_matrix(sequence_1: List[str], sequence_2: List[str]) -> np.array:
-    score_matrix = np.zeros((len(sequence_1), len(sequence_2)))
-    for i, string_1 in enumerate(sequence_1):
-        for j, string_2 in enumerate(sequence_2):
-            score_matrix[i, j] = fuzz.ratio(string_1, string_2) / 100
+def generate_tfidf_score_matrix(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        columns: Optional[np.array] = None,
+        term_weights: Optional[List[TermWeights]] = None,
+) -> np.array:
+    return generate_tfidf_similarity_matrix(sequence_1, sequence_2, columns=columns, term_weights=term_weights)
+
+
+def generate_embedding_score_matrix(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        columns: Optional[np.array] = None,
+) -> np.array:
+    return generate_embedding_similarity_matrix(sequence_1, sequence_2, columns=columns)
+
+
+def update_score_matrix_with_distance(score_matrix: ScoreMatrix, weight: float, copy: bool = True) -> ScoreMatrix:
+    if isinstance(score_matrix, SparseScoreMatrix):
+        values = score_matrix.values.copy() if copy else score_matrix.values
+        apply_distance_penalty(values, weight, score_matrix.shape[1], score_matrix.columns)
+        return SparseScoreMatrix(values, score_matrix.columns, score_matrix.shape) if copy else score_matrix
+
+    if copy:
+        score_matrix = score_matrix.copy()
+    apply_distance_penalty(score_matrix, weight, score_matrix.shape[1])
     return score_matrix
 
 
-def update_score_matrix_with_distance(score_matrix: np.array, weight: float) -> np.array:
-    score_matrix = score_matrix.copy()
+def apply_distance_penalty(
+        values: np.array,
+        weight: float,
+        length_sequence_2: int,
+        columns: Optional[np.array] = None,
+) -> None:
+    # penalties[length_sequence_2 + k] is the penalty for a cell k columns away from the expected column, so each
+    # row's penalty vector is a view (dense rows) or a gather (sparse rows) instead of a fresh computation
+    penalties = weight * np.abs(np.arange(-length_sequence_2, length_sequence_2 + 1))
 
+    # the only sequential dependency is the expected column, which follows the previous row's best match
     expected_column_index_with_max_score = 0
-    for row_index, row_values in enumerate(score_matrix):
-        for column_index, score in enumerate(row_values):
-            penalty = weight * abs(column_index - expected_column_index_with_max_score)
-            score_matrix[row_index, column_index] = max(score - penalty, 0)
-        expected_column_index_with_max_score = row_values.argmax() + 1
+    for row_index, row_values in enumerate(values):
+        offset = length_sequence_2 - expected_column_index_with_max_score
+        if columns is None:
+            row_penalties = penalties[offset:offset + length_sequence_2]
+        else:
+            row_penalties = penalties[columns[row_index] + offset]
+        np.subtract(row_values, row_penalties, out=row_values)
+        np.maximum(row_values, 0, out=row_values)
 
-    return score_matrix
+        column_index_with_max_score = row_values.argmax()
+        if columns is not None:
+            column_index_with_max_score = columns[row_index, column_index_with_max_score]
+        expected_column_index_with_max_score = column_index_with_max_score + 1
 
 
-@dataclasses.dataclass
+COMBINATION_FUNCTIONS: Dict[str, Callable[..., np.array]] = {
+    "fuzz": generate_fuzz_score_matrix,
+    "tfidf": generate_tfidf_score_matrix,
+    "embedding": generate_embedding_score_matrix,
+}
+
+UPDATE_FUNCTIONS: Dict[str, Callable[[ScoreMatrix, float], ScoreMatrix]] = {
+    "distance": update_score_matrix_with_distance,
+}
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
 class Span:
     start: int
     end: Optional[int] = None
 
     def __post_init__(self):
         if self.end is None:
-            self.end = self.start + 1
+            object.__setattr__(self, "end", self.start + 1)
 
-    def slice(self) -> Iterator['Span']:
+    def slice(self, max_width: Optional[int] = None) -> Iterator['Span']:
         for i in range(self.start, self.end + 1):
-            for j in range(i + 1, self.end + 1):
+            end = self.end if max_width is None else min(self.end, i + max_width)
+            for j in range(i + 1, end + 1):
                 yield Span(i, j)
 
     def overlaps(self, other: 'Span') -> bool:
@@ -94,9 +205,6 @@ class Span:
 
         return self.end == other.start
 
-    def __eq__(self, other: 'Span') -> bool:
-        return self.start == other.start and self.end == other.end
-
     def __lt__(self, other):
         if self == other:
             return False
@@ -104,11 +212,12 @@ class Span:
         return self.start < other.start or (self.start == other.start and self.end < other.end)
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class SpanAlignment:
     span_1: Span
     span_2: Span
-    score: Optional[float] = None
+    # the score is not part of an alignment's identity, so equal spans compare (and hash) equal regardless of score
+    score: Optional[float] = dataclasses.field(default=None, compare=False)
 
     def overlaps(self, other: 'SpanAlignment') -> bool:
         return self.span_1.overlaps(other.span_1) or self.span_2.overlaps(other.span_2)
@@ -122,13 +231,27 @@ class SpanAlignment:
 
         return self.span_1.is_contiguous(other.span_1) and self.span_2.is_contiguous(other.span_2)
 
-    def slice(self) -> Iterator['SpanAlignment']:
-        for span_1 in self.span_1.slice():
-            for span_2 in self.span_2.slice():
-                yield SpanAlignment(span_1, span_2)
-
-    def __eq__(self, other: 'SpanAlignment') -> bool:
-        return self.span_1 == other.span_1 and self.span_2 == other.span_2
+    def slice(self, max_width: Optional[int] = None, max_skew: Optional[int] = None) -> Iterator['SpanAlignment']:
+        # with a max_skew, span_2 must start within max_skew sentences of where span_1 starts, scaled to span_2
+        spans_2 = list(self.span_2.slice(max_width))
+        if max_skew is None:
+            for span_1 in self.span_1.slice(max_width):
+                for span_2 in spans_2:
+                    yield SpanAlignment(span_1, span_2)
+            return
+
+        spans_2_by_start = collections.defaultdict(list)
+        for span_2 in spans_2:
+            spans_2_by_start[span_2.start].append(span_2)
+        scale = (self.span_2.end - self.span_2.start) / max(self.span_1.end - self.span_1.start, 1)
+        for span_1 in self.span_1.slice(max_width):
+            center = self.span_2.start + (span_1.start - self.span_1.start) * scale
+            for start_2 in range(math.ceil(center - max_skew), math.floor(center + max_skew) + 1):
+                for span_2 in spans_2_by_start.get(start_2, ()):
+                    yield SpanAlignment(span_1, span_2)
+
+    def with_score(self, score: Optional[float]) -> 'SpanAlignment':
+        return SpanAlignment(self.span_1, self.span_2, score)
 
     def __lt__(self, other: 'SpanAlignment') -> bool:
         if self == other:
@@ -137,7 +260,185 @@ class SpanAlignment:
         return self.span_1 < other.span_1 or (self.span_1 == other.span_1 and self.span_2 < other.span_2)
 
 
-def choose_seed_span_alignments(score_matrix: np.array) -> List[SpanAlignment]:
+@dataclasses.dataclass
+class SpanAlignmentArray:
+    # columnar storage for large collections of span alignments; a missing score is stored as NaN
+    starts_1: np.array
+    ends_1: np.array
+    starts_2: np.array
+    ends_2: np.array
+    scores: np.array
+
+    @classmethod
+    def from_span_alignments(cls, span_alignments: Iterable[SpanAlignment]) -> 'SpanAlignmentArray':
+        rows = [
+            (s.span_1.start, s.span_1.end, s.span_2.start, s.span_2.end, np.nan if s.score is None else s.score)
+            for s in span_alignments
+        ]
+        columns = np.array(rows, dtype=np.float64).reshape(-1, 5).T
+        return cls(*(column.astype(np.int32) for column in columns[:4]), columns[4])
+
+    @classmethod
+    def concatenate(cls, arrays: List['SpanAlignmentArray']) -> 'SpanAlignmentArray':
+        if not arrays:
+            return cls.from_span_alignments([])
+        return cls(*(
+            np.concatenate([getattr(array, field.name) for array in arrays]) for field in dataclasses.fields(cls)
+        ))
+
+    def to_span_alignments(self) -> List[SpanAlignment]:
+        return list(self)
+
+    def with_scores(self, scores: np.array) -> 'SpanAlignmentArray':
+        scores = np.asarray(scores, dtype=np.float64)
+        return SpanAlignmentArray(self.starts_1, self.ends_1, self.starts_2, self.ends_2, scores)
+
+    def overlaps(self, span_alignment: SpanAlignment) -> np.array:
+        span_1, span_2 = span_alignment.span_1, span_alignment.span_2
+        return (
+            ((self.starts_1 < span_1.end) & (span_1.start < self.ends_1)) |
+            ((self.starts_2 < span_2.end) & (span_2.start < self.ends_2))
+        )
+
+    def argsort(self) -> np.array:
+        # same order as sorting the SpanAlignments themselves
+        return np.lexsort((self.ends_2, self.starts_2, self.ends_1, self.starts_1))
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __iter__(self) -> Iterator[SpanAlignment]:
+        columns = (self.starts_1.tolist(), self.ends_1.tolist(), self.starts_2.tolist(), self.ends_2.tolist())
+        for start_1, end_1, start_2, end_2, score in zip(*columns, self.scores.tolist()):
+            yield SpanAlignment(Span(start_1, end_1), Span(start_2, end_2), None if np.isnan(score) else score)
+
+    def __getitem__(self, index) -> Union[SpanAlignment, 'SpanAlignmentArray']:
+        if isinstance(index, (int, np.integer)):
+            score = self.scores[index]
+            return SpanAlignment(
+                Span(int(self.starts_1[index]), int(self.ends_1[index])),
+                Span(int(self.starts_2[index]), int(self.ends_2[index])),
+                None if np.isnan(score) else score,
+            )
+        return SpanAlignmentArray(
+            self.starts_1[index], self.ends_1[index], self.starts_2[index], self.ends_2[index], self.scores[index],
+        )
+
+
+SpanAlignments = Union[List[SpanAlignment], SpanAlignmentArray]
+
+
+class OccupiedSpans:
+    # chosen spans are disjoint, so keeping them sorted by start means an overlap check only has to look at the
+    # neighbours of the insertion point
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+
+    def overlaps(self, start: int, end: int) -> bool:
+        index = bisect.bisect_right(self.starts, start)
+        if index > 0 and self.starts[index - 1] < end and start < self.ends[index - 1]:
+            return True
+        return index < len(self.starts) and self.starts[index] < end
+
+    def add(self, start: int, end: int) -> None:
+        # empty spans never arise from slicing, and treating them as occupying nothing keeps the stored spans disjoint
+        if start >= end:
+            return
+        index = bisect.bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+
+
+class SpanStrings:
+    # " ".join(sequence[span.start:span.end]) for any span, sliced out of one joined string instead of re-joined
+    def __init__(self, sequence: List[str]):
+        self.joined = " ".join(sequence)
+        self.offsets = [0]
+        for string in sequence:
+            self.offsets.append(self.offsets[-1] + len(string) + 1)
+
+    def __getitem__(self, span: Span) -> str:
+        return self.slice(span.start, span.end)
+
+    def slice(self, start: int, end: int) -> str:
+        return self.joined[self.offsets[start]:self.offsets[end] - 1]
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    max_size: int
+    size: int
+
+
+class SpanScoreCache:
+    # scores of span alignments for one pair of sequences, so repeated candidates are only scored once per run
+    def __init__(self, sequence_1: List[str], sequence_2: List[str], max_size: int = 2 ** 16, workers: int = 1):
+        self.sequence_1 = sequence_1
+        self.sequence_2 = sequence_2
+        self.strings_1 = SpanStrings(sequence_1)
+        self.strings_2 = SpanStrings(sequence_2)
+        self.max_size = max_size
+        self.workers = workers
+        self.term_weights: Optional[List[TermWeights]] = None
+        self.scores: collections.OrderedDict = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def score_span_alignments(self, span_alignments: Iterable[SpanAlignment], weights: Dict[str, float]) -> List[float]:
+        validate_weights(weights)
+        weights_key = tuple(sorted(weights.items()))
+        keys = [(span_alignment.span_1, span_alignment.span_2, weights_key) for span_alignment in span_alignments]
+
+        known_scores = {}
+        missing_keys = {}
+        for key in keys:
+            if key in known_scores or key in missing_keys:
+                self.hits += 1
+            elif key in self.scores:
+                self.hits += 1
+                self.scores.move_to_end(key)
+                known_scores[key] = self.scores[key]
+            else:
+                self.misses += 1
+                missing_keys[key] = None
+
+        # every miss is scored in one batch
+        missing_scores = score_string_pairs(
+            [self.strings_1[span_1] for span_1, _, _ in missing_keys],
+            [self.strings_2[span_2] for _, span_2, _ in missing_keys],
+            weights,
+            workers=self.workers,
+            function_kwargs=self.function_kwargs(weights) if missing_keys else None,
+        )
+        for key, score in zip(missing_keys, missing_scores.tolist()):
+            known_scores[key] = self.scores[key] = score
+            if len(self.scores) > self.max_size:
+                self.scores.popitem(last=False)
+
+        return [known_scores[key] for key in keys]
+
+    def function_kwargs(self, weights: Dict[str, float]) -> Dict[str, Dict[str, Any]]:
+        # tf-idf is fitted once on the sentences of both sequences, so that the score of a span alignment does not
+        # depend on the batch it is scored in
+        if not weights.get("tfidf", 0):
+            return {}
+        if self.term_weights is None:
+            self.term_weights = fit_tfidf([*self.sequence_1, *self.sequence_2])
+        return {"tfidf": {"term_weights": self.term_weights}}
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.max_size, len(self.scores))
+
+
+def choose_seed_span_alignments(score_matrix: ScoreMatrix) -> List[SpanAlignment]:
+    if isinstance(score_matrix, SparseScoreMatrix):
+        return [
+            SpanAlignment(span_1=Span(i), span_2=Span(j), score=score)
+            for i, (j, score) in enumerate(zip(score_matrix.argmax(), score_matrix.max()))
+        ]
+
     span_alignments = []
     for i, score_slice in enumerate(score_matrix):
         j = score_slice.argmax()
@@ -150,14 +451,37 @@ def suggest_potential_span_alignments(
         span_alignments: List[SpanAlignment],
         length_sequence_1: int,
         length_sequence_2: int,
+        max_width: Optional[int] = None,
+        candidate_filter: Optional[Callable[[SpanAlignment], bool]] = None,
+        max_skew: Optional[int] = None,
 ) -> List[SpanAlignment]:
+    return list(iter_potential_span_alignments(
+        span_alignments,
+        length_sequence_1,
+        length_sequence_2,
+        max_width,
+        candidate_filter,
+        max_skew,
+    ))
+
+
+def iter_potential_span_alignments(
+        span_alignments: List[SpanAlignment],
+        length_sequence_1: int,
+        length_sequence_2: int,
+        max_width: Optional[int] = None,
+        candidate_filter: Optional[Callable[[SpanAlignment], bool]] = None,
+        max_skew: Optional[int] = None,
+) -> Iterator[SpanAlignment]:
+    # with both a max_width and a max_skew, each gap yields a number of candidates linear in its size rather than
+    # quartic in it; candidates are yielded as they are found, and only the set of those already yielded is kept
     span_alignments = [
         SpanAlignment(Span(0, 0), Span(0, 0)),
         *sorted(span_alignments),
         SpanAlignment(Span(length_sequence_1 - 1), Span(length_sequence_2 - 1)),
     ]
 
-    additional_span_alignments = []
+    seen_span_alignments = set(span_alignments[1:-1])
     for index in range(1, len(span_alignments) - 1):
         span_alignment = span_alignments[index]
         previous_span_alignment = span_alignments[index - 1]
@@ -170,15 +494,52 @@ def suggest_potential_span_alignments(
             Span(previous_span_alignment.span_1.start, next_span_alignment.span_1.end),
             Span(previous_span_alignment.span_2.start, next_span_alignment.span_2.end),
         )
-        for new_span_alignment in new_parent_span_alignment.slice():
-            if new_span_alignment not in span_alignments[1:-1]:
-                if new_span_alignment not in additional_span_alignments:
-                    additional_span_alignments.append(new_span_alignment)
-    return additional_span_alignments
+        for new_span_alignment in new_parent_span_alignment.slice(max_width, max_skew):
+            if new_span_alignment in seen_span_alignments:
+                continue
+            seen_span_alignments.add(new_span_alignment)
+            if candidate_filter is None or candidate_filter(new_span_alignment):
+                yield new_span_alignment
+
+
+class CandidateBounds:
+    # rejects candidates whose joined strings differ too much in length, or whose score cannot reach min_score: no
+    # combination function scores above 1, and fuzz.ratio is at most 2 * min(length_1, length_2) / (length_1 +
+    # length_2), rounded to a whole percent, since only the shorter string can be matched in full
+    def __init__(
+            self,
+            sequence_1: List[str],
+            sequence_2: List[str],
+            weights: Dict[str, float],
+            max_length_ratio: Optional[float] = None,
+            min_score: Optional[float] = None,
+    ):
+        self.offsets_1 = SpanStrings(sequence_1).offsets
+        self.offsets_2 = SpanStrings(sequence_2).offsets
+        self.max_length_ratio = max_length_ratio
+        self.min_score = min_score
+        self.fuzz_weight = max(weights.get("fuzz", 0), 0)
+        self.other_weights = sum(
+            max(weight, 0) for name, weight in weights.items() if name in COMBINATION_FUNCTIONS and name != "fuzz"
+        )
+
+    def __call__(self, span_alignment: SpanAlignment) -> bool:
+        length_1 = self.offsets_1[span_alignment.span_1.end] - self.offsets_1[span_alignment.span_1.start] - 1
+        length_2 = self.offsets_2[span_alignment.span_2.end] - self.offsets_2[span_alignment.span_2.start] - 1
+        shorter, longer = sorted((length_1, length_2))
+        if self.max_length_ratio is not None and longer > self.max_length_ratio * max(shorter, 1):
+            return False
+        if self.min_score is not None:
+            fuzz_bound = 2 * shorter / (shorter + longer) if longer else 1.0
+            # fuzz.ratio rounds to a whole percent, which can take it just above the exact bound; rounding half up
+            # bounds rounding half to even too
+            fuzz_bound = math.floor(100 * fuzz_bound + 0.5 + 1e-9) / 100
+            return self.fuzz_weight * fuzz_bound + self.other_weights >= self.min_score
+        return True
 
 
 def span_alignments_to_string_alignments(
-        span_alignments: List[SpanAlignment],
+        span_alignments: SpanAlignments,
         sequence_1: List[str],
         sequence_2: List[str],
 ) -> List[StringAlignment]:
@@ -193,32 +554,129 @@ def span_alignments_to_string_alignments(
 
 
 def score_alignments(
-        span_alignments: List[SpanAlignment],
+        span_alignments: SpanAlignments,
         sequence_1: List[str],
         sequence_2: List[str],
         weights: Dict[str, float],
-) -> List[SpanAlignment]:
-    for span_alignment in span_alignments:
-        # NOTE: this join method is a little lazy, and it would be better to extract the exact spacing from the
-        # original strings
-        string_1 = " ".join(sequence_1[span_alignment.span_1.start:span_alignment.span_1.end])
-        string_2 = " ".join(sequence_2[span_alignment.span_2.start:span_alignment.span_2.end])
-        score = generate_score_matrix([string_1], [string_2], weights)[0, 0]
-        span_alignment.score = score
-    return span_alignments
+        cache: Optional[SpanScoreCache] = None,
+) -> SpanAlignments:
+    if cache is None:
+        cache = SpanScoreCache(sequence_1, sequence_2)
+    scores = cache.score_span_alignments(span_alignments, weights)
+
+    if isinstance(span_alignments, SpanAlignmentArray):
+        return span_alignments.with_scores(scores)
+    return [span_alignment.with_score(score) for span_alignment, score in zip(span_alignments, scores)]
+
+
+def score_span_alignments_batch(
+        candidates: SpanAlignments,
+        sequence_1: List[str],
+        sequence_2: List[str],
+        weights: Dict[str, float],
+        workers: int = 1,
+        chunk_size: int = 4096,
+        function_kwargs: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> np.array:
+    validate_weights(weights)
+    strings_1 = SpanStrings(sequence_1)
+    strings_2 = SpanStrings(sequence_2)
+    if function_kwargs is None and weights.get("tfidf", 0):
+        function_kwargs = {"tfidf": {"term_weights": fit_tfidf([*sequence_1, *sequence_2])}}
+
+    if isinstance(candidates, SpanAlignmentArray):
+        spans_1 = zip(candidates.starts_1.tolist(), candidates.ends_1.tolist())
+        spans_2 = zip(candidates.starts_2.tolist(), candidates.ends_2.tolist())
+    else:
+        spans_1 = ((candidate.span_1.start, candidate.span_1.end) for candidate in candidates)
+        spans_2 = ((candidate.span_2.start, candidate.span_2.end) for candidate in candidates)
+
+    # NOTE: this join method is a little lazy, and it would be better to extract the exact spacing from the original
+    # strings
+    return score_string_pairs(
+        [strings_1.slice(start, end) for start, end in spans_1],
+        [strings_2.slice(start, end) for start, end in spans_2],
+        weights,
+        workers=workers,
+        chunk_size=chunk_size,
+        function_kwargs=function_kwargs,
+    )
+
+
+def score_string_pairs(
+        strings_1: List[str],
+        strings_2: List[str],
+        weights: Dict[str, float],
+        workers: int = 1,
+        chunk_size: int = 4096,
+        function_kwargs: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> np.array:
+    # scores[k] is the score of strings_1[k] against strings_2[k], each pair scored as its own 1x1 score matrix
+    if workers > 1 and len(strings_1) > chunk_size:
+        starts = range(0, len(strings_1), chunk_size)
+        with ProcessPoolExecutor(max_workers=min(workers, len(starts))) as executor:
+            chunks = executor.map(
+                score_string_pairs,
+                [strings_1[start:start + chunk_size] for start in starts],
+                [strings_2[start:start + chunk_size] for start in starts],
+                [weights] * len(starts),
+                [1] * len(starts),
+                [chunk_size] * len(starts),
+                [function_kwargs] * len(starts),
+            )
+            return np.concatenate(list(chunks))
+
+    # every pair becomes a single-cell row of a sparse matrix, so the combination functions run once over the batch
+    unique_strings_2, inverse_2 = unique_strings(strings_2)
+    combination_weights = {name: weight for name, weight in weights.items() if name in COMBINATION_FUNCTIONS}
+    score_matrix = generate_score_matrix(
+        strings_1,
+        unique_strings_2,
+        combination_weights,
+        inverse_2[:, np.newaxis],
+        function_kwargs,
+    )
+    scores = score_matrix.values[:, 0]
+
+    if any(weights.get(name, 0) for name in UPDATE_FUNCTIONS):
+        scores = np.array([apply_update_functions(np.array([[score]]), weights)[0, 0] for score in scores])
+    return scores
 
 
-def choose_best_span_alignments(span_alignments: List[SpanAlignment]) -> List[SpanAlignment]:
+def choose_best_span_alignments(span_alignments: SpanAlignments) -> SpanAlignments:
+    if isinstance(span_alignments, SpanAlignmentArray):
+        span_alignments = span_alignments[np.argsort(-span_alignments.scores, kind="stable")]
+        columns = (span_alignments.starts_1, span_alignments.ends_1, span_alignments.starts_2, span_alignments.ends_2)
+        chosen_indices = choose_non_overlapping_indices(*(column.tolist() for column in columns))
+        return span_alignments[np.array(chosen_indices, dtype=np.intp)]
+
     span_alignments = sorted(span_alignments, key=lambda i: i.score, reverse=True)
-    chosen_alignments = []
-    while span_alignments:
-        chosen_alignment = span_alignments.pop(0)
-        chosen_alignments.append(chosen_alignment)
-        span_alignments = [
-            i for i in span_alignments
-            if not i.overlaps(chosen_alignment)
-        ]
-    return chosen_alignments
+    chosen_indices = choose_non_overlapping_indices(
+        [i.span_1.start for i in span_alignments],
+        [i.span_1.end for i in span_alignments],
+        [i.span_2.start for i in span_alignments],
+        [i.span_2.end for i in span_alignments],
+    )
+    return [span_alignments[index] for index in chosen_indices]
+
+
+def choose_non_overlapping_indices(
+        starts_1: List[int],
+        ends_1: List[int],
+        starts_2: List[int],
+        ends_2: List[int],
+) -> List[int]:
+    # greedily accept each span alignment, in order, unless it overlaps an accepted one in either sequence
+    occupied_1 = OccupiedSpans()
+    occupied_2 = OccupiedSpans()
+    chosen_indices = []
+    for index, (start_1, end_1, start_2, end_2) in enumerate(zip(starts_1, ends_1, starts_2, ends_2)):
+        if occupied_1.overlaps(start_1, end_1) or occupied_2.overlaps(start_2, end_2):
+            continue
+        occupied_1.add(start_1, end_1)
+        occupied_2.add(start_2, end_2)
+        chosen_indices.append(index)
+    return chosen_indices
 
 
 def align_sequences(
@@ -226,36 +684,160 @@ def align_sequences(
         sequence_2: List[str],
         seed_weights: Dict[str, float],
         improvement_weights: Dict[str, float],
+        band_width: Optional[int] = None,
+        score_cache: Optional[SpanScoreCache] = None,
+        max_merge_width: Optional[int] = None,
+        max_skew: Optional[int] = None,
+        max_length_ratio: Optional[float] = None,
+        min_score: Optional[float] = None,
+        batch_size: int = 4096,
+        workers: int = 1,
 ) -> List[StringAlignment]:
+    with profiling.stage("align_sequences", sentences_1=len(sequence_1), sentences_2=len(sequence_2)):
+        span_alignments = align_span_sequences(
+            sequence_1,
+            sequence_2,
+            seed_weights,
+            improvement_weights,
+            band_width=band_width,
+            score_cache=score_cache,
+            max_merge_width=max_merge_width,
+            max_skew=max_skew,
+            max_length_ratio=max_length_ratio,
+            min_score=min_score,
+            batch_size=batch_size,
+            workers=workers,
+        )
+        return span_alignments_to_string_alignments(span_alignments, sequence_1, sequence_2)
+
+
+def align_span_sequences(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        seed_weights: Dict[str, float],
+        improvement_weights: Dict[str, float],
+        band_width: Optional[int] = None,
+        score_cache: Optional[SpanScoreCache] = None,
+        seed_columns: Optional[np.array] = None,
+        max_merge_width: Optional[int] = None,
+        max_skew: Optional[int] = None,
+        max_length_ratio: Optional[float] = None,
+        min_score: Optional[float] = None,
+        batch_size: int = 4096,
+        workers: int = 1,
+) -> List[SpanAlignment]:
     if not seed_weights:
         return []
 
-    # choose seed span alignments
-    seed_score_matrix = generate_score_matrix(sequence_1, sequence_2, seed_weights)
-    seed_span_alignments = choose_seed_span_alignments(seed_score_matrix)
+    # choose seed span alignments; the fuzz ratios of the seed matrix are computed in `workers` processes
+    function_kwargs = {"fuzz": {"workers": workers}}
+    with profiling.stage("seed_matrix", rows=len(sequence_1), columns=len(sequence_2)) as stage:
+        if seed_columns is not None:
+            seed_score_matrix = generate_score_matrix(
+                sequence_1,
+                sequence_2,
+                seed_weights,
+                seed_columns,
+                function_kwargs,
+            )
+        elif band_width is not None:
+            seed_score_matrix = generate_banded_score_matrix(
+                sequence_1,
+                sequence_2,
+                seed_weights,
+                band_width,
+                function_kwargs=function_kwargs,
+            )
+        else:
+            seed_score_matrix = generate_score_matrix(sequence_1, sequence_2, seed_weights, None, function_kwargs)
+        stage.count(cells=np.size(getattr(seed_score_matrix, "values", seed_score_matrix)))
+    with profiling.stage("seed_selection") as stage:
+        seed_span_alignments = choose_seed_span_alignments(seed_score_matrix)
+        stage.count(seeds=len(seed_span_alignments))
 
     if not improvement_weights:
-        return span_alignments_to_string_alignments(seed_span_alignments, sequence_1, sequence_2)
+        return seed_span_alignments
 
-    # identify potential improved span alignments
-    suggested_span_alignments = suggest_potential_span_alignments(
+    return improve_span_alignments(
         seed_span_alignments,
-        len(sequence_1),
-        len(sequence_2),
-    )
-
-    # re-score all span alignments
-    all_span_alignments = score_alignments(
-        suggested_span_alignments + seed_span_alignments,
         sequence_1,
         sequence_2,
         improvement_weights,
+        score_cache,
+        max_merge_width,
+        max_skew,
+        max_length_ratio,
+        min_score,
+        batch_size,
+        workers,
     )
 
-    # choose best span alignments
-    best_span_alignments = choose_best_span_alignments(all_span_alignments)
 
-    return span_alignments_to_string_alignments(best_span_alignments, sequence_1, sequence_2)
+def iter_candidate_batches(
+        suggested_span_alignments: Iterator[SpanAlignment],
+        seed_span_alignments: List[SpanAlignment],
+        batch_size: int,
+) -> Iterator[List[SpanAlignment]]:
+    # batches of the suggestions, generated only as they are needed, then of the seeds
+    while True:
+        with profiling.stage("suggestion") as stage:
+            batch = list(itertools.islice(suggested_span_alignments, batch_size))
+            stage.count(candidates=len(batch))
+        if not batch:
+            break
+        yield batch
+    for start in range(0, len(seed_span_alignments), batch_size):
+        yield seed_span_alignments[start:start + batch_size]
+
+
+def improve_span_alignments(
+        seed_span_alignments: List[SpanAlignment],
+        sequence_1: List[str],
+        sequence_2: List[str],
+        improvement_weights: Dict[str, float],
+        score_cache: Optional[SpanScoreCache] = None,
+        max_merge_width: Optional[int] = None,
+        max_skew: Optional[int] = None,
+        max_length_ratio: Optional[float] = None,
+        min_score: Optional[float] = None,
+        batch_size: int = 4096,
+        workers: int = 1,
+) -> List[SpanAlignment]:
+    # candidates are scored in batches as they are generated, and only their columns are kept for the selection, so
+    # at most one batch of SpanAlignment objects is alive at a time
+    if score_cache is None:
+        score_cache = SpanScoreCache(sequence_1, sequence_2, workers=workers)
+    candidate_filter = None
+    if max_length_ratio is not None or min_score is not None:
+        candidate_filter = CandidateBounds(sequence_1, sequence_2, improvement_weights, max_length_ratio, min_score)
+
+    # identify potential improved span alignments lazily
+    suggested_span_alignments = iter_potential_span_alignments(
+        seed_span_alignments,
+        len(sequence_1),
+        len(sequence_2),
+        max_merge_width,
+        candidate_filter,
+        max_skew,
+    )
+
+    # re-score each batch of suggestions, then the seeds
+    scored_batches = []
+    for batch in iter_candidate_batches(suggested_span_alignments, seed_span_alignments, batch_size):
+        with profiling.stage("rescoring", alignments=len(batch)):
+            scored_batches.append(score_alignments(
+                SpanAlignmentArray.from_span_alignments(batch),
+                sequence_1,
+                sequence_2,
+                improvement_weights,
+                score_cache,
+            ))
+
+    # choose best span alignments
+    with profiling.stage("selection") as stage:
+        best_span_alignments = choose_best_span_alignments(SpanAlignmentArray.concatenate(scored_batches))
+        stage.count(chosen=len(best_span_alignments))
+    return best_span_alignments.to_span_alignments()
 
 
 if __name__ == '__main__':
@@ -1,13 +1,36 @@
 from alignment import score_quality, example
-from openai import AzureOpenAI
-from typing import List, Tuple
+from alignment.anchors import find_exact_matches, longest_increasing_matches
+from alignment.approaches.approach_03 import Span, SpanAlignment
+from alignment.response_cache import ResponseCache, response_cache_key
+from openai import (
+    AzureOpenAI,
+    AsyncAzureOpenAI,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError,
+)
+from typing import List, Tuple, Dict, Optional, AsyncIterator
+import numpy as np
 from dotenv import load_dotenv
+import asyncio
+import dataclasses
+import email.utils
+import functools
+import json
+import math
 import os
+import random
+import time
+import zlib
 
 load_dotenv()
 
 StringAlignment = Tuple[List[str], List[str]]
 
+# part of every response cache key; bump it whenever a prompt template changes
+PROMPT_TEMPLATE_VERSION = "1"
+
 
 def wrap_prompt_components(instruction, ex, assignment):
     return (
@@ -42,15 +65,62 @@ def generate_simple_alignment_prompt(sequence_1: List[str], sequence_2: List[str
     return wrap_prompt_components(instruction, ex, assignment)
 
 
-def generate_openai_request(prompt: str) -> str:
-    client = AzureOpenAI(
-        azure_endpoint=os.getenv("OPENAI_API_BASE"),
+def generate_structured_alignment_prompt(sequence_1: List[str], sequence_2: List[str]) -> str:
+    instruction = (
+        "Generate sentence-level alignments from different versions of text. Answer with one JSON object per line and "
+        "nothing else. Each object lists the indices of the consecutive sentences of version 1 and of version 2 that "
+        "are aligned."
+    )
+    ex = (
+        "Version 1:\n"
+        "0: this is a sentence.\n"
+        "1: this is another sentence.\n"
+        "2: this is the last sentence.\n"
+        "Version 2:\n"
+        "0: This is a sentence.\n"
+        "1: This is another sentence, and this is the last sentence.\n"
+        "Alignments:\n"
+        '{"version_1": [0], "version_2": [0]}\n'
+        '{"version_1": [1, 2], "version_2": [1]}'
+    )
+    assignment = (
+        "Version 1:\n" +
+        "\n".join(f"{i}: {sent}" for i, sent in enumerate(sequence_1)) +
+        "\nVersion 2:\n" +
+        "\n".join(f"{i}: {sent}" for i, sent in enumerate(sequence_2)) +
+        "\nAlignments:"
+    )
+    return wrap_prompt_components(instruction, ex, assignment)
+
+
+@dataclasses.dataclass(frozen=True)
+class OpenAISettings:
+    endpoint: Optional[str]
+    api_key: Optional[str]
+    api_version: Optional[str]
+    deployment: Optional[str]
+
+
+@functools.lru_cache(maxsize=None)
+def load_openai_settings() -> OpenAISettings:
+    return OpenAISettings(
+        endpoint=os.getenv("OPENAI_API_BASE"),
         api_key=os.getenv("AZURE_OPENAI_API_KEY"),
         api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+        deployment=os.getenv("OPENAI_CHAT_DEPLOYMENT"),
     )
 
-    response = client.chat.completions.create(
-        model=os.getenv("OPENAI_CHAT_DEPLOYMENT"),
+
+@functools.lru_cache(maxsize=None)
+def get_openai_client() -> AzureOpenAI:
+    # one client, and so one connection pool, for every request of the process
+    settings = load_openai_settings()
+    return AzureOpenAI(azure_endpoint=settings.endpoint, api_key=settings.api_key, api_version=settings.api_version)
+
+
+def generate_openai_request(prompt: str) -> str:
+    response = get_openai_client().chat.completions.create(
+        model=load_openai_settings().deployment,
         messages=[
             {"role": "system", "content": prompt},
         ]
@@ -59,22 +129,439 @@ def generate_openai_request(prompt: str) -> str:
     return response.choices[0].message.content
 
 
-def parse_simple_alignment_response(response: str) -> List[StringAlignment]:
+def parse_simple_alignment_response(
+        response: str,
+        sequence_1: Optional[List[str]] = None,
+        sequence_2: Optional[List[str]] = None,
+) -> List[StringAlignment]:
+    # blank and malformed lines are skipped; when the sequences are known, a line with several arrows is split at the
+    # first arrow that leaves whole sentences on both sides
     string_alignments = []
 
     for line in response.split("\n"):
-        string_1, string_2 = line.split(" -> ")
+        parts = line.strip().split(" -> ")
+        if len(parts) < 2:
+            continue
+        splits = [(" -> ".join(parts[:k]), " -> ".join(parts[k:])) for k in range(1, len(parts))]
+        if sequence_1 is not None and sequence_2 is not None:
+            splits = [
+                (string_1, string_2)
+                for string_1, string_2 in splits
+                if locate_span(string_1, sequence_1, 0, len(sequence_1)) is not None
+                and locate_span(string_2, sequence_2, 0, len(sequence_2)) is not None
+            ] or splits
+        string_1, string_2 = splits[0]
         string_alignments.append(([string_1], [string_2]))
 
     return string_alignments
 
 
-def align_with_openai(sequence_1: List[str], sequence_2: List[str]) -> List[StringAlignment]:
+def locate_span(text: str, sentences: List[str], start: int, end: int) -> Optional[Span]:
+    # the run of sentences[start:end] that the model joined into `text`, whatever the whitespace between them
+    for i in range(start, end):
+        remainder = text.strip()
+        j = i
+        while j < end and sentences[j] and remainder.startswith(sentences[j].strip()):
+            remainder = remainder[len(sentences[j].strip()):].lstrip()
+            j += 1
+        if j > i and not remainder:
+            return Span(i, j)
+    return None
+
+
+class StructuredAlignmentParser:
+    # parses a response of JSON objects as it streams in, in a single pass: only the characters of the object being
+    # read are kept, and each object maps straight to a SpanAlignment; objects that are not valid JSON, do not list
+    # consecutive indices or point outside the sequences are skipped
+    def __init__(self, length_1: int, length_2: int):
+        self.length_1 = length_1
+        self.length_2 = length_2
+        self.buffer: List[str] = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str) -> List[SpanAlignment]:
+        span_alignments = []
+        for character in text:
+            if self.depth:
+                self.buffer.append(character)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif character == "\\":
+                    self.escaped = True
+                elif character == '"':
+                    self.in_string = False
+            elif character == '"' and self.depth:
+                self.in_string = True
+            elif character == "{":
+                if not self.depth:
+                    self.buffer = [character]
+                self.depth += 1
+            elif character == "}" and self.depth:
+                self.depth -= 1
+                if not self.depth:
+                    span_alignment = self.parse_object("".join(self.buffer))
+                    if span_alignment is not None:
+                        span_alignments.append(span_alignment)
+        return span_alignments
+
+    def parse_object(self, text: str) -> Optional[SpanAlignment]:
+        try:
+            alignment = json.loads(text)
+            span_1 = indices_to_span(alignment["version_1"], self.length_1)
+            span_2 = indices_to_span(alignment["version_2"], self.length_2)
+        except (ValueError, KeyError, TypeError):
+            return None
+        if span_1 is None or span_2 is None:
+            return None
+        return SpanAlignment(span_1, span_2)
+
+
+def indices_to_span(indices: List[int], length: int) -> Optional[Span]:
+    indices = sorted(indices)
+    if not indices or indices[0] < 0 or indices[-1] >= length or indices != list(range(indices[0], indices[-1] + 1)):
+        return None
+    return Span(indices[0], indices[-1] + 1)
+
+
+def parse_structured_alignment_response(response: str, length_1: int, length_2: int) -> List[SpanAlignment]:
+    return StructuredAlignmentParser(length_1, length_2).feed(response)
+
+
+def align_with_openai(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        cache: Optional[ResponseCache] = None,
+) -> List[StringAlignment]:
     prompt = generate_simple_alignment_prompt(sequence_1, sequence_2)
-    response = generate_openai_request(prompt)
+    key = response_cache_key(prompt, load_openai_settings().deployment, PROMPT_TEMPLATE_VERSION)
+    response = cache.get(key) if cache is not None else None
+    if response is None:
+        response = generate_openai_request(prompt)
+        if cache is not None:
+            cache.set(key, response)
     return parse_simple_alignment_response(response)
 
 
+class TokenBucket:
+    # allows bursts of up to `capacity` requests, refilled at `rate` requests per second
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        # waiting while holding the lock keeps requests first-come, first-served
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError)
+
+
+def parse_retry_after(error: Exception) -> Optional[float]:
+    # the delay in seconds the server asked for, from retry-after-ms or retry-after (in seconds or as an HTTP date)
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers["retry-after-ms"]) / 1000
+    except (KeyError, ValueError):
+        pass
+    retry_after = response.headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncOpenAIAligner:
+    def __init__(
+            self,
+            client: Optional[AsyncAzureOpenAI] = None,
+            deployment: Optional[str] = None,
+            max_concurrency: int = 8,
+            requests_per_second: float = 5.0,
+            burst: Optional[float] = None,
+            max_retries: int = 5,
+            backoff_base: float = 0.5,
+            backoff_max: float = 30.0,
+            cache: Optional[ResponseCache] = None,
+    ):
+        settings = load_openai_settings()
+        self.owns_client = client is None
+        # retries are handled here, so that every attempt goes through the rate limiter
+        self.client = client or AsyncAzureOpenAI(
+            azure_endpoint=settings.endpoint,
+            api_key=settings.api_key,
+            api_version=settings.api_version,
+            max_retries=0,
+        )
+        self.deployment = deployment or settings.deployment
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.cache = cache
+
+    async def complete(self, prompt: str) -> str:
+        key = response_cache_key(prompt, self.deployment, PROMPT_TEMPLATE_VERSION)
+        if self.cache is not None:
+            response = self.cache.get(key)
+            if response is not None:
+                return response
+
+        # identical prompts that are in flight at the same time share one request
+        future = self.in_flight.get(prompt)
+        if future is None:
+            future = asyncio.ensure_future(self.request_with_retries(prompt, key))
+            self.in_flight[prompt] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(prompt, None))
+        # one caller being cancelled must not cancel the request for the others
+        return await asyncio.shield(future)
+
+    async def request_with_retries(self, prompt: str, key: str) -> str:
+        response = await self.create_with_retries(prompt)
+        if self.cache is not None:
+            self.cache.set(key, response.choices[0].message.content)
+        return response.choices[0].message.content
+
+    async def create_with_retries(self, prompt: str, stream: bool = False):
+        # a concurrency slot is held for each attempt but not while backing off; a stream is returned with its slot
+        # still held, and the caller releases it once the stream has been read
+        for attempt in range(self.max_retries + 1):
+            await self.semaphore.acquire()
+            keep_slot = False
+            try:
+                await self.bucket.acquire()
+                response = await self.client.chat.completions.create(
+                    model=self.deployment,
+                    messages=[
+                        {"role": "system", "content": prompt},
+                    ],
+                    stream=stream,
+                )
+                keep_slot = stream
+                return response
+            except RETRYABLE_ERRORS as error:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = parse_retry_after(error)
+            finally:
+                if not keep_slot:
+                    self.semaphore.release()
+            # full jitter keeps clients that failed together from retrying together, but never sooner than the server
+            # asked for
+            backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            await asyncio.sleep(max(backoff, retry_after or 0.0))
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        # the response as it is generated; responses are cached once complete, but streams are never coalesced
+        key = response_cache_key(prompt, self.deployment, PROMPT_TEMPLATE_VERSION)
+        if self.cache is not None:
+            response = self.cache.get(key)
+            if response is not None:
+                yield response
+                return
+
+        chunks = []
+        response = await self.create_with_retries(prompt, stream=True)
+        try:
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chunks.append(chunk.choices[0].delta.content)
+                    yield chunks[-1]
+        finally:
+            self.semaphore.release()
+        if self.cache is not None:
+            self.cache.set(key, "".join(chunks))
+
+    async def align(self, sequence_1: List[str], sequence_2: List[str]) -> List[StringAlignment]:
+        prompt = generate_simple_alignment_prompt(sequence_1, sequence_2)
+        response = await self.complete(prompt)
+        return parse_simple_alignment_response(response, sequence_1, sequence_2)
+
+    async def stream_span_alignments(
+            self,
+            sequence_1: List[str],
+            sequence_2: List[str],
+    ) -> AsyncIterator[SpanAlignment]:
+        # span alignments are yielded as soon as their object is complete, while the rest is still being generated
+        parser = StructuredAlignmentParser(len(sequence_1), len(sequence_2))
+        async for text in self.stream(generate_structured_alignment_prompt(sequence_1, sequence_2)):
+            for span_alignment in parser.feed(text):
+                yield span_alignment
+
+    async def align_spans(self, sequence_1: List[str], sequence_2: List[str]) -> List[SpanAlignment]:
+        return [span_alignment async for span_alignment in self.stream_span_alignments(sequence_1, sequence_2)]
+
+    async def align_in_windows(
+            self,
+            sequence_1: List[str],
+            sequence_2: List[str],
+            window_size: int = 40,
+            overlap: int = 8,
+            content_defined: bool = False,
+    ) -> List[StringAlignment]:
+        # every window is prompted at once, so latency is that of the slowest window rather than the whole document
+        windows = generate_windows(sequence_1, sequence_2, window_size, overlap, content_defined)
+        window_alignments = await asyncio.gather(*(
+            self.align(sequence_1[window.start_1:window.end_1], sequence_2[window.start_2:window.end_2])
+            for window in windows
+        ))
+        return stitch_window_alignments(windows, window_alignments, sequence_1)
+
+    async def align_many(self, pairs: List[Tuple[List[str], List[str]]]) -> List[List[StringAlignment]]:
+        return await asyncio.gather(*(self.align(sequence_1, sequence_2) for sequence_1, sequence_2 in pairs))
+
+    async def close(self) -> None:
+        if self.owns_client:
+            await self.client.close()
+
+
+def align_many_with_openai(
+        pairs: List[Tuple[List[str], List[str]]],
+        **aligner_kwargs,
+) -> List[List[StringAlignment]]:
+    async def run() -> List[List[StringAlignment]]:
+        aligner = AsyncOpenAIAligner(**aligner_kwargs)
+        try:
+            return await aligner.align_many(pairs)
+        finally:
+            await aligner.close()
+
+    return asyncio.run(run())
+
+
+def align_with_openai_in_windows(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        window_size: int = 40,
+        overlap: int = 8,
+        content_defined: bool = False,
+        **aligner_kwargs,
+) -> List[StringAlignment]:
+    async def run() -> List[StringAlignment]:
+        aligner = AsyncOpenAIAligner(**aligner_kwargs)
+        try:
+            return await aligner.align_in_windows(sequence_1, sequence_2, window_size, overlap, content_defined)
+        finally:
+            await aligner.close()
+
+    return asyncio.run(run())
+
+
+@dataclasses.dataclass(frozen=True)
+class Window:
+    start_1: int
+    end_1: int
+    start_2: int
+    end_2: int
+
+
+def generate_windows(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        window_size: int,
+        overlap: int,
+        content_defined: bool = False,
+) -> List[Window]:
+    if not 0 <= overlap < window_size:
+        raise ValueError(f"Overlap must be between 0 and the window size, got {overlap} for {window_size}.")
+
+    step = window_size - overlap
+    if content_defined:
+        cuts = generate_content_defined_cuts(sequence_1, step)
+        windows_1 = [
+            (max(start - overlap // 2, 0), min(end + overlap - overlap // 2, len(sequence_1)))
+            for start, end in zip(cuts, cuts[1:])
+        ] or [(0, 0)]
+    else:
+        windows_1 = [
+            (start_1, min(start_1 + window_size, len(sequence_1)))
+            for start_1 in range(0, max(len(sequence_1) - overlap, 1), step)
+        ]
+
+    # sentences that are identical and unique in both sequences say where each window lands in sequence_2; between
+    # them, positions are interpolated
+    anchors = longest_increasing_matches(find_exact_matches(sequence_1, sequence_2))
+    anchors_1 = [0, *(i for i, _ in anchors), len(sequence_1)]
+    anchors_2 = [0, *(j for _, j in anchors), len(sequence_2)]
+
+    windows = []
+    for start_1, end_1 in windows_1:
+        # sentences may be merged or split across the window edges, so the sequence_2 window is widened by the overlap
+        start_2 = max(math.floor(np.interp(start_1, anchors_1, anchors_2)) - overlap, 0)
+        end_2 = min(math.ceil(np.interp(end_1, anchors_1, anchors_2)) + overlap, len(sequence_2))
+        windows.append(Window(start_1, end_1, start_2, end_2))
+    return windows
+
+
+def generate_content_defined_cuts(sequence: List[str], step: int) -> List[int]:
+    # windows are cut after sentences whose hash is a multiple of step // 2 (once they are at least that long), so
+    # cuts depend on the sentences around them rather than on their position: an edit only moves the cuts next to it,
+    # and the prompts, and cached responses, of every other window stay the same
+    modulus = max(step // 2, 1)
+    cuts = [0]
+    for i, sentence in enumerate(sequence[:-1]):
+        length = i + 1 - cuts[-1]
+        if length >= modulus and zlib.crc32(sentence.encode()) % modulus == 0 or length >= 2 * step:
+            cuts.append(i + 1)
+    if sequence:
+        cuts.append(len(sequence))
+    return cuts
+
+
+def stitch_window_alignments(
+        windows: List[Window],
+        window_alignments: List[List[StringAlignment]],
+        sequence_1: List[str],
+) -> List[StringAlignment]:
+    # each window owns the sentences of sequence_1 up to the middle of its overlaps with its neighbours, and only keeps
+    # the alignments that start there; alignments that cannot be located are kept unless another window found them
+    owned_starts = [0, *((window.start_1 + previous.end_1) // 2 for previous, window in zip(windows, windows[1:]))]
+    owned_ends = [*owned_starts[1:], len(sequence_1)]
+
+    alignments = []
+    seen = set()
+    for window, string_alignments, owned_start, owned_end in zip(windows, window_alignments, owned_starts, owned_ends):
+        for string_alignment in string_alignments:
+            position = locate_alignment(string_alignment, sequence_1, window)
+            key = (tuple(string_alignment[0]), tuple(string_alignment[1]))
+            if position is not None and not owned_start <= position < owned_end or key in seen:
+                continue
+            seen.add(key)
+            alignments.append(string_alignment)
+    return alignments
+
+
+def locate_alignment(string_alignment: StringAlignment, sequence_1: List[str], window: Window) -> Optional[int]:
+    # the index of the sentence the alignment starts with; the model may have joined several sentences into one string,
+    # so the longest sentence it starts with is the best guess
+    text = string_alignment[0][0] if string_alignment[0] else ""
+    positions = [i for i in range(window.start_1, window.end_1) if sequence_1[i] and text.startswith(sequence_1[i])]
+    return max(positions, key=lambda i: len(sequence_1[i]), default=None)
+
+
 if __name__ == '__main__':
     alignments = align_with_openai(example.sequence_1, example.sequence_2)
     score_quality.display_results(
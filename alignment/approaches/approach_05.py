@@ -0,0 +1,254 @@
+import dataclasses
+from typing import List, Tuple, Optional, Dict
+
+import numpy as np
+
+from alignment import score_quality, example
+from alignment.score_matrix import generate_fuzz_ratio_matrix
+
+StringAlignment = Tuple[List[str], List[str]]
+BeadShape = Tuple[int, int]
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Bead:
+    start_1: int
+    end_1: int
+    start_2: int
+    end_2: int
+
+
+def generate_bead_shapes(max_bead_size: Tuple[int, int] = (2, 2)) -> List[BeadShape]:
+    # shapes listed first win ties, so the simplest explanations are preferred
+    max_length_1, max_length_2 = max_bead_size
+    merges = [
+        (length_1, length_2)
+        for length_1 in range(1, max_length_1 + 1)
+        for length_2 in range(1, max_length_2 + 1)
+        if (length_1, length_2) != (1, 1)
+    ]
+    return [(1, 1), (1, 0), (0, 1), *sorted(merges, key=sum)]
+
+
+class BeadScorer:
+    def __init__(
+            self,
+            sequence_1: List[str],
+            sequence_2: List[str],
+            bead_shapes: List[BeadShape],
+            min_ratio: float,
+            skip_score: float,
+            merge_penalty: float,
+    ):
+        self.bead_shapes = bead_shapes
+        self.min_ratio = min_ratio
+        self.skip_score = skip_score
+        self.merge_penalty = merge_penalty
+
+        # NOTE: like approach_03, merged sentences are joined with a single space
+        self.joined_1 = {
+            length: [" ".join(sequence_1[i:i + length]) for i in range(len(sequence_1) - length + 1)]
+            for length in {length_1 for length_1, _ in bead_shapes if length_1}
+        }
+        self.joined_2 = {
+            length: [" ".join(sequence_2[j:j + length]) for j in range(len(sequence_2) - length + 1)]
+            for length in {length_2 for _, length_2 in bead_shapes if length_2}
+        }
+
+    def score_row(self, i: int, length_1: int, length_2: int, j0: int, j1: int) -> np.array:
+        # scores of the beads sequence_1[i:i + length_1] ~ sequence_2[j:j + length_2] for j0 <= j <= j1 - length_2
+        if length_1 == 0 or length_2 == 0:
+            return np.full(j1 - j0 + 1 - length_2, self.skip_score)
+
+        ratios = generate_fuzz_ratio_matrix([self.joined_1[length_1][i]], self.joined_2[length_2][j0:j1 - length_2 + 1])
+        size = length_1 + length_2
+        return size * (ratios[0] - self.min_ratio) - self.merge_penalty * (size - 2)
+
+    def score_bead(self, bead: Bead) -> float:
+        length_1, length_2 = bead.end_1 - bead.start_1, bead.end_2 - bead.start_2
+        return self.score_row(bead.start_1, length_1, length_2, bead.start_2, bead.end_2)[0]
+
+
+def apply_skips(row: np.array, skip_score: float, reverse: bool = False) -> np.array:
+    # row[j] = max(row[j], row[j - 1] + skip_score) along the whole row (row[j + 1] when reversed), in one pass. A skip
+    # into j comes from the best of the cells k < j only: comparing row[j] with itself round-tripped through the
+    # offsets could mark it improved by a rounding error, and overwrite its backpointer with a skip
+    values = row[::-1] if reverse else row
+    offsets = skip_score * np.arange(len(values))
+    candidates = np.full(len(values), -np.inf)
+    if len(values) > 1:
+        candidates[1:] = np.maximum.accumulate(values - offsets)[:-1] + offsets[1:]
+    improved = candidates > values
+    values[improved] = candidates[improved]
+    return improved[::-1] if reverse else improved
+
+
+def forward_scores(
+        scorer: BeadScorer,
+        i0: int,
+        i1: int,
+        j0: int,
+        j1: int,
+        backpointers: Optional[np.array] = None,
+) -> Dict[int, np.array]:
+    # best scores of paths from (i0, j0) to every node of rows i0..i1; only the last rows reachable by a bead are kept
+    max_length_1 = max(length_1 for length_1, _ in scorer.bead_shapes)
+    width = j1 - j0 + 1
+    rows = {}
+    for i in range(i0, i1 + 1):
+        row = np.full(width, -np.inf)
+        if i == i0:
+            row[0] = 0.0
+
+        for index, (length_1, length_2) in enumerate(scorer.bead_shapes):
+            if length_1 == 0 or i - length_1 < i0 or length_2 >= width:
+                continue
+            bead_scores = scorer.score_row(i - length_1, length_1, length_2, j0, j1)
+            candidates = rows[i - length_1][:width - length_2] + bead_scores
+            targets = row[length_2:]
+            improved = candidates > targets
+            targets[improved] = candidates[improved]
+            if backpointers is not None:
+                backpointers[i - i0, length_2:][improved] = index
+
+        if (0, 1) in scorer.bead_shapes:
+            improved = apply_skips(row, scorer.skip_score)
+            if backpointers is not None:
+                backpointers[i - i0][improved] = scorer.bead_shapes.index((0, 1))
+
+        rows[i] = row
+        rows.pop(i - max_length_1, None)
+    return rows
+
+
+def backward_scores(scorer: BeadScorer, i0: int, i1: int, j0: int, j1: int) -> Dict[int, np.array]:
+    # best scores of paths from every node of rows i0..i1 to (i1, j1); only the last rows reachable by a bead are kept
+    max_length_1 = max(length_1 for length_1, _ in scorer.bead_shapes)
+    width = j1 - j0 + 1
+    rows = {}
+    for i in range(i1, i0 - 1, -1):
+        row = np.full(width, -np.inf)
+        if i == i1:
+            row[-1] = 0.0
+
+        for length_1, length_2 in scorer.bead_shapes:
+            if length_1 == 0 or i + length_1 > i1 or length_2 >= width:
+                continue
+            candidates = scorer.score_row(i, length_1, length_2, j0, j1) + rows[i + length_1][length_2:]
+            targets = row[:width - length_2]
+            np.maximum(targets, candidates, out=targets)
+
+        if (0, 1) in scorer.bead_shapes:
+            apply_skips(row, scorer.skip_score, reverse=True)
+
+        rows[i] = row
+        rows.pop(i + max_length_1, None)
+    return rows
+
+
+def find_beads(scorer: BeadScorer, i0: int, i1: int, j0: int, j1: int) -> List[Bead]:
+    backpointers = np.zeros((i1 - i0 + 1, j1 - j0 + 1), dtype=np.uint8)
+    rows = forward_scores(scorer, i0, i1, j0, j1, backpointers)
+    if rows[i1][-1] == -np.inf:
+        raise ValueError(f"No alignment exists using bead shapes {scorer.bead_shapes}.")
+
+    beads = []
+    i, j = i1, j1
+    while (i, j) != (i0, j0):
+        length_1, length_2 = scorer.bead_shapes[backpointers[i - i0, j - j0]]
+        beads.append(Bead(i - length_1, i, j - length_2, j))
+        i, j = i - length_1, j - length_2
+    return beads[::-1]
+
+
+def find_beads_in_linear_memory(scorer: BeadScorer, i0: int, i1: int, j0: int, j1: int) -> List[Bead]:
+    # Hirschberg-style divide and conquer: find where the best path crosses the middle row, then solve both halves
+    max_length_1 = max(length_1 for length_1, _ in scorer.bead_shapes)
+    if i1 - i0 <= 2 * max_length_1:
+        return find_beads(scorer, i0, i1, j0, j1)
+
+    middle = (i0 + i1) // 2
+    forward_rows = forward_scores(scorer, i0, middle, j0, j1)
+    backward_rows = backward_scores(scorer, middle, i1, j0, j1)
+    width = j1 - j0 + 1
+
+    # either the path has a node on the middle row...
+    totals = forward_rows[middle] + backward_rows[middle]
+    j = int(totals.argmax())
+    best_score, best_split = totals[j], (middle, j, None)
+
+    # ...or a bead jumps over it
+    for i in range(max(i0, middle - max_length_1 + 1), middle):
+        for length_1, length_2 in scorer.bead_shapes:
+            if i + length_1 <= middle or length_2 >= width:
+                continue
+            totals = (
+                forward_rows[i][:width - length_2] +
+                scorer.score_row(i, length_1, length_2, j0, j1) +
+                backward_rows[i + length_1][length_2:]
+            )
+            j = int(totals.argmax())
+            if totals[j] > best_score:
+                best_score, best_split = totals[j], (i, j, (length_1, length_2))
+
+    if best_score == -np.inf:
+        raise ValueError(f"No alignment exists using bead shapes {scorer.bead_shapes}.")
+
+    i, j, bead_shape = best_split
+    if bead_shape is None:
+        return (
+            find_beads_in_linear_memory(scorer, i0, i, j0, j0 + j) +
+            find_beads_in_linear_memory(scorer, i, i1, j0 + j, j1)
+        )
+
+    length_1, length_2 = bead_shape
+    bead = Bead(i, i + length_1, j0 + j, j0 + j + length_2)
+    return (
+        find_beads_in_linear_memory(scorer, i0, bead.start_1, j0, bead.start_2) +
+        [bead] +
+        find_beads_in_linear_memory(scorer, bead.end_1, i1, bead.end_2, j1)
+    )
+
+
+def align_beads(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        max_bead_size: Tuple[int, int] = (2, 2),
+        min_ratio: float = 0.5,
+        skip_score: float = 0.0,
+        merge_penalty: float = 0.0,
+        linear_memory: bool = False,
+) -> List[Bead]:
+    scorer = BeadScorer(
+        sequence_1,
+        sequence_2,
+        generate_bead_shapes(max_bead_size),
+        min_ratio=min_ratio,
+        skip_score=skip_score,
+        merge_penalty=merge_penalty,
+    )
+    if linear_memory:
+        return find_beads_in_linear_memory(scorer, 0, len(sequence_1), 0, len(sequence_2))
+    return find_beads(scorer, 0, len(sequence_1), 0, len(sequence_2))
+
+
+def align_sequences(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        max_bead_size: Tuple[int, int] = (2, 2),
+        linear_memory: bool = False,
+) -> List[StringAlignment]:
+    beads = align_beads(sequence_1, sequence_2, max_bead_size=max_bead_size, linear_memory=linear_memory)
+    return [
+        (sequence_1[bead.start_1:bead.end_1], sequence_2[bead.start_2:bead.end_2])
+        for bead in beads
+        # sentences that were inserted or deleted are not alignments
+        if bead.end_1 > bead.start_1 and bead.end_2 > bead.start_2
+    ]
+
+
+if __name__ == '__main__':
+    score_quality.display_results(
+        alignments=align_sequences(example.sequence_1, example.sequence_2),
+        expected_alignments=example.expected_alignments,
+    )
@@ -0,0 +1,140 @@
+import asyncio
+import dataclasses
+from typing import List, Tuple, Dict
+
+from alignment import score_quality, example
+from alignment.anchors import longest_increasing_matches
+from alignment.approaches.approach_03 import (
+    Span,
+    SpanAlignment,
+    align_span_sequences,
+    span_alignments_to_string_alignments,
+)
+from alignment.approaches.approach_04 import AsyncOpenAIAligner
+
+StringAlignment = Tuple[List[str], List[str]]
+
+
+@dataclasses.dataclass(frozen=True)
+class Gap:
+    # sentences of both sequences between two confident alignments, to be aligned by the LLM
+    start_1: int
+    end_1: int
+    start_2: int
+    end_2: int
+
+
+def choose_confident_span_alignments(
+        span_alignments: List[SpanAlignment],
+        confidence: float,
+) -> List[SpanAlignment]:
+    # the largest set of confident alignments that are in the same order in both sequences; moved sentences are left
+    # to the LLM, so that the result is monotone
+    confident_span_alignments = {
+        (span_alignment.span_1.start, span_alignment.span_2.start): span_alignment
+        for span_alignment in span_alignments
+        if span_alignment.score is not None and span_alignment.score >= confidence
+    }
+    return [
+        confident_span_alignments[match]
+        for match in longest_increasing_matches(sorted(confident_span_alignments))
+    ]
+
+
+def find_gaps(
+        confident_span_alignments: List[SpanAlignment],
+        length_sequence_1: int,
+        length_sequence_2: int,
+) -> List[Gap]:
+    # only gaps with sentences on both sides can hold an alignment
+    boundaries = [
+        SpanAlignment(Span(0, 0), Span(0, 0)),
+        *confident_span_alignments,
+        SpanAlignment(Span(length_sequence_1, length_sequence_1), Span(length_sequence_2, length_sequence_2)),
+    ]
+    gaps = []
+    for previous, following in zip(boundaries, boundaries[1:]):
+        gap = Gap(previous.span_1.end, following.span_1.start, previous.span_2.end, following.span_2.start)
+        if gap.end_1 > gap.start_1 and gap.end_2 > gap.start_2:
+            gaps.append(gap)
+    return gaps
+
+
+def offset_gap_span_alignments(gap_span_alignments: List[SpanAlignment], gap: Gap) -> List[SpanAlignment]:
+    # the LLM indexes sentences from the start of the gap; alignments that would cross an earlier one are dropped
+    span_alignments = []
+    for gap_span_alignment in sorted(gap_span_alignments):
+        span_alignment = SpanAlignment(
+            Span(gap.start_1 + gap_span_alignment.span_1.start, gap.start_1 + gap_span_alignment.span_1.end),
+            Span(gap.start_2 + gap_span_alignment.span_2.start, gap.start_2 + gap_span_alignment.span_2.end),
+        )
+        if span_alignments and (
+                span_alignment.span_1.start < span_alignments[-1].span_1.end
+                or span_alignment.span_2.start < span_alignments[-1].span_2.end
+        ):
+            continue
+        span_alignments.append(span_alignment)
+    return span_alignments
+
+
+async def align_span_sequences_with_cascade(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        seed_weights: Dict[str, float],
+        improvement_weights: Dict[str, float],
+        aligner: AsyncOpenAIAligner,
+        confidence: float = 0.9,
+) -> List[SpanAlignment]:
+    span_alignments = align_span_sequences(sequence_1, sequence_2, seed_weights, improvement_weights)
+    confident_span_alignments = choose_confident_span_alignments(span_alignments, confidence)
+    gaps = find_gaps(confident_span_alignments, len(sequence_1), len(sequence_2))
+
+    # every gap is prompted at once; confident alignments never reach the network
+    gaps_span_alignments = await asyncio.gather(*(
+        aligner.align_spans(sequence_1[gap.start_1:gap.end_1], sequence_2[gap.start_2:gap.end_2]) for gap in gaps
+    ))
+
+    gap_span_alignments = [
+        span_alignment
+        for gap, span_alignments in zip(gaps, gaps_span_alignments)
+        for span_alignment in offset_gap_span_alignments(span_alignments, gap)
+    ]
+    return sorted(confident_span_alignments + gap_span_alignments)
+
+
+def align_sequences(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        seed_weights: Dict[str, float],
+        improvement_weights: Dict[str, float],
+        confidence: float = 0.9,
+        **aligner_kwargs,
+) -> List[StringAlignment]:
+    async def run() -> List[SpanAlignment]:
+        aligner = AsyncOpenAIAligner(**aligner_kwargs)
+        try:
+            return await align_span_sequences_with_cascade(
+                sequence_1,
+                sequence_2,
+                seed_weights,
+                improvement_weights,
+                aligner,
+                confidence,
+            )
+        finally:
+            await aligner.close()
+
+    span_alignments = asyncio.run(run())
+    return span_alignments_to_string_alignments(span_alignments, sequence_1, sequence_2)
+
+
+if __name__ == '__main__':
+    score_quality.display_results(
+        alignments=align_sequences(
+            example.sequence_1,
+            example.sequence_2,
+            seed_weights={"fuzz": 1.0, "distance": 0.05},
+            improvement_weights={"fuzz": 1.0},
+        ),
+        expected_alignments=example.expected_alignments,
+    )
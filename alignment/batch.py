@@ -0,0 +1,117 @@
+import dataclasses
+import importlib
+import itertools
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, Future, FIRST_COMPLETED, wait
+from typing import List, Tuple, Dict, Any, Iterable, Iterator, Optional, Callable, Union
+
+StringAlignment = Tuple[List[str], List[str]]
+DocumentPair = Tuple[List[str], List[str]]
+Approach = Union[str, Callable[..., List[StringAlignment]]]
+
+
+@dataclasses.dataclass
+class PairResult:
+    # the outcome of aligning pairs[index]; a pair that raised has an error (its formatted traceback) and no alignments
+    index: int
+    alignments: Optional[List[StringAlignment]] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def resolve_approach(approach: Approach) -> Callable[..., List[StringAlignment]]:
+    # "approach_03" names a module in alignment.approaches, "alignment.anchors" any module with an align_sequences
+    if callable(approach):
+        return approach
+    module_name = approach if "." in approach else f"alignment.approaches.{approach}"
+    return importlib.import_module(module_name).align_sequences
+
+
+def align_chunk(
+        chunk: List[Tuple[int, DocumentPair]],
+        approach: Approach,
+        kwargs: Dict[str, Any],
+) -> List[PairResult]:
+    align_sequences = resolve_approach(approach)
+    results = []
+    for index, (sequence_1, sequence_2) in chunk:
+        try:
+            results.append(PairResult(index, alignments=align_sequences(sequence_1, sequence_2, **kwargs)))
+        except Exception:
+            results.append(PairResult(index, error=traceback.format_exc()))
+    return results
+
+
+def iter_align_many(
+        pairs: Iterable[DocumentPair],
+        approach: Approach = "approach_03",
+        workers: int = 1,
+        chunk_size: int = 8,
+        ordered: bool = True,
+        cancel: Optional[threading.Event] = None,
+        **kwargs: Any,
+) -> Iterator[PairResult]:
+    # pairs are read lazily, and at most two chunks per worker are in flight, so the input can be larger than memory;
+    # setting `cancel` or closing the iterator stops reading pairs and drops every chunk that has not started
+    chunks = chunk_pairs(pairs, chunk_size)
+
+    if workers <= 1:
+        for chunk in chunks:
+            if cancel is not None and cancel.is_set():
+                return
+            yield from align_chunk(chunk, approach, kwargs)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending: Dict[Future, int] = {}
+    buffered: Dict[int, PairResult] = {}
+    next_index = 0
+    try:
+        while True:
+            while len(pending) < 2 * workers and not (cancel is not None and cancel.is_set()):
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending[executor.submit(align_chunk, chunk, approach, kwargs)] = chunk[0][0]
+            if not pending:
+                return
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED, timeout=None if cancel is None else 0.1)
+            if cancel is not None and cancel.is_set():
+                return
+
+            for future in done:
+                del pending[future]
+                for result in future.result():
+                    if not ordered:
+                        yield result
+                    else:
+                        buffered[result.index] = result
+
+            while next_index in buffered:
+                yield buffered.pop(next_index)
+                next_index += 1
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def align_many(
+        pairs: Iterable[DocumentPair],
+        approach: Approach = "approach_03",
+        workers: int = 1,
+        chunk_size: int = 8,
+        ordered: bool = True,
+        cancel: Optional[threading.Event] = None,
+        **kwargs: Any,
+) -> List[PairResult]:
+    return list(iter_align_many(pairs, approach, workers, chunk_size, ordered, cancel, **kwargs))
+
+
+def chunk_pairs(pairs: Iterable[DocumentPair], chunk_size: int) -> Iterator[List[Tuple[int, DocumentPair]]]:
+    indexed_pairs = enumerate(pairs)
+    while chunk := list(itertools.islice(indexed_pairs, chunk_size)):
+        yield chunk
@@ -0,0 +1,350 @@
+import argparse
+import asyncio
+import dataclasses
+import functools
+import json
+import os
+import platform
+import random
+import time
+import traceback
+import tracemalloc
+from types import SimpleNamespace
+from typing import List, Tuple, Dict, Optional, Callable, Iterable
+
+from alignment.approaches import approach_00, approach_01, approach_02, approach_03
+from alignment.approaches.approach_04 import align_with_openai_in_windows
+from alignment.evaluation import evaluate
+from alignment.profiling import Profiler
+
+StringAlignment = Tuple[List[str], List[str]]
+AlignSequences = Callable[[List[str], List[str]], List[StringAlignment]]
+
+WORDS = (
+    "apple river stone cloud forest engine garden silver market window candle bridge harbor meadow lantern valley "
+    "copper signal orchard summit thunder ribbon canyon marble feather compass island beacon willow ember glacier "
+    "saddle quiver timber velvet anchor bramble cobalt dagger falcon granite hollow ivory jasper kettle lagoon mantle "
+    "nectar oyster pepper quartz raven spindle tundra umber vessel walnut yarrow zephyr acorn basil cedar dune"
+).split()
+
+
+@dataclasses.dataclass(frozen=True)
+class SyntheticRates:
+    # the probability that a sentence of version 1 is split in two, merged with the next one, deleted, or has some of
+    # its words replaced in version 2, and that a block of version 2 is moved past the next one
+    split: float = 0.05
+    merge: float = 0.05
+    delete: float = 0.02
+    reorder: float = 0.02
+    paraphrase: float = 0.1
+
+
+@dataclasses.dataclass
+class DocumentPair:
+    sequence_1: List[str]
+    sequence_2: List[str]
+    expected_alignments: List[StringAlignment]
+
+
+def generate_sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14)))
+
+
+def format_sentence(words: List[str]) -> str:
+    # version 2 is capitalized and punctuated, like example.sequence_2
+    return " ".join(words).capitalize() + "."
+
+
+def paraphrase(sentence: str, rng: random.Random) -> str:
+    words = sentence.split()
+    for i in rng.sample(range(len(words)), max(len(words) // 4, 1)):
+        words[i] = rng.choice(WORDS)
+    return " ".join(words)
+
+
+def generate_document_pair(
+        n_sentences: int,
+        rates: SyntheticRates = SyntheticRates(),
+        seed: int = 0,
+) -> DocumentPair:
+    rng = random.Random(seed)
+    sequence_1 = [generate_sentence(rng) for _ in range(n_sentences)]
+
+    # version 2 is built as blocks, each the sentences of version 2 for one expected alignment
+    blocks: List[StringAlignment] = []
+    i = 0
+    while i < n_sentences:
+        sentence = sequence_1[i]
+        draw = rng.random()
+        if draw < rates.delete:
+            i += 1
+            continue
+        draw -= rates.delete
+        if draw < rates.merge and i + 1 < n_sentences:
+            merged = sentence.split() + ["and"] + sequence_1[i + 1].split()
+            blocks.append(([sentence, sequence_1[i + 1]], [format_sentence(merged)]))
+            i += 2
+            continue
+        draw -= rates.merge
+
+        if rng.random() < rates.paraphrase:
+            sentence = paraphrase(sentence, rng)
+        words = sentence.split()
+        if draw < rates.split:
+            middle = len(words) // 2
+            blocks.append(([sequence_1[i]], [format_sentence(words[:middle]), format_sentence(words[middle:])]))
+        else:
+            blocks.append(([sequence_1[i]], [format_sentence(words)]))
+        i += 1
+
+    order = list(range(len(blocks)))
+    for k in range(len(order) - 1):
+        if rng.random() < rates.reorder:
+            order[k], order[k + 1] = order[k + 1], order[k]
+
+    sequence_2 = [sentence for k in order for sentence in blocks[k][1]]
+    return DocumentPair(sequence_1, sequence_2, blocks)
+
+
+class StubChatCompletions:
+    # answers approach_04's simple alignment prompt from the expected alignments, the way a perfect model would, so
+    # that only the prompting, windowing and parsing around the model are measured
+    def __init__(self, expected_alignments: List[StringAlignment], latency: float = 0.0):
+        self.latency = latency
+        self.alignments_by_sentence = {
+            sentence: alignment for alignment in expected_alignments for sentence in alignment[0]
+        }
+
+    async def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False) -> SimpleNamespace:
+        await asyncio.sleep(self.latency)
+
+        assignment = messages[0]["content"].split("ASSIGNMENT:\n")[1]
+        version_1, version_2 = (
+            assignment.removeprefix("Version 1:\n").removesuffix("\nAlignments:").split("\nVersion 2:\n")
+        )
+        sentences_1 = [line.split(": ", 1)[1] for line in version_1.split("\n") if line]
+        sentences_2 = {line.split(": ", 1)[1] for line in version_2.split("\n") if line}
+
+        lines = []
+        for sentence in sentences_1:
+            alignment = self.alignments_by_sentence.get(sentence)
+            if alignment is None or alignment[0][0] != sentence or not sentences_2.issuperset(alignment[1]):
+                continue
+            lines.append(f"{' '.join(alignment[0])} -> {' '.join(alignment[1])}")
+        message = SimpleNamespace(content="\n".join(lines))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def align_with_stub(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        expected_alignments: List[StringAlignment],
+        window_size: int = 40,
+        overlap: int = 8,
+) -> List[StringAlignment]:
+    client = SimpleNamespace(chat=SimpleNamespace(completions=StubChatCompletions(expected_alignments)))
+    return align_with_openai_in_windows(
+        sequence_1,
+        sequence_2,
+        window_size,
+        overlap,
+        client=client,
+        deployment="stub",
+        requests_per_second=1e9,
+    )
+
+
+def get_approaches() -> Dict[str, Callable[[DocumentPair], List[StringAlignment]]]:
+    def run(align_sequences: AlignSequences, pair: DocumentPair) -> List[StringAlignment]:
+        return align_sequences(pair.sequence_1, pair.sequence_2)
+
+    return {
+        "approach_00": functools.partial(run, approach_00.align_sequences),
+        "approach_01": functools.partial(run, approach_01.align_sequences),
+        "approach_02": functools.partial(run, approach_02.align_sequences),
+        "approach_03": functools.partial(
+            run,
+            functools.partial(
+                approach_03.align_sequences,
+                seed_weights={"fuzz": 1.0, "distance": 0.05},
+                improvement_weights={"fuzz": 1.0},
+            ),
+        ),
+        "approach_04": lambda pair: align_with_stub(pair.sequence_1, pair.sequence_2, pair.expected_alignments),
+    }
+
+
+# the largest documents each approach is run on by default; the dense score matrices of approach_01 to approach_03
+# grow with the square of the document, and approach_02 also tries every merge of neighbouring sentences
+MAX_SENTENCES = {
+    "approach_00": None,
+    "approach_01": 5_000,
+    "approach_02": 300,
+    "approach_03": 5_000,
+    "approach_04": None,
+}
+
+
+@dataclasses.dataclass
+class BenchmarkResult:
+    approach: str
+    n_sentences: int
+    seconds: Optional[float] = None
+    peak_memory: Optional[int] = None
+    precision: Optional[float] = None
+    recall: Optional[float] = None
+    f1: Optional[float] = None
+    skipped: bool = False
+    error: Optional[str] = None
+    # the time, calls and counts of each stage that reports to the profiler, such as those of approach_03
+    stages: Optional[Dict[str, Dict]] = None
+
+
+def run_benchmark(
+        approach: str,
+        align: Callable[[DocumentPair], List[StringAlignment]],
+        pair: DocumentPair,
+        trace_memory: bool = True,
+) -> BenchmarkResult:
+    # the time is measured without tracemalloc, which slows down allocations; the peak memory takes a second run
+    result = BenchmarkResult(approach, len(pair.sequence_1))
+    try:
+        with Profiler(keep_records=False) as profiler:
+            start = time.perf_counter()
+            alignments = align(pair)
+            result.seconds = time.perf_counter() - start
+        result.stages = profiler.as_dict() or None
+
+        if trace_memory:
+            tracemalloc.start()
+            try:
+                align(pair)
+                result.peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    except Exception:
+        result.error = traceback.format_exc()
+        return result
+
+    evaluation = evaluate(alignments, pair.expected_alignments)
+    result.precision, result.recall, result.f1 = evaluation.precision, evaluation.recall, evaluation.f1
+    return result
+
+
+def run_benchmarks(
+        sizes: Iterable[int],
+        approaches: Optional[Iterable[str]] = None,
+        rates: SyntheticRates = SyntheticRates(),
+        seed: int = 0,
+        max_sentences: Optional[Dict[str, Optional[int]]] = None,
+        trace_memory: bool = True,
+) -> List[BenchmarkResult]:
+    available = get_approaches()
+    approaches = list(approaches or available)
+    max_sentences = MAX_SENTENCES if max_sentences is None else max_sentences
+
+    results = []
+    for n_sentences in sizes:
+        pair = generate_document_pair(n_sentences, rates, seed)
+        for approach in approaches:
+            limit = max_sentences.get(approach)
+            if limit is not None and n_sentences > limit:
+                results.append(BenchmarkResult(approach, n_sentences, skipped=True))
+                continue
+            results.append(run_benchmark(approach, available[approach], pair, trace_memory))
+    return results
+
+
+def save_results(
+        results: List[BenchmarkResult],
+        path: os.PathLike,
+        rates: SyntheticRates = SyntheticRates(),
+        seed: int = 0,
+) -> None:
+    document = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": seed,
+        "rates": dataclasses.asdict(rates),
+        "results": [dataclasses.asdict(result) for result in results],
+    }
+    with open(path, "w") as file:
+        json.dump(document, file, indent=2)
+
+
+def load_results(path: os.PathLike) -> List[BenchmarkResult]:
+    with open(path) as file:
+        return [BenchmarkResult(**result) for result in json.load(file)["results"]]
+
+
+def compare_results(baseline: List[BenchmarkResult], results: List[BenchmarkResult]) -> List[Dict[str, object]]:
+    # for every run found in both, the ratio of its time and memory to the baseline's, and its change in F1
+    baseline_by_run = {(result.approach, result.n_sentences): result for result in baseline}
+    comparisons = []
+    for result in results:
+        previous = baseline_by_run.get((result.approach, result.n_sentences))
+        if previous is None or previous.seconds is None or result.seconds is None:
+            continue
+        comparisons.append({
+            "approach": result.approach,
+            "n_sentences": result.n_sentences,
+            "seconds_ratio": result.seconds / previous.seconds if previous.seconds else None,
+            "peak_memory_ratio": (
+                result.peak_memory / previous.peak_memory
+                if result.peak_memory is not None and previous.peak_memory else None
+            ),
+            "f1_change": result.f1 - previous.f1 if result.f1 is not None and previous.f1 is not None else None,
+        })
+    return comparisons
+
+
+def format_results(results: List[BenchmarkResult]) -> str:
+    columns = ["sentences", "seconds", "peak MiB", "precision", "recall", "F1"]
+    lines = [f"{'approach':<12} " + " ".join(f"{column:>9}" for column in columns)]
+    for result in results:
+        if result.skipped or result.error is not None:
+            status = "skipped" if result.skipped else "error: " + result.error.strip().splitlines()[-1]
+            lines.append(f"{result.approach:<12} {result.n_sentences:>9} {status}")
+            continue
+        peak = f"{result.peak_memory / 2 ** 20:>9.1f}" if result.peak_memory is not None else f"{'':>9}"
+        lines.append(
+            f"{result.approach:<12} {result.n_sentences:>9} {result.seconds:>9.3f} {peak} "
+            f"{result.precision:>9.3f} {result.recall:>9.3f} {result.f1:>9.3f}"
+        )
+    return "\n".join(lines)
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the alignment approaches on synthetic document pairs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--approaches", nargs="+", choices=sorted(MAX_SENTENCES), default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    for name, default in dataclasses.asdict(SyntheticRates()).items():
+        parser.add_argument(f"--{name}-rate", type=float, default=default)
+    parser.add_argument("--no-limits", action="store_true", help="run every approach on every size")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run that measures peak memory")
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--baseline", help="compare with results saved by an earlier run")
+    args = parser.parse_args(arguments)
+
+    rates = SyntheticRates(**{name: getattr(args, f"{name}_rate") for name in dataclasses.asdict(SyntheticRates())})
+    results = run_benchmarks(
+        args.sizes,
+        args.approaches,
+        rates,
+        args.seed,
+        max_sentences={} if args.no_limits else MAX_SENTENCES,
+        trace_memory=not args.no_memory,
+    )
+    print(format_results(results))
+
+    if args.output:
+        save_results(results, args.output, rates, args.seed)
+    if args.baseline:
+        for comparison in compare_results(load_results(args.baseline), results):
+            print(comparison)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+import collections
+import dataclasses
+import functools
+import hashlib
+import os
+import pathlib
+import time
+import uuid
+from typing import List, Dict, Tuple, Optional, Callable
+
+import numpy as np
+
+Embed = Callable[[List[str]], np.array]
+
+CACHE_DIRECTORY_VARIABLE = "ALIGNMENT_EMBEDDING_CACHE"
+DEFAULT_CACHE_DIRECTORY = pathlib.Path.home() / ".cache" / "alignment" / "embeddings"
+
+
+def hash_sentence(sentence: str) -> str:
+    return hashlib.sha1(sentence.encode()).hexdigest()
+
+
+def get_cache_directory() -> pathlib.Path:
+    # read when an embedder is created rather than on import, and from .env without changing os.environ
+    from dotenv import dotenv_values
+    directory = os.getenv(CACHE_DIRECTORY_VARIABLE) or dotenv_values().get(CACHE_DIRECTORY_VARIABLE)
+    return pathlib.Path(directory) if directory else DEFAULT_CACHE_DIRECTORY
+
+
+@dataclasses.dataclass
+class Shard:
+    name: str
+    keys: np.array
+    vectors: np.array
+
+
+class EmbeddingCache:
+    # vectors are stored in append-only shards of hash keys and float32 vectors; the vector files are memory-mapped,
+    # so only the rows that are looked up are ever read from disk. Once `merge_factor` shards of about the same size
+    # have been written, they are merged into one, so a cache holds a few shards per order of magnitude of its size
+    # and every vector is only rewritten a logarithmic number of times
+    def __init__(self, directory: os.PathLike, merge_factor: int = 8):
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.merge_factor = merge_factor
+        self.shards: Dict[int, Shard] = {}
+        self.rows: Dict[str, Tuple[int, int]] = {}
+        self.next_shard = 0
+        for keys_path in sorted(self.directory.glob("*.keys.npy")):
+            name = keys_path.name.removesuffix(".keys.npy")
+            try:
+                self.load_shard(name, np.load(keys_path), np.load(self.vectors_path(name), mmap_mode="r"))
+            except FileNotFoundError:
+                # merged into another shard by another process since the directory was listed
+                continue
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.rows
+
+    def keys_path(self, name: str) -> pathlib.Path:
+        return self.directory / f"{name}.keys.npy"
+
+    def vectors_path(self, name: str) -> pathlib.Path:
+        return self.directory / f"{name}.vectors.npy"
+
+    def load_shard(self, name: str, keys: np.array, vectors: np.array) -> int:
+        shard = self.next_shard
+        self.next_shard += 1
+        self.shards[shard] = Shard(name, keys, vectors)
+        for row, key in enumerate(keys.tolist()):
+            self.rows[key] = (shard, row)
+        return shard
+
+    def get(self, keys: List[str]) -> np.array:
+        locations = np.array([self.rows[key] for key in keys], dtype=np.intp).reshape(-1, 2)
+        dimension = next(iter(self.shards.values())).vectors.shape[1] if self.shards else 0
+        vectors = np.empty((len(locations), dimension), dtype=np.float32)
+        for shard in np.unique(locations[:, 0]).tolist():
+            in_shard = locations[:, 0] == shard
+            vectors[in_shard] = self.shards[shard].vectors[locations[in_shard, 1]]
+        return vectors
+
+    def add(self, keys: List[str], vectors: np.array) -> None:
+        if not keys:
+            return
+        self.write_shard(keys, vectors)
+        self.merge_shards()
+
+    def write_shard(self, keys: List[str], vectors: np.array) -> int:
+        # several processes can share a cache directory, so every shard gets a name no other writer can pick
+        name = f"{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex}"
+
+        # both files are written under temporary names and renamed into place, the keys last, so a shard is only ever
+        # loaded once it is complete
+        files = [
+            (self.vectors_path(name), np.asarray(vectors, dtype=np.float32)),
+            (self.keys_path(name), np.array(keys, dtype="U40")),
+        ]
+        for path, array in files:
+            temporary_path = path.with_name(path.name + ".tmp")
+            with open(temporary_path, "wb") as file:
+                np.save(file, array)
+            os.replace(temporary_path, path)
+
+        return self.load_shard(name, np.array(keys, dtype="U40"), np.load(self.vectors_path(name), mmap_mode="r"))
+
+    def merge_shards(self) -> None:
+        while True:
+            tiers = collections.defaultdict(list)
+            for shard, contents in self.shards.items():
+                tiers[self.tier(len(contents.keys))].append(shard)
+            full_tiers = [shards for shards in tiers.values() if len(shards) >= self.merge_factor]
+            if not full_tiers:
+                return
+            self.merge(full_tiers[0])
+
+    def tier(self, size: int) -> int:
+        # shards in the same tier have the same number of digits in base merge_factor
+        tier = 0
+        while size >= self.merge_factor:
+            size //= self.merge_factor
+            tier += 1
+        return tier
+
+    def merge(self, shards: List[int]) -> None:
+        # the merged shard is in place before the old ones are removed, so a process opening the cache meanwhile finds
+        # every key at least once; processes that have the old files open keep reading them
+        keys, first_rows = np.unique(
+            np.concatenate([self.shards[shard].keys for shard in shards]),
+            return_index=True,
+        )
+        vectors = np.concatenate([self.shards[shard].vectors for shard in shards])[first_rows]
+        self.write_shard(keys.tolist(), vectors)
+
+        for shard in shards:
+            name = self.shards.pop(shard).name
+            # another process merging the same shards may have removed them already
+            for path in (self.keys_path(name), self.vectors_path(name)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+class SentenceEmbedder:
+    def __init__(
+            self,
+            model: str = "en_core_web_sm",
+            cache_directory: Optional[os.PathLike] = None,
+            batch_size: int = 256,
+            embed: Optional[Embed] = None,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        # any function from a list of sentences to one vector per sentence can replace the spaCy pipeline
+        self.embed_uncached = embed or self.embed_with_spacy
+        self.nlp = None
+
+        # vectors from different models are not comparable, so every model gets its own cache
+        if cache_directory is None:
+            cache_directory = get_cache_directory()
+        self.cache = EmbeddingCache(pathlib.Path(cache_directory) / model)
+
+    def embed_with_spacy(self, sentences: List[str]) -> np.array:
+        if self.nlp is None:
+            # spaCy is slow to import and load, so it is only loaded once something has to be embedded
+            import spacy
+            self.nlp = spacy.load(self.model, disable=["parser", "ner", "lemmatizer", "tagger", "attribute_ruler"])
+        return np.array([doc.vector for doc in self.nlp.pipe(sentences, batch_size=self.batch_size)])
+
+    def embed(self, sentences: List[str]) -> np.array:
+        # L2-normalized float32 vectors, one row per sentence; only sentences missing from the cache are embedded
+        keys = [hash_sentence(sentence) for sentence in sentences]
+        missing = {key: sentence for key, sentence in zip(keys, sentences) if key not in self.cache}
+        missing_keys = list(missing)
+        batches = [
+            np.asarray(self.embed_uncached([missing[key] for key in missing_keys[start:start + self.batch_size]]))
+            for start in range(0, len(missing_keys), self.batch_size)
+        ]
+        if batches:
+            # one shard per call, however many batches the sentences were embedded in
+            vectors = np.concatenate(batches).astype(np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            self.cache.add(missing_keys, np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0))
+
+        return self.cache.get(keys)
+
+
+@functools.lru_cache(maxsize=None)
+def get_sentence_embedder(model: str = "en_core_web_sm") -> SentenceEmbedder:
+    return SentenceEmbedder(model)
+
+
+def generate_embedding_similarity_matrix(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        columns: Optional[np.array] = None,
+        embedder: Optional[SentenceEmbedder] = None,
+) -> np.array:
+    if not sequence_1 or not sequence_2:
+        return np.zeros((len(sequence_1), len(sequence_2)) if columns is None else columns.shape)
+
+    embedder = embedder or get_sentence_embedder()
+    vectors_1 = embedder.embed(sequence_1)
+    vectors_2 = embedder.embed(sequence_2)
+    if columns is None:
+        similarities = vectors_1 @ vectors_2.T
+    else:
+        similarities = np.einsum("id,ikd->ik", vectors_1, vectors_2[columns])
+
+    # opposite vectors are no less unrelated than orthogonal ones
+    return np.clip(similarities, 0.0, 1.0).astype(np.float64)
@@ -0,0 +1,110 @@
+import collections
+import dataclasses
+from typing import List, Tuple, Dict, Iterable, Hashable, Any, Sequence
+
+StringAlignment = Tuple[Sequence[str], Sequence[str]]
+CanonicalAlignment = Tuple[Hashable, Hashable]
+# a string alignment, or a span alignment from approach_03; score_quality is imported by the approaches, so this
+# module does not import them back
+Alignment = Any
+
+
+def canonicalize(alignment: Alignment) -> CanonicalAlignment:
+    # a hashable form that is equal for equal alignments: tuples of strings, or (start, end) pairs for span alignments
+    if hasattr(alignment, "span_1"):
+        return (
+            (int(alignment.span_1.start), int(alignment.span_1.end)),
+            (int(alignment.span_2.start), int(alignment.span_2.end)),
+        )
+    side_1, side_2 = alignment
+    return tuple(side_1), tuple(side_2)
+
+
+@dataclasses.dataclass
+class Evaluation:
+    # `total`, `expected` and `unexpected` count every alignment, repeats included, as count_alignments does;
+    # `matched` and `missing` compare the distinct alignments with the distinct expected ones
+    total: int = 0
+    unique: int = 0
+    expected: int = 0
+    unexpected: int = 0
+    matched: int = 0
+    missing: int = 0
+
+    @property
+    def precision(self) -> float:
+        return self.matched / self.unique if self.unique else 0.0
+
+    @property
+    def recall(self) -> float:
+        gold = self.matched + self.missing
+        return self.matched / gold if gold else 0.0
+
+    @property
+    def f1(self) -> float:
+        if not self.precision + self.recall:
+            return 0.0
+        return 2 * self.precision * self.recall / (self.precision + self.recall)
+
+    def counts(self) -> Dict[str, int]:
+        return {"expected": self.expected, "unexpected": self.unexpected, "unique": self.unique, "total": self.total}
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            **dataclasses.asdict(self),
+            "precision": self.precision,
+            "recall": self.recall,
+            "f1": self.f1,
+        }
+
+    def __add__(self, other: 'Evaluation') -> 'Evaluation':
+        # summing the counts of several documents gives their micro-averaged precision, recall and F1
+        return Evaluation(*(
+            getattr(self, field.name) + getattr(other, field.name) for field in dataclasses.fields(Evaluation)
+        ))
+
+
+def evaluate(alignments: Iterable[Alignment], expected_alignments: Iterable[Alignment]) -> Evaluation:
+    occurrences = collections.Counter(canonicalize(alignment) for alignment in alignments)
+    expected_set = {canonicalize(alignment) for alignment in expected_alignments}
+    matched = occurrences.keys() & expected_set
+
+    total = sum(occurrences.values())
+    expected = sum(occurrences[alignment] for alignment in matched)
+    return Evaluation(
+        total=total,
+        unique=len(occurrences),
+        expected=expected,
+        unexpected=total - expected,
+        matched=len(matched),
+        missing=len(expected_set - matched),
+    )
+
+
+def evaluate_documents(
+        documents: Dict[Hashable, Tuple[Iterable[Alignment], Iterable[Alignment]]],
+) -> Tuple[Dict[Hashable, Evaluation], Evaluation]:
+    # documents maps a name to its (alignments, expected_alignments); returns each document's evaluation, and their sum
+    evaluations = {
+        name: evaluate(alignments, expected_alignments)
+        for name, (alignments, expected_alignments) in documents.items()
+    }
+    return evaluations, sum(evaluations.values(), Evaluation())
+
+
+def sort_alignments(
+        alignments: List[Alignment],
+        expected_alignments: List[Alignment],
+) -> Dict[str, List[Alignment]]:
+    # the alignments, in order, by whether they are expected, and the expected alignments that are missing
+    canonical_alignments = {canonicalize(alignment) for alignment in alignments}
+    expected_set = {canonicalize(alignment) for alignment in expected_alignments}
+
+    sorted_alignments = collections.defaultdict(list)
+    for alignment in alignments:
+        key = "expected" if canonicalize(alignment) in expected_set else "unexpected"
+        sorted_alignments[key].append(alignment)
+    for alignment in expected_alignments:
+        if canonicalize(alignment) not in canonical_alignments:
+            sorted_alignments["missing"].append(alignment)
+    return sorted_alignments
@@ -0,0 +1,123 @@
+import collections
+import zlib
+from typing import List, Tuple, Dict, Set, Optional
+
+import numpy as np
+
+from alignment import score_quality, example
+from alignment.approaches.approach_03 import align_span_sequences, span_alignments_to_string_alignments
+from alignment.score_matrix import generate_band_columns
+
+StringAlignment = Tuple[List[str], List[str]]
+
+# a Mersenne prime larger than any crc32 shingle hash; with 32-bit coefficients, a * hash + b still fits in 64 bits
+PRIME = (1 << 61) - 1
+
+
+def shingle(sentence: str, size: int = 3) -> Set[str]:
+    sentence = " ".join(sentence.lower().split())
+    if len(sentence) <= size:
+        return {sentence}
+    return {sentence[i:i + size] for i in range(len(sentence) - size + 1)}
+
+
+class MinHashLSHIndex:
+    # sentences whose signatures agree on every row of at least one band share a bucket; more bands (of fewer rows)
+    # find more candidates, fewer bands find fewer but better ones
+    def __init__(self, num_permutations: int = 64, bands: int = 16, shingle_size: int = 3, seed: int = 0):
+        if num_permutations % bands:
+            raise ValueError(f"{num_permutations} permutations cannot be split into {bands} equal bands.")
+
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 32, num_permutations, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, num_permutations, dtype=np.uint64)
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.buckets: Dict[Tuple[int, bytes], List[int]] = collections.defaultdict(list)
+        self.signatures = np.empty((0, num_permutations), dtype=np.uint64)
+
+    def signature(self, sentence: str) -> np.array:
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode()) for s in shingle(sentence, self.shingle_size)),
+            dtype=np.uint64,
+        )
+        return ((self.a[:, np.newaxis] * hashes + self.b[:, np.newaxis]) % PRIME).min(axis=1)
+
+    def band_keys(self, signature: np.array) -> List[Tuple[int, bytes]]:
+        return [(band, rows.tobytes()) for band, rows in enumerate(np.split(signature, self.bands))]
+
+    def add(self, sentences: List[str]) -> None:
+        start = len(self.signatures)
+        signatures = np.array([self.signature(sentence) for sentence in sentences], dtype=np.uint64)
+        for index, signature in enumerate(signatures, start=start):
+            for key in self.band_keys(signature):
+                self.buckets[key].append(index)
+        self.signatures = np.concatenate([self.signatures, signatures.reshape(len(sentences), -1)])
+
+    def query(self, sentence: str, top_k: int) -> List[int]:
+        # candidates are ranked by the fraction of agreeing signature rows, an estimate of their Jaccard similarity
+        signature = self.signature(sentence)
+        candidates = {index for key in self.band_keys(signature) for index in self.buckets.get(key, ())}
+        if len(candidates) <= top_k:
+            return sorted(candidates)
+
+        candidates = np.fromiter(candidates, dtype=np.intp)
+        similarities = (self.signatures[candidates] == signature).mean(axis=1)
+        return sorted(candidates[np.argsort(-similarities, kind="stable")[:top_k]].tolist())
+
+
+def generate_lsh_columns(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        top_k: int = 8,
+        index: Optional[MinHashLSHIndex] = None,
+) -> np.array:
+    if index is None:
+        index = MinHashLSHIndex()
+        index.add(sequence_2)
+
+    # rows with fewer than top_k candidates are padded with their proportional diagonal column, which keeps the
+    # layout rectangular without adding any new column to score
+    diagonal_columns = generate_band_columns(len(sequence_1), len(sequence_2), 1)[:, 0]
+    columns = np.empty((len(sequence_1), top_k), dtype=np.intp)
+    for i, sentence in enumerate(sequence_1):
+        candidates = index.query(sentence, top_k) or [diagonal_columns[i]]
+        columns[i] = sorted(candidates + [candidates[0]] * (top_k - len(candidates)))
+    return columns
+
+
+def align_sequences(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        seed_weights: Dict[str, float],
+        improvement_weights: Dict[str, float],
+        top_k: int = 8,
+        min_lsh_size: int = 10_000,
+) -> List[StringAlignment]:
+    # small inputs are cheaper to score densely than to index
+    seed_columns = None
+    if len(sequence_1) * len(sequence_2) >= min_lsh_size and len(sequence_2) > top_k:
+        seed_columns = generate_lsh_columns(sequence_1, sequence_2, top_k)
+
+    span_alignments = align_span_sequences(
+        sequence_1,
+        sequence_2,
+        seed_weights,
+        improvement_weights,
+        seed_columns=seed_columns,
+    )
+    return span_alignments_to_string_alignments(span_alignments, sequence_1, sequence_2)
+
+
+if __name__ == '__main__':
+    score_quality.display_results(
+        alignments=align_sequences(
+            example.sequence_1,
+            example.sequence_2,
+            seed_weights={"fuzz": 1.0, "distance": 0.05},
+            improvement_weights={"fuzz": 1.0},
+            min_lsh_size=0,
+            top_k=3,
+        ),
+        expected_alignments=example.expected_alignments,
+    )
@@ -0,0 +1,140 @@
+import contextvars
+import dataclasses
+import json
+import os
+import threading
+import time
+from typing import List, Dict, Optional, Callable
+
+# the profiler of the current context, if any; align_sequences looks it up once per stage, so that nothing else is
+# paid when profiling is off. Stages run in other processes, like score_span_alignments_batch's workers, are not seen
+_current_profiler: contextvars.ContextVar[Optional['Profiler']] = contextvars.ContextVar("profiler", default=None)
+
+
+@dataclasses.dataclass
+class StageRecord:
+    # one run of a stage; start is in seconds from the start of the profiler
+    name: str
+    start: float
+    seconds: float
+    thread: int
+    counts: Dict[str, int] = dataclasses.field(default_factory=dict)
+
+
+@dataclasses.dataclass
+class StageStats:
+    # every run of a stage, summed
+    calls: int = 0
+    seconds: float = 0.0
+    counts: Dict[str, int] = dataclasses.field(default_factory=dict)
+
+    def add(self, record: StageRecord) -> None:
+        self.calls += 1
+        self.seconds += record.seconds
+        for name, count in record.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+
+
+class Stage:
+    # a stage being timed; counts known only once the stage has run, like the number of candidates it produced, are
+    # added with count()
+    def __init__(self, profiler: 'Profiler', name: str, counts: Dict[str, int]):
+        self.profiler = profiler
+        self.name = name
+        self.counts = counts
+        self.start = 0.0
+
+    def count(self, **counts: int) -> None:
+        for name, count in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + int(count)
+
+    def __enter__(self) -> 'Stage':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        end = time.perf_counter()
+        self.profiler.record(StageRecord(
+            self.name,
+            self.start - self.profiler.started,
+            end - self.start,
+            threading.get_ident(),
+            self.counts,
+        ))
+
+
+class NullStage:
+    def count(self, **counts: int) -> None:
+        pass
+
+    def __enter__(self) -> 'NullStage':
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class Profiler:
+    # records every stage run while it is active: `with Profiler() as profiler: align_sequences(...)`. `callback`, if
+    # given, is called with each StageRecord as soon as its stage ends
+    def __init__(self, callback: Optional[Callable[[StageRecord], None]] = None, keep_records: bool = True):
+        self.callback = callback
+        self.keep_records = keep_records
+        self.records: List[StageRecord] = []
+        self.stats: Dict[str, StageStats] = {}
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.tokens: List[contextvars.Token] = []
+
+    def __enter__(self) -> 'Profiler':
+        self.tokens.append(_current_profiler.set(self))
+        return self
+
+    def __exit__(self, *args) -> None:
+        _current_profiler.reset(self.tokens.pop())
+
+    def record(self, record: StageRecord) -> None:
+        with self.lock:
+            if self.keep_records:
+                self.records.append(record)
+            self.stats.setdefault(record.name, StageStats()).add(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def as_dict(self) -> Dict[str, Dict]:
+        return {name: dataclasses.asdict(stats) for name, stats in self.stats.items()}
+
+    def chrome_trace(self) -> Dict[str, List[Dict]]:
+        # complete ("X") events in microseconds, which chrome://tracing and Perfetto nest by time on each thread
+        return {
+            "traceEvents": [
+                {
+                    "name": record.name,
+                    "ph": "X",
+                    "ts": record.start * 1e6,
+                    "dur": record.seconds * 1e6,
+                    "pid": os.getpid(),
+                    "tid": record.thread,
+                    "args": record.counts,
+                }
+                for record in self.records
+            ],
+        }
+
+    def save_chrome_trace(self, path: os.PathLike) -> None:
+        with open(path, "w") as file:
+            json.dump(self.chrome_trace(), file)
+
+
+def stage(name: str, **counts: int):
+    profiler = _current_profiler.get()
+    if profiler is None:
+        return NULL_STAGE
+    return Stage(profiler, name, {key: int(value) for key, value in counts.items()})
+
+
+def get_profiler() -> Optional[Profiler]:
+    return _current_profiler.get()
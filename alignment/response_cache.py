@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+import time
+from typing import Optional
+
+
+def response_cache_key(prompt: str, deployment: Optional[str], template_version: str) -> str:
+    # the same prompt sent to another deployment, or rendered from another template version, is another request
+    return hashlib.sha256(json.dumps([template_version, deployment, prompt]).encode()).hexdigest()
+
+
+class ResponseCache:
+    # model responses in a SQLite table; entries older than `ttl` seconds are misses, and past `max_entries` the least
+    # recently used entries are evicted. A read-only cache never writes, so CI can use a committed or restored cache
+    # without changing it
+    def __init__(
+            self,
+            path: os.PathLike,
+            ttl: Optional[float] = None,
+            max_entries: Optional[int] = None,
+            read_only: bool = False,
+    ):
+        self.path = pathlib.Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+
+        if read_only:
+            self.connection = None
+            if self.path.exists():
+                self.connection = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro", uri=True)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(self.path)
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS responses "
+                    "(key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+                )
+                self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def __len__(self) -> int:
+        if self.connection is None:
+            return 0
+        return self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        row = None
+        if self.connection is not None:
+            row = self.connection.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+
+        now = time.time()
+        if row is None or self.ttl is not None and now - row[1] > self.ttl:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if not self.read_only:
+            with self.connection:
+                self.connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key: str, response: str) -> None:
+        if self.read_only:
+            return
+
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            if self.ttl is not None:
+                self.connection.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            if self.max_entries is not None:
+                self.connection.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
@@ -0,0 +1,126 @@
+import dataclasses
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional
+
+import numpy as np
+from fuzzywuzzy import fuzz
+
+
+@dataclasses.dataclass
+class SparseScoreMatrix:
+    # only the cells listed in `columns` are stored; row i holds the scores of columns[i] (sorted ascending), and
+    # every other cell of the full `shape` is treated as absent
+    values: np.array
+    columns: np.array
+    shape: Tuple[int, int]
+
+    def argmax(self) -> np.array:
+        return self.columns[np.arange(len(self.columns)), self.values.argmax(axis=1)]
+
+    def max(self) -> np.array:
+        return self.values.max(axis=1)
+
+    def to_dense(self, fill_value: float = 0.0) -> np.array:
+        dense = np.full(self.shape, fill_value, dtype=self.values.dtype)
+        np.put_along_axis(dense, self.columns, self.values, axis=1)
+        return dense
+
+
+def generate_band_columns(length_1: int, length_2: int, band_width: int) -> np.array:
+    band_width = min(band_width, length_2)
+    # sentence order is mostly preserved, so row i is expected to match near the proportional column
+    centers = ((np.arange(length_1) + 0.5) * length_2 / max(length_1, 1)).astype(np.intp)
+    starts = np.clip(centers - band_width // 2, 0, length_2 - band_width)
+    return starts[:, np.newaxis] + np.arange(band_width)
+
+
+def generate_fuzz_ratio_matrix(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        normalize: bool = True,
+        dtype: np.dtype = np.float64,
+        out: Optional[np.array] = None,
+        workers: int = 1,
+        block_size: int = 256,
+        columns: Optional[np.array] = None,
+) -> np.array:
+    if columns is not None and len(columns) != len(sequence_1):
+        raise ValueError(f"Expected one row of columns per string, got {len(columns)} for {len(sequence_1)} strings.")
+
+    shape = (len(sequence_1), len(sequence_2)) if columns is None else columns.shape
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.shape != shape:
+        raise ValueError(f"Output buffer has shape {out.shape}, expected {shape}.")
+
+    if columns is None:
+        # identical strings always score identically, so each unique pair is only scored once
+        unique_strings_1, inverse_1 = unique_strings(sequence_1)
+        unique_strings_2, inverse_2 = unique_strings(sequence_2)
+        ratios = generate_fuzz_ratio_blocks(unique_strings_1, unique_strings_2, None, workers, block_size)
+        if len(unique_strings_1) < shape[0] or len(unique_strings_2) < shape[1]:
+            ratios = ratios[np.ix_(inverse_1, inverse_2)]
+    else:
+        ratios = generate_fuzz_ratio_blocks(sequence_1, sequence_2, columns, workers, block_size)
+
+    if normalize:
+        # dividing the integer ratios matches `fuzz.ratio(...) / 100` exactly
+        np.divide(ratios, 100, out=out)
+    else:
+        out[...] = ratios
+    return out
+
+
+def generate_fuzz_ratio_blocks(
+        strings_1: List[str],
+        strings_2: List[str],
+        columns: Optional[np.array],
+        workers: int,
+        block_size: int,
+) -> np.array:
+    shape = (len(strings_1), len(strings_2)) if columns is None else columns.shape
+    ratios = np.empty(shape, dtype=np.uint8)
+    starts = range(0, len(strings_1), block_size)
+    block_columns = [None if columns is None else columns[start:start + block_size] for start in starts]
+
+    if workers > 1 and len(starts) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(starts))) as executor:
+            blocks = executor.map(
+                generate_fuzz_ratio_block,
+                [strings_1[start:start + block_size] for start in starts],
+                [strings_2] * len(starts),
+                block_columns,
+            )
+            for start, block in zip(starts, blocks):
+                ratios[start:start + len(block)] = block
+    else:
+        for start, columns_block in zip(starts, block_columns):
+            block = generate_fuzz_ratio_block(strings_1[start:start + block_size], strings_2, columns_block)
+            ratios[start:start + len(block)] = block
+    return ratios
+
+
+def generate_fuzz_ratio_block(
+        strings_1: List[str],
+        strings_2: List[str],
+        columns: Optional[np.array] = None,
+) -> np.array:
+    if columns is None:
+        block = np.empty((len(strings_1), len(strings_2)), dtype=np.uint8)
+        for i, string_1 in enumerate(strings_1):
+            block[i] = [fuzz.ratio(string_1, string_2) for string_2 in strings_2]
+    else:
+        block = np.empty(columns.shape, dtype=np.uint8)
+        for i, string_1 in enumerate(strings_1):
+            block[i] = [fuzz.ratio(string_1, strings_2[j]) for j in columns[i]]
+    return block
+
+
+def unique_strings(sequence: List[str]) -> Tuple[List[str], np.array]:
+    indices = {}
+    inverse = np.fromiter(
+        (indices.setdefault(string, len(indices)) for string in sequence),
+        dtype=np.intp,
+        count=len(sequence),
+    )
+    return list(indices), inverse
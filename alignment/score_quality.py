@@ -1,43 +1,12 @@
-from collections import defaultdict
+from alignment import evaluation
 
 
 def count_alignments(alignments, expected_alignments):
-    counts = {
-        "expected": 0,
-        "unexpected": 0,
-        "unique": 0,
-        "total": 0,
-    }
-
-    for i, alignment in enumerate(alignments):
-        counts["total"] += 1
-
-        if alignment in expected_alignments:
-            counts["expected"] += 1
-        else:
-            counts["unexpected"] += 1
-
-        if alignment not in alignments[:i]:
-            counts["unique"] += 1
-
-    return counts
+    return evaluation.evaluate(alignments, expected_alignments).counts()
 
 
 def sort_alignments(alignments, expected_alignments):
-    sorted_alignments = defaultdict(list)
-
-    for i, alignment in enumerate(alignments):
-
-        if alignment in expected_alignments:
-            sorted_alignments["expected"].append(alignment)
-        else:
-            sorted_alignments["unexpected"].append(alignment)
-
-    for alignment in expected_alignments:
-        if alignment not in alignments:
-            sorted_alignments["missing"].append(alignment)
-
-    return sorted_alignments
+    return evaluation.sort_alignments(alignments, expected_alignments)
 
 
 def display_results(alignments, expected_alignments):
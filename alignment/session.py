@@ -0,0 +1,170 @@
+from typing import List, Tuple, Dict, Optional
+
+import numpy as np
+
+from alignment.approaches.approach_03 import (
+    Span,
+    SpanAlignment,
+    apply_update_functions,
+    choose_seed_span_alignments,
+    generate_combination_score_matrix,
+    improve_span_alignments,
+    span_alignments_to_string_alignments,
+    validate_weights,
+)
+
+StringAlignment = Tuple[List[str], List[str]]
+Region = Tuple[int, int]
+
+
+def get_span(span_alignment: SpanAlignment, side: int) -> Span:
+    return span_alignment.span_1 if side == 1 else span_alignment.span_2
+
+
+def shift_span_alignment(span_alignment: SpanAlignment, side: int, shift: int) -> SpanAlignment:
+    if shift == 0:
+        return span_alignment
+    span = get_span(span_alignment, side)
+    shifted_span = Span(span.start + shift, span.end + shift)
+    if side == 1:
+        return SpanAlignment(shifted_span, span_alignment.span_2, span_alignment.score)
+    return SpanAlignment(span_alignment.span_1, shifted_span, span_alignment.score)
+
+
+class AlignmentSession:
+    # an aligned pair of documents that is kept up to date as either side is edited. The combination scores of every
+    # sentence pair are kept, so an edit only scores the sentences it adds; the alignments around the edit are then
+    # chosen again from the seed step, with update functions such as the distance penalty applied to that region alone
+    def __init__(
+            self,
+            sequence_1: List[str],
+            sequence_2: List[str],
+            seed_weights: Dict[str, float],
+            improvement_weights: Dict[str, float],
+            neighbourhood: int = 1,
+            max_merge_width: Optional[int] = None,
+            max_skew: Optional[int] = None,
+    ):
+        validate_weights(seed_weights)
+        self.sequence_1 = list(sequence_1)
+        self.sequence_2 = list(sequence_2)
+        self.seed_weights = seed_weights
+        self.improvement_weights = improvement_weights
+        self.neighbourhood = neighbourhood
+        self.max_merge_width = max_merge_width
+        self.max_skew = max_skew
+
+        self.score_matrix = generate_combination_score_matrix(self.sequence_1, self.sequence_2, seed_weights)
+        self.span_alignments = sorted(self.align_region((0, len(self.sequence_1)), (0, len(self.sequence_2))))
+
+    def string_alignments(self) -> List[StringAlignment]:
+        return span_alignments_to_string_alignments(self.span_alignments, self.sequence_1, self.sequence_2)
+
+    def insert(self, side: int, index: int, sentences: List[str]) -> List[SpanAlignment]:
+        return self.replace(side, index, index, sentences)
+
+    def delete(self, side: int, start: int, end: int) -> List[SpanAlignment]:
+        return self.replace(side, start, end, [])
+
+    def replace(self, side: int, start: int, end: int, sentences: List[str]) -> List[SpanAlignment]:
+        # replaces sentences [start, end) of sequence `side` (1 or 2) and returns the updated span alignments
+        if side not in (1, 2):
+            raise ValueError(f"Side must be 1 or 2, got {side}.")
+        sequence = self.sequence_1 if side == 1 else self.sequence_2
+        if not 0 <= start <= end <= len(sequence):
+            raise ValueError(f"Invalid range [{start}, {end}) for a sequence of {len(sequence)} sentences.")
+
+        sentences = list(sentences)
+        sequence[start:end] = sentences
+        self.update_score_matrix(side, start, end, sentences)
+
+        # alignments touching the edit are dropped, and so are the `neighbourhood` closest ones on either side of it
+        shift = len(sentences) - (end - start)
+        before, after = [], []
+        for span_alignment in self.span_alignments:
+            span = get_span(span_alignment, side)
+            if span.end <= start:
+                before.append(span_alignment)
+            elif span.start >= end:
+                after.append(shift_span_alignment(span_alignment, side, shift))
+        before.sort(key=lambda i: get_span(i, side).start)
+        after.sort(key=lambda i: get_span(i, side).start)
+        split_before = max(len(before) - self.neighbourhood, 0)
+        kept = before[:split_before] + after[self.neighbourhood:]
+        boundary_before = before[split_before - 1] if split_before else None
+        boundary_after = after[self.neighbourhood] if len(after) > self.neighbourhood else None
+
+        # the region of the edited side lies between the closest kept alignments, and the region of the other side
+        # between their partners; a moved sentence can put those partners in either order
+        other_side = 3 - side
+        edited_region = (
+            get_span(boundary_before, side).end if boundary_before else 0,
+            get_span(boundary_after, side).start if boundary_after else len(sequence),
+        )
+        other_region = (
+            get_span(boundary_before, other_side).end if boundary_before else 0,
+            get_span(boundary_after, other_side).start if boundary_after else self.score_matrix.shape[other_side - 1],
+        )
+        other_region = (min(other_region), max(other_region))
+
+        # a kept alignment of a moved sentence can still hold sentences of the other region, and wins over the new ones
+        region_1, region_2 = (edited_region, other_region) if side == 1 else (other_region, edited_region)
+        region_spans = [(Span(*region_1), Span(*region_2))] if region_1[0] < region_1[1] else []
+        occupied = [
+            i for i in kept
+            for span_1, span_2 in region_spans
+            if i.span_1.overlaps(span_1) or i.span_2.overlaps(span_2)
+        ]
+        realigned = [
+            span_alignment
+            for span_alignment in self.align_region(region_1, region_2)
+            if not any(span_alignment.overlaps(i) for i in occupied)
+        ]
+        self.span_alignments = sorted(kept + realigned)
+        return self.span_alignments
+
+    def update_score_matrix(self, side: int, start: int, end: int, sentences: List[str]) -> None:
+        # only the scores of the new sentences against the whole other sequence are computed; note that the tf-idf
+        # document frequencies of the kept scores are those of the documents when they were scored
+        if side == 1:
+            new_scores = generate_combination_score_matrix(sentences, self.sequence_2, self.seed_weights)
+            self.score_matrix = np.concatenate(
+                [self.score_matrix[:start], new_scores, self.score_matrix[end:]],
+                axis=0,
+            )
+        else:
+            new_scores = generate_combination_score_matrix(self.sequence_1, sentences, self.seed_weights)
+            self.score_matrix = np.concatenate(
+                [self.score_matrix[:, :start], new_scores, self.score_matrix[:, end:]],
+                axis=1,
+            )
+
+    def align_region(self, region_1: Region, region_2: Region) -> List[SpanAlignment]:
+        (start_1, end_1), (start_2, end_2) = region_1, region_2
+        if not self.seed_weights or start_1 >= end_1 or start_2 >= end_2:
+            return []
+
+        sequence_1 = self.sequence_1[start_1:end_1]
+        sequence_2 = self.sequence_2[start_2:end_2]
+        seed_score_matrix = apply_update_functions(
+            self.score_matrix[start_1:end_1, start_2:end_2].copy(),
+            self.seed_weights,
+        )
+        span_alignments = choose_seed_span_alignments(seed_score_matrix)
+        if self.improvement_weights:
+            span_alignments = improve_span_alignments(
+                span_alignments,
+                sequence_1,
+                sequence_2,
+                self.improvement_weights,
+                max_merge_width=self.max_merge_width,
+                max_skew=self.max_skew,
+            )
+        return [
+            SpanAlignment(
+                Span(start_1 + i.span_1.start, start_1 + i.span_1.end),
+                Span(start_2 + i.span_2.start, start_2 + i.span_2.end),
+                i.score,
+            )
+            for i in span_alignments
+        ]
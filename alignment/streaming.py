@@ -0,0 +1,139 @@
+import itertools
+from typing import List, Tuple, Dict, Iterable, Iterator, Optional
+
+from alignment.approaches.approach_03 import Span, SpanAlignment, align_span_sequences
+
+StringAlignment = Tuple[List[str], List[str]]
+
+
+def align_sequence_streams(
+        stream_1: Iterable[str],
+        stream_2: Iterable[str],
+        seed_weights: Dict[str, float],
+        improvement_weights: Dict[str, float],
+        window_size: int = 200,
+        overlap: int = 50,
+        anchor_score: float = 0.9,
+) -> Iterator[StringAlignment]:
+    if not 0 <= overlap < window_size:
+        raise ValueError(f"Overlap must be between 0 and the window size, got {overlap} for {window_size}.")
+
+    stream_1, stream_2 = iter(stream_1), iter(stream_2)
+    window_1: List[str] = []
+    window_2: List[str] = []
+    exhausted_1 = exhausted_2 = False
+
+    while True:
+        window_1, exhausted_1 = fill_window(window_1, stream_1, window_size, exhausted_1)
+        window_2, exhausted_2 = fill_window(window_2, stream_2, window_size, exhausted_2)
+        if not window_1 and exhausted_1 or not window_2 and exhausted_2:
+            # whatever is left on the other side can never be aligned
+            return
+
+        span_alignments = sorted(align_span_sequences(window_1, window_2, seed_weights, improvement_weights))
+
+        if exhausted_1 and exhausted_2:
+            for span_alignment in span_alignments:
+                yield span_alignment_to_string_alignment(span_alignment, window_1, window_2)
+            return
+
+        # alignments in the overlap at the end of either window may change once more sentences are read, so only
+        # commit up to the last confident 1:1 alignment before it
+        end_1 = len(window_1) if exhausted_1 else len(window_1) - overlap
+        end_2 = len(window_2) if exhausted_2 else len(window_2) - overlap
+        anchor = find_last_anchor(span_alignments, end_1, end_2, anchor_score)
+        if anchor is not None:
+            end_1, end_2 = anchor.span_1.end, anchor.span_2.end
+
+        # an alignment on both sides of the cut in either sequence, like one of a sentence moved across it, is only
+        # committed once every sentence of it is before the cut, so the cut is moved back to before it
+        cut_1, cut_2 = end_1, end_2
+        end_1, end_2 = move_cut_before_crossing_alignments(span_alignments, end_1, end_2)
+        if end_1 or end_2:
+            committed = [i for i in span_alignments if i.span_1.end <= end_1 and i.span_2.end <= end_2]
+        else:
+            # every alignment crosses the cut, and the same windows would be aligned again; the alignments starting
+            # before the cut in both sequences are committed instead, and the other sentences carried into the next
+            # window, or the whole window is committed if no alignment starts before the cut
+            end_1, end_2 = cut_1, cut_2
+            committed = [i for i in span_alignments if i.span_1.start < end_1 and i.span_2.start < end_2]
+            committed = committed or span_alignments
+        for span_alignment in committed:
+            yield span_alignment_to_string_alignment(span_alignment, window_1, window_2)
+
+        # without an anchor, the side that has run out would otherwise drop the sentences whose alignment reaches into
+        # the overlap of the other side; it only gives up the sentences up to the last alignment committed
+        if anchor is None and exhausted_1 != exhausted_2:
+            if exhausted_1:
+                end_1 = max((i.span_1.end for i in committed), default=0)
+            else:
+                end_2 = max((i.span_2.end for i in committed), default=0)
+
+        spans_1 = [i.span_1 for i in span_alignments]
+        spans_2 = [i.span_2 for i in span_alignments]
+        window_1 = remaining_sentences(window_1, [i.span_1 for i in committed], spans_1, end_1)
+        window_2 = remaining_sentences(window_2, [i.span_2 for i in committed], spans_2, end_2)
+
+
+def move_cut_before_crossing_alignments(
+        span_alignments: List[SpanAlignment],
+        end_1: int,
+        end_2: int,
+) -> Tuple[int, int]:
+    # moving the cut back to the start of one crossing alignment can make others cross it, so it is moved until every
+    # alignment is either before the cut in both sequences or after it in both
+    while True:
+        crossing = [
+            i for i in span_alignments
+            if not (i.span_1.end <= end_1 and i.span_2.end <= end_2)
+            and not (i.span_1.start >= end_1 and i.span_2.start >= end_2)
+        ]
+        if not crossing:
+            return end_1, end_2
+        end_1 = min(end_1, *(i.span_1.start for i in crossing))
+        end_2 = min(end_2, *(i.span_2.start for i in crossing))
+
+
+def remaining_sentences(window: List[str], committed_spans: List[Span], spans: List[Span], end: int) -> List[str]:
+    # the sentences from the cut on, and those before it that are aligned but not committed, in their original order;
+    # the other sentences before the cut are left unaligned
+    committed = {k for span in committed_spans for k in range(span.start, span.end)}
+    aligned = {k for span in spans for k in range(span.start, span.end)}
+    return [sentence for k, sentence in enumerate(window) if k not in committed and (k >= end or k in aligned)]
+
+
+def fill_window(window: List[str], stream: Iterator[str], window_size: int, exhausted: bool) -> Tuple[List[str], bool]:
+    if exhausted:
+        return window, exhausted
+    window.extend(itertools.islice(stream, window_size - len(window)))
+    return window, len(window) < window_size
+
+
+def find_last_anchor(
+        span_alignments: List[SpanAlignment],
+        end_1: int,
+        end_2: int,
+        anchor_score: float,
+) -> Optional[SpanAlignment]:
+    anchors = [
+        span_alignment
+        for span_alignment in span_alignments
+        if span_alignment.span_1.end - span_alignment.span_1.start == 1
+        and span_alignment.span_2.end - span_alignment.span_2.start == 1
+        and span_alignment.span_1.end <= end_1
+        and span_alignment.span_2.end <= end_2
+        and span_alignment.score is not None
+        and span_alignment.score >= anchor_score
+    ]
+    return max(anchors, key=lambda i: (i.span_1.end, i.span_2.end), default=None)
+
+
+def span_alignment_to_string_alignment(
+        span_alignment: SpanAlignment,
+        sequence_1: List[str],
+        sequence_2: List[str],
+) -> StringAlignment:
+    return (
+        sequence_1[span_alignment.span_1.start:span_alignment.span_1.end],
+        sequence_2[span_alignment.span_2.start:span_alignment.span_2.end],
+    )
@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Union, Callable, Optional
+
+from openai import AsyncAzureOpenAI
+
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    # answers chat completions like Azure OpenAI, after failing the first `failures` requests with a 429, with a
+    # Retry-After header if `retry_after` is given; `content` is either the response to every prompt or a function of
+    # the prompt
+    def __init__(
+            self,
+            content: Union[str, Callable[[str], str]],
+            failures: int = 0,
+            delay: float = 0.0,
+            retry_after: Optional[float] = None,
+    ):
+        super().__init__(("127.0.0.1", 0), StubOpenAIHandler)
+        self.content = content
+        self.failures = failures
+        self.delay = delay
+        self.retry_after = retry_after
+        self.paths = []
+        self.prompts = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, args=(0.01,), daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+    def client(self) -> AsyncAzureOpenAI:
+        return AsyncAzureOpenAI(
+            azure_endpoint=f"http://127.0.0.1:{self.server_port}",
+            api_key="test",
+            api_version="2024-02-01",
+            max_retries=0,
+        )
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = request["messages"][0]["content"]
+        with server.lock:
+            server.paths.append(self.path)
+            server.prompts.append(prompt)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            failing = len(server.paths) <= server.failures
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+
+        content = server.content(prompt) if callable(server.content) else server.content
+        if failing:
+            body = {"error": {"message": "Rate limit exceeded", "type": "rate_limit", "code": "429"}}
+            status = 429
+        elif request.get("stream"):
+            self.stream(content)
+            return
+        else:
+            body = {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "stub",
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ],
+            }
+            status = 200
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if failing and server.retry_after is not None:
+            self.send_header("Retry-After", str(server.retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stream(self, content: str, chunk_size: int = 7):
+        # server-sent events of a few characters each, the way tokens arrive from the real API
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for start in range(0, len(content), chunk_size):
+            chunk = {
+                "id": "stub",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "stub",
+                "choices": [
+                    {"index": 0, "finish_reason": None, "delta": {"content": content[start:start + chunk_size]}},
+                ],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def align_matching_sentences(prompt: str) -> str:
+    # pairs the sentences of both versions in the assignment that only differ in case and punctuation
+    assignment = prompt.split("ASSIGNMENT:\n")[1]
+    version_1, version_2 = assignment.removeprefix("Version 1:\n").removesuffix("\nAlignments:").split("\nVersion 2:\n")
+    sentences_1 = [line.split(": ", 1)[1] for line in version_1.split("\n") if line]
+    sentences_2 = [line.split(": ", 1)[1] for line in version_2.split("\n") if line]
+    normalized_2 = {sentence.lower().rstrip("."): sentence for sentence in sentences_2}
+    return "\n".join(f"{sentence} -> {normalized_2[sentence]}" for sentence in sentences_1 if sentence in normalized_2)
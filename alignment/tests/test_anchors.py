@@ -0,0 +1,28 @@
+from alignment import example
+from alignment.anchors import align_sequences, find_exact_matches, longest_increasing_matches, normalize_sentence
+
+
+class TestExactMatches:
+    def test_normalize_sentence(self):
+        assert normalize_sentence("  This is MY first   sentence.") == "this is my first sentence"
+
+    def test_only_unique_sentences_match(self):
+        sequence_1 = ["A b.", "c d", "c d", "e f", "?"]
+        sequence_2 = ["e f!", "a B", "c d", "!"]
+        assert find_exact_matches(sequence_1, sequence_2) == [(0, 1), (3, 0)]
+
+    def test_longest_increasing_matches(self):
+        matches = [(0, 0), (1, 5), (2, 1), (3, 2), (4, 6), (5, 3)]
+        assert longest_increasing_matches(matches) == [(0, 0), (2, 1), (3, 2), (5, 3)]
+        assert longest_increasing_matches([]) == []
+
+
+class TestAlignSequences:
+    def test_example(self):
+        alignments = align_sequences(
+            example.sequence_1,
+            example.sequence_2,
+            seed_weights={"fuzz": 1.0, "distance": 0.05},
+            improvement_weights={"fuzz": 1.0},
+        )
+        assert sorted(alignments) == sorted(example.expected_alignments)
@@ -197,3 +197,16 @@ class TestSuggestPotentialSpanAlignments:
 
         suggestions = suggest_potential_span_alignments(initial_span_alignments, length_sequence_1, length_sequence_2)
         assert sorted(suggestions) == sorted(expected_suggestions)
+
+    def test_overlapping_parents_suggest_each_alignment_once(self):
+        length_sequence_1 = length_sequence_2 = 6
+        initial_span_alignments = [
+            SpanAlignment(Span(0, 1), Span(0, 1)),
+            SpanAlignment(Span(1, 2), Span(3, 4)),
+            SpanAlignment(Span(3, 4), Span(1, 2)),
+            SpanAlignment(Span(5, 6), Span(5, 6)),
+        ]
+
+        suggestions = suggest_potential_span_alignments(initial_span_alignments, length_sequence_1, length_sequence_2)
+        assert len(suggestions) == len(set(suggestions))
+        assert not set(suggestions) & set(initial_span_alignments)
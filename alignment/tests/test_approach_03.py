@@ -1,8 +1,26 @@
 import numpy as np
+import pytest
 
+from alignment import example, profiling
 from alignment.approaches.approach_03 import (
+    COMBINATION_FUNCTIONS,
+    CandidateBounds,
+    Span,
+    SpanAlignment,
+    SpanAlignmentArray,
+    SpanScoreCache,
+    SpanStrings,
+    align_sequences,
+    choose_best_span_alignments,
+    choose_seed_span_alignments,
+    generate_banded_score_matrix,
     generate_fuzz_score_matrix,
     generate_score_matrix,
+    improve_span_alignments,
+    iter_potential_span_alignments,
+    score_alignments,
+    score_span_alignments_batch,
+    suggest_potential_span_alignments,
     update_score_matrix_with_distance,
 )
 
@@ -43,6 +61,29 @@ class TestDistanceScoreMatrix:
         updated_score_matrix = update_score_matrix_with_distance(score_matrix, weight=1.0)
         assert (updated_score_matrix != score_matrix).any()
 
+    def test_matches_elementwise_penalty(self):
+        score_matrix = np.random.default_rng(0).random((40, 30))
+        weight = 0.03
+
+        expected_score_matrix = score_matrix.copy()
+        expected_column_index_with_max_score = 0
+        for row_index, row_values in enumerate(expected_score_matrix):
+            for column_index, score in enumerate(row_values):
+                penalty = weight * abs(column_index - expected_column_index_with_max_score)
+                expected_score_matrix[row_index, column_index] = max(score - penalty, 0)
+            expected_column_index_with_max_score = row_values.argmax() + 1
+
+        updated_score_matrix = update_score_matrix_with_distance(score_matrix, weight)
+        assert (updated_score_matrix == expected_score_matrix).all()
+
+    def test_update_in_place(self):
+        score_matrix = np.random.default_rng(0).random((5, 5))
+        expected_score_matrix = update_score_matrix_with_distance(score_matrix, weight=0.1)
+
+        updated_score_matrix = update_score_matrix_with_distance(score_matrix, weight=0.1, copy=False)
+        assert updated_score_matrix is score_matrix
+        assert (score_matrix == expected_score_matrix).all()
+
 
 class TestCombinedScoreMatrix:
     def test_generate_score_matrix(self):
@@ -57,3 +98,273 @@ class TestCombinedScoreMatrix:
 
         score_matrix = generate_score_matrix(sequence_1, sequence_2, weights)
         assert (score_matrix == expected_score_matrix).all()
+
+
+class TestBandedScoreMatrix:
+    weights = {"fuzz": 1.0, "distance": 0.05}
+
+    def test_full_band_matches_dense_matrix(self):
+        sequence_1, sequence_2 = example.sequence_1, example.sequence_2
+        columns = np.tile(np.arange(len(sequence_2)), (len(sequence_1), 1))
+
+        score_matrix = generate_score_matrix(sequence_1, sequence_2, self.weights)
+        banded_score_matrix = generate_score_matrix(sequence_1, sequence_2, self.weights, columns)
+
+        assert (banded_score_matrix.values == score_matrix).all()
+        assert choose_seed_span_alignments(banded_score_matrix) == choose_seed_span_alignments(score_matrix)
+
+    def test_narrow_band_only_scores_band(self):
+        sequence_1, sequence_2 = example.sequence_1, example.sequence_2
+        banded_score_matrix = generate_banded_score_matrix(
+            sequence_1, sequence_2, self.weights, band_width=3, adaptive=False,
+        )
+
+        assert banded_score_matrix.values.shape == (len(sequence_1), 3)
+        assert banded_score_matrix.to_dense().shape == (len(sequence_1), len(sequence_2))
+
+    def test_adaptive_band_widens_for_off_band_matches(self):
+        sequence_1 = ["a b c", "d e f", "g h i", "j k l"]
+        sequence_2 = ["j k l", "g h i", "d e f", "a b c"]
+        banded_score_matrix = generate_banded_score_matrix(sequence_1, sequence_2, {"fuzz": 1.0}, band_width=1)
+
+        assert list(banded_score_matrix.argmax()) == [3, 2, 1, 0]
+
+
+class TestSpanAlignmentArray:
+    span_alignments = [
+        SpanAlignment(Span(0, 2), Span(0, 1), score=0.5),
+        SpanAlignment(Span(0, 1), Span(0, 1)),
+        SpanAlignment(Span(1, 3), Span(1, 2), score=0.25),
+    ]
+
+    def test_span_alignments_are_hashable(self):
+        assert len({*self.span_alignments, SpanAlignment(Span(0, 2), Span(0, 1), score=0.1)}) == 3
+
+    def test_round_trip(self):
+        span_alignment_array = SpanAlignmentArray.from_span_alignments(self.span_alignments)
+        assert span_alignment_array.starts_1.dtype == np.int32
+        assert span_alignment_array.to_span_alignments() == self.span_alignments
+        assert [s.score for s in span_alignment_array] == [0.5, None, 0.25]
+        assert span_alignment_array[1] == self.span_alignments[1]
+
+    def test_concatenate(self):
+        arrays = [SpanAlignmentArray.from_span_alignments(self.span_alignments[i:i + 2]) for i in (0, 2)]
+        assert SpanAlignmentArray.concatenate(arrays).to_span_alignments() == self.span_alignments
+        assert len(SpanAlignmentArray.concatenate([])) == 0
+
+    def test_argsort(self):
+        span_alignment_array = SpanAlignmentArray.from_span_alignments(self.span_alignments)
+        sorted_span_alignments = span_alignment_array[span_alignment_array.argsort()].to_span_alignments()
+        assert sorted_span_alignments == sorted(self.span_alignments)
+
+    def test_pipeline_accepts_arrays(self):
+        sequence_1, sequence_2 = example.sequence_1, example.sequence_2
+        seed_score_matrix = generate_score_matrix(sequence_1, sequence_2, {"fuzz": 1.0, "distance": 0.05})
+        seed_span_alignments = choose_seed_span_alignments(seed_score_matrix)
+        candidates = suggest_potential_span_alignments(seed_span_alignments, len(sequence_1), len(sequence_2))
+        candidates += seed_span_alignments
+
+        scored = score_alignments(candidates, sequence_1, sequence_2, {"fuzz": 1.0})
+        scored_array = score_alignments(
+            SpanAlignmentArray.from_span_alignments(candidates), sequence_1, sequence_2, {"fuzz": 1.0},
+        )
+        assert isinstance(scored_array, SpanAlignmentArray)
+
+        best_span_alignments = choose_best_span_alignments(scored_array)
+        assert isinstance(best_span_alignments, SpanAlignmentArray)
+        assert best_span_alignments.to_span_alignments() == choose_best_span_alignments(scored)
+
+
+class TestChooseBestSpanAlignments:
+    def test_matches_repeated_overlap_filtering(self):
+        rng = np.random.default_rng(0)
+        span_alignments = []
+        for start_1, start_2, length_1, length_2, score in zip(
+                rng.integers(0, 50, 500),
+                rng.integers(0, 50, 500),
+                rng.integers(1, 4, 500),
+                rng.integers(1, 4, 500),
+                rng.integers(0, 20, 500) / 20,
+        ):
+            span_1 = Span(int(start_1), int(start_1 + length_1))
+            span_2 = Span(int(start_2), int(start_2 + length_2))
+            span_alignments.append(SpanAlignment(span_1, span_2, float(score)))
+
+        remaining_span_alignments = sorted(span_alignments, key=lambda i: i.score, reverse=True)
+        expected_span_alignments = []
+        while remaining_span_alignments:
+            chosen_alignment = remaining_span_alignments.pop(0)
+            expected_span_alignments.append(chosen_alignment)
+            remaining_span_alignments = [i for i in remaining_span_alignments if not i.overlaps(chosen_alignment)]
+
+        assert choose_best_span_alignments(span_alignments) == expected_span_alignments
+
+        span_alignment_array = SpanAlignmentArray.from_span_alignments(span_alignments)
+        assert choose_best_span_alignments(span_alignment_array).to_span_alignments() == expected_span_alignments
+
+
+class TestSpanScoreCache:
+    def test_span_strings(self):
+        sequence = ["first", "", "third sentence", "fourth"]
+        span_strings = SpanStrings(sequence)
+        for span in Span(0, len(sequence)).slice():
+            assert span_strings[span] == " ".join(sequence[span.start:span.end])
+        assert span_strings[Span(2, 2)] == ""
+
+    def test_scores_match_score_matrix(self):
+        sequence_1, sequence_2 = example.sequence_1, example.sequence_2
+        weights = {"fuzz": 1.0, "distance": 0.05}
+        span_alignments = list(SpanAlignment(Span(0, 3), Span(0, 3)).slice())
+
+        scores = SpanScoreCache(sequence_1, sequence_2).score_span_alignments(span_alignments, weights)
+        for span_alignment, score in zip(span_alignments, scores):
+            string_1 = " ".join(sequence_1[span_alignment.span_1.start:span_alignment.span_1.end])
+            string_2 = " ".join(sequence_2[span_alignment.span_2.start:span_alignment.span_2.end])
+            assert score == generate_score_matrix([string_1], [string_2], weights)[0, 0]
+
+    def test_hits_misses_and_eviction(self):
+        cache = SpanScoreCache(example.sequence_1, example.sequence_2, max_size=2)
+        span_alignments = [SpanAlignment(Span(i), Span(i)) for i in range(3)]
+
+        cache.score_span_alignments(span_alignments[:2], {"fuzz": 1.0})
+        cache.score_span_alignments(span_alignments[:2], {"fuzz": 1.0})
+        assert cache.cache_info() == (2, 2, 2, 2)
+
+        cache.score_span_alignments(span_alignments[1:], {"fuzz": 1.0})
+        cache.score_span_alignments(span_alignments[:1], {"fuzz": 1.0})
+        assert (cache.hits, cache.misses) == (3, 4)
+
+        cache.score_span_alignments(span_alignments[:1], {"fuzz": 2.0})
+        assert (cache.hits, cache.misses) == (3, 5)
+
+
+class TestImproveSpanAlignments:
+    def test_batches_are_bounded_and_give_the_same_alignments(self):
+        sequence_1, sequence_2 = example.sequence_1, example.sequence_2
+        seed_score_matrix = generate_score_matrix(sequence_1, sequence_2, {"fuzz": 1.0, "distance": 0.05})
+        seed_span_alignments = choose_seed_span_alignments(seed_score_matrix)
+
+        records = []
+        with profiling.Profiler(callback=records.append):
+            batched = improve_span_alignments(seed_span_alignments, sequence_1, sequence_2, {"fuzz": 1.0}, batch_size=5)
+        unbatched = improve_span_alignments(seed_span_alignments, sequence_1, sequence_2, {"fuzz": 1.0})
+
+        assert batched == unbatched
+        rescored = [record.counts["alignments"] for record in records if record.name == "rescoring"]
+        assert len(rescored) > 2 and max(rescored) <= 5
+
+
+class TestScoreSpanAlignmentsBatch:
+    sequence_1, sequence_2 = example.sequence_1, example.sequence_2
+    span_alignments = list(SpanAlignment(Span(0, 4), Span(0, 3)).slice())
+
+    def expected_scores(self, weights):
+        scores = []
+        for span_alignment in self.span_alignments:
+            string_1 = " ".join(self.sequence_1[span_alignment.span_1.start:span_alignment.span_1.end])
+            string_2 = " ".join(self.sequence_2[span_alignment.span_2.start:span_alignment.span_2.end])
+            scores.append(generate_score_matrix([string_1], [string_2], weights)[0, 0])
+        return np.array(scores)
+
+    def test_matches_individual_scores(self):
+        for weights in [{"fuzz": 1.0}, {"fuzz": 0.5, "distance": 0.1}]:
+            scores = score_span_alignments_batch(self.span_alignments, self.sequence_1, self.sequence_2, weights)
+            assert (scores == self.expected_scores(weights)).all()
+
+    def test_span_alignment_array_in_worker_processes(self):
+        scores = score_span_alignments_batch(
+            SpanAlignmentArray.from_span_alignments(self.span_alignments),
+            self.sequence_1,
+            self.sequence_2,
+            {"fuzz": 1.0},
+            workers=2,
+            chunk_size=10,
+        )
+        assert (scores == self.expected_scores({"fuzz": 1.0})).all()
+
+
+class TestWorkers:
+    def test_align_sequences_passes_workers_to_the_fuzz_score_matrix(self, monkeypatch):
+        weights = {"seed_weights": {"fuzz": 1.0, "distance": 0.05}, "improvement_weights": {"fuzz": 1.0}}
+        alignments = align_sequences(example.sequence_1, example.sequence_2, **weights)
+
+        calls = []
+        fuzz_score_matrix = COMBINATION_FUNCTIONS["fuzz"]
+
+        def record_workers(sequence_1, sequence_2, workers=1, **kwargs):
+            calls.append(workers)
+            return fuzz_score_matrix(sequence_1, sequence_2, workers=workers, **kwargs)
+
+        monkeypatch.setitem(COMBINATION_FUNCTIONS, "fuzz", record_workers)
+        for band_width in (None, 2):
+            calls.clear()
+            parallel_alignments = align_sequences(
+                example.sequence_1,
+                example.sequence_2,
+                **weights,
+                band_width=band_width,
+                workers=2,
+            )
+            assert calls[0] == 2
+            if band_width is None:
+                assert parallel_alignments == alignments
+
+
+class TestBoundedCandidates:
+    def test_max_width(self):
+        assert list(Span(0, 3).slice(max_width=2)) == [Span(0, 1), Span(0, 2), Span(1, 2), Span(1, 3), Span(2, 3)]
+        span_alignments = list(SpanAlignment(Span(0, 3), Span(0, 3)).slice(max_width=2))
+        assert len(span_alignments) == 25
+        assert all(s.span_1.end - s.span_1.start <= 2 and s.span_2.end - s.span_2.start <= 2 for s in span_alignments)
+
+    def test_candidates_grow_linearly_with_gap_size(self):
+        def count_candidates(gap_size, max_width, max_skew):
+            seeds = [SpanAlignment(Span(0), Span(0)), SpanAlignment(Span(gap_size + 1), Span(gap_size + 1))]
+            candidates = iter_potential_span_alignments(seeds, gap_size + 2, gap_size + 2, max_width, None, max_skew)
+            return sum(1 for _ in candidates)
+
+        assert count_candidates(20, None, None) > 50 * count_candidates(20, 3, 2)
+        assert count_candidates(40, 3, 2) < 2.2 * count_candidates(20, 3, 2)
+        assert count_candidates(80, 3, 2) < 2.2 * count_candidates(40, 3, 2)
+
+    def test_defaults_are_unbounded(self):
+        seeds = [SpanAlignment(Span(1), Span(1)), SpanAlignment(Span(4), Span(3))]
+        assert list(iter_potential_span_alignments(seeds, 6, 5)) == suggest_potential_span_alignments(seeds, 6, 5)
+
+    def test_score_bound_never_rejects_a_reachable_score(self):
+        sequence_1, sequence_2 = example.sequence_1, example.sequence_2
+        weights = {"fuzz": 1.0, "distance": 0.05}
+        candidates = list(SpanAlignment(Span(0, 4), Span(0, 4)).slice())
+        scores = score_span_alignments_batch(candidates, sequence_1, sequence_2, weights)
+
+        bounds = CandidateBounds(sequence_1, sequence_2, weights, min_score=0.6)
+        kept = [bounds(candidate) for candidate in candidates]
+        assert all(kept[k] for k in np.flatnonzero(scores >= 0.6))
+        assert not all(kept)
+
+    def test_score_bound_allows_for_rounding(self):
+        # fuzz.ratio rounds 2 * 73 / 210 = 0.695 up to 0.70
+        sequence_1, sequence_2 = ["a" * 73], ["a" * 137]
+        weights = {"fuzz": 1.0}
+        candidate = SpanAlignment(Span(0), Span(0))
+        assert score_span_alignments_batch([candidate], sequence_1, sequence_2, weights)[0] == pytest.approx(0.70)
+        assert CandidateBounds(sequence_1, sequence_2, weights, min_score=0.70)(candidate)
+        assert not CandidateBounds(sequence_1, sequence_2, weights, min_score=0.71)(candidate)
+
+    def test_length_ratio(self):
+        bounds = CandidateBounds(["a", "bb bb bb", "c"], ["dd"], {"fuzz": 1.0}, max_length_ratio=2.0)
+        assert bounds(SpanAlignment(Span(0), Span(0)))
+        assert not bounds(SpanAlignment(Span(1), Span(0)))
+        assert not bounds(SpanAlignment(Span(0, 3), Span(0)))
+
+    def test_align_sequences_with_bounds(self):
+        weights = {"seed_weights": {"fuzz": 1.0, "distance": 0.05}, "improvement_weights": {"fuzz": 1.0}}
+        assert align_sequences(
+            example.sequence_1,
+            example.sequence_2,
+            max_merge_width=3,
+            max_skew=2,
+            max_length_ratio=3.0,
+            min_score=0.5,
+            **weights,
+        ) == align_sequences(example.sequence_1, example.sequence_2, **weights)
@@ -0,0 +1,261 @@
+import asyncio
+import email.utils
+import time
+
+import httpx
+import pytest
+from openai import RateLimitError
+
+from alignment.response_cache import ResponseCache
+from alignment.approaches.approach_03 import Span, SpanAlignment
+from alignment.approaches.approach_04 import (
+    AsyncOpenAIAligner,
+    StructuredAlignmentParser,
+    TokenBucket,
+    Window,
+    generate_simple_alignment_prompt,
+    generate_windows,
+    locate_span,
+    parse_retry_after,
+    parse_simple_alignment_response,
+    stitch_window_alignments,
+)
+from stub_openai import StubOpenAIServer, align_matching_sentences
+
+
+RESPONSE = "this is my first sentence -> This is my first sentence.\nthis is my 2nd sentence -> This is my second one."
+
+
+class TestAsyncOpenAIAligner:
+    def test_align(self):
+        with StubOpenAIServer(RESPONSE) as server:
+            aligner = AsyncOpenAIAligner(server.client(), deployment="stub-deployment")
+            alignments = asyncio.run(aligner.align(["this is my first sentence"], ["This is my first sentence."]))
+
+        assert alignments == [
+            (["this is my first sentence"], ["This is my first sentence."]),
+            (["this is my 2nd sentence"], ["This is my second one."]),
+        ]
+        assert server.paths[0].startswith("/openai/deployments/stub-deployment/chat/completions")
+
+    def test_identical_requests_are_coalesced(self):
+        with StubOpenAIServer(RESPONSE, delay=0.05) as server:
+            aligner = AsyncOpenAIAligner(server.client(), deployment="stub", requests_per_second=100)
+            results = asyncio.run(aligner.align_many([(["a"], ["b"])] * 5 + [(["c"], ["d"])]))
+
+        assert len(results) == 6
+        assert len(server.paths) == 2
+
+    def test_bounded_concurrency(self):
+        with StubOpenAIServer(RESPONSE, delay=0.05) as server:
+            aligner = AsyncOpenAIAligner(server.client(), deployment="stub", max_concurrency=2, requests_per_second=100)
+            asyncio.run(aligner.align_many([([str(i)], ["b"]) for i in range(6)]))
+
+        assert len(server.paths) == 6
+        assert server.max_active == 2
+
+    def test_retries_rate_limited_requests(self):
+        with StubOpenAIServer(RESPONSE, failures=2) as server:
+            aligner = AsyncOpenAIAligner(server.client(), deployment="stub", backoff_base=0.01)
+            alignments = asyncio.run(aligner.align(["a"], ["b"]))
+
+        assert len(alignments) == 2
+        assert len(server.paths) == 3
+
+    def test_gives_up_after_max_retries(self):
+        with StubOpenAIServer(RESPONSE, failures=10) as server:
+            aligner = AsyncOpenAIAligner(server.client(), deployment="stub", max_retries=1, backoff_base=0.01)
+            with pytest.raises(RateLimitError):
+                asyncio.run(aligner.align(["a"], ["b"]))
+
+        assert len(server.paths) == 2
+
+    def test_waits_as_long_as_the_server_asks(self):
+        with StubOpenAIServer(RESPONSE, failures=1, retry_after=0.3) as server:
+            aligner = AsyncOpenAIAligner(server.client(), deployment="stub", backoff_base=0.001)
+            start = time.monotonic()
+            asyncio.run(aligner.align(["a"], ["b"]))
+
+        assert time.monotonic() - start >= 0.3
+        assert len(server.paths) == 2
+
+    def test_backoff_does_not_hold_a_concurrency_slot(self):
+        with StubOpenAIServer(RESPONSE, failures=1, retry_after=0.2) as server:
+            aligner = AsyncOpenAIAligner(server.client(), deployment="stub", max_concurrency=1, requests_per_second=100)
+            asyncio.run(aligner.align_many([(["a"], ["b"]), (["c"], ["d"])]))
+
+        # the second prompt is sent while the first one backs off
+        assert server.prompts[0] == server.prompts[2] != server.prompts[1]
+        assert server.max_active == 1
+
+    def test_parse_retry_after(self):
+        def rate_limit_error(headers):
+            response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "http://stub"))
+            return RateLimitError("Rate limit exceeded", response=response, body=None)
+
+        assert parse_retry_after(rate_limit_error({"retry-after-ms": "1500", "retry-after": "3"})) == 1.5
+        assert parse_retry_after(rate_limit_error({"retry-after": "3"})) == 3.0
+        date = email.utils.formatdate(time.time() + 60, usegmt=True)
+        assert 50 < parse_retry_after(rate_limit_error({"retry-after": date})) <= 60
+        assert parse_retry_after(rate_limit_error({"retry-after": "soon"})) is None
+        assert parse_retry_after(rate_limit_error({})) is None
+        assert parse_retry_after(ValueError()) is None
+
+
+class TestTokenBucket:
+    def test_rate_limit(self):
+        async def acquire_all(bucket):
+            for _ in range(5):
+                await bucket.acquire()
+
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        asyncio.run(acquire_all(bucket))
+        # the first token is available immediately, the other four take 1 / 50 s each
+        assert time.monotonic() - start >= 0.075
+
+
+class TestWindows:
+    def test_windows_cover_both_sequences(self):
+        sequence_1 = [f"sentence {i}" for i in range(100)]
+        sequence_2 = [f"Sentence {i}." for i in range(20)] + sequence_1[20:]
+        windows = generate_windows(sequence_1, sequence_2, window_size=40, overlap=8)
+
+        assert [(window.start_1, window.end_1) for window in windows] == [(0, 40), (32, 72), (64, 100)]
+        assert windows[0].start_2 == 0 and windows[-1].end_2 == 100
+        # identical sentences anchor the windows in sequence_2
+        assert (windows[1].start_2, windows[1].end_2) == (24, 80)
+
+    def test_anchors_follow_insertions(self):
+        sequence_1 = [f"sentence {i}" for i in range(60)]
+        sequence_2 = [f"inserted {i}" for i in range(30)] + sequence_1
+        windows = generate_windows(sequence_1, sequence_2, window_size=20, overlap=4)
+        assert [window.start_2 for window in windows[1:]] == [30 + window.start_1 - 4 for window in windows[1:]]
+
+    def test_short_sequences_have_one_window(self):
+        assert generate_windows(["a", "b"], ["c"], window_size=40, overlap=8) == [Window(0, 2, 0, 1)]
+
+    def test_stitching_keeps_one_alignment_per_owner(self):
+        sequence_1 = ["a", "b", "c", "d", "e", "f"]
+        windows = [Window(0, 4, 0, 4), Window(2, 6, 2, 6)]
+        window_alignments = [
+            [(["a"], ["A"]), (["b"], ["B"]), (["c"], ["C?"]), (["d"], ["D?"])],
+            [(["c"], ["C"]), (["d"], ["D"]), (["e f"], ["EF"]), (["unknown"], ["X"])],
+        ]
+        alignments = stitch_window_alignments(windows, window_alignments, sequence_1)
+        assert alignments == [(["a"], ["A"]), (["b"], ["B"]), (["c"], ["C?"]), (["d"], ["D"]), (["e f"], ["EF"]),
+                              (["unknown"], ["X"])]
+
+    def test_align_in_windows(self):
+        sequence_1 = [f"sentence number {i}" for i in range(50)]
+        sequence_2 = [f"Sentence number {i}." for i in range(50)]
+        with StubOpenAIServer(align_matching_sentences) as server:
+            aligner = AsyncOpenAIAligner(server.client(), deployment="stub", requests_per_second=100)
+            alignments = asyncio.run(aligner.align_in_windows(sequence_1, sequence_2, window_size=20, overlap=4))
+
+        assert len(server.paths) == 3
+        assert alignments == [([sentence_1], [sentence_2]) for sentence_1, sentence_2 in zip(sequence_1, sequence_2)]
+
+    def test_content_defined_windows_survive_edits(self):
+        sequence_1 = [f"sentence number {i}" for i in range(300)]
+        sequence_2 = [f"Sentence number {i}." for i in range(300)]
+        edited_sequence_1 = sequence_1[:150] + ["an inserted sentence"] + sequence_1[150:]
+
+        def prompts(sequence):
+            windows = generate_windows(sequence, sequence_2, window_size=20, overlap=4, content_defined=True)
+            return {
+                generate_simple_alignment_prompt(sequence[w.start_1:w.end_1], sequence_2[w.start_2:w.end_2])
+                for w in windows
+            }
+
+        original_prompts, edited_prompts = prompts(sequence_1), prompts(edited_sequence_1)
+        assert len(original_prompts) > 10
+        # the window ending in the edit, and the one or two windows the inserted sentence is cut into or next to
+        assert len(edited_prompts - original_prompts) <= 3
+
+    def test_content_defined_windows_cover_sequence_1(self):
+        sequence_1 = [f"sentence number {i}" for i in range(300)]
+        windows = generate_windows(sequence_1, sequence_1, window_size=20, overlap=4, content_defined=True)
+        assert windows[0].start_1 == 0 and windows[-1].end_1 == 300
+        assert all(next_window.start_1 < window.end_1 for window, next_window in zip(windows, windows[1:]))
+
+
+class TestCachedAligner:
+    def test_cached_responses_skip_the_network(self, tmp_path):
+        sequence_1 = [f"sentence number {i}" for i in range(50)]
+        sequence_2 = [f"Sentence number {i}." for i in range(50)]
+        cache = ResponseCache(tmp_path / "responses.sqlite")
+        with StubOpenAIServer(align_matching_sentences) as server:
+            aligner = AsyncOpenAIAligner(server.client(), deployment="stub", requests_per_second=100, cache=cache)
+            alignments = asyncio.run(aligner.align_in_windows(sequence_1, sequence_2, window_size=20, overlap=4))
+            assert len(server.paths) == 3
+
+            aligner = AsyncOpenAIAligner(server.client(), deployment="stub", requests_per_second=100, cache=cache)
+            cached_alignments = asyncio.run(aligner.align_in_windows(sequence_1, sequence_2, 20, 4))
+            assert len(server.paths) == 3
+
+            # another deployment does not share responses
+            aligner = AsyncOpenAIAligner(server.client(), deployment="other", requests_per_second=100, cache=cache)
+            asyncio.run(aligner.align(sequence_1[:3], sequence_2[:3]))
+            assert len(server.paths) == 4
+
+        assert cached_alignments == alignments
+
+
+class TestParsers:
+    def test_simple_parser_skips_blank_and_malformed_lines(self):
+        response = "\na -> A\n\nnot an alignment\n  b -> B  \n"
+        assert parse_simple_alignment_response(response) == [(["a"], ["A"]), (["b"], ["B"])]
+
+    def test_simple_parser_uses_sentences_to_split_arrows(self):
+        sequence_1 = ["x -> y is a function.", "done."]
+        sequence_2 = ["The function x -> y.", "Done."]
+        response = "x -> y is a function. -> The function x -> y.\ndone. -> Done."
+        assert parse_simple_alignment_response(response, sequence_1, sequence_2) == [
+            (["x -> y is a function."], ["The function x -> y."]),
+            (["done."], ["Done."]),
+        ]
+
+    def test_locate_span(self):
+        sentences = ["one.", "two.", "three.", "four."]
+        assert locate_span("two.  three.", sentences, 0, 4) == Span(1, 3)
+        assert locate_span("three.", sentences, 0, 4) == Span(2, 3)
+        assert locate_span("three. four.", sentences, 0, 3) is None
+        assert locate_span("two and a half.", sentences, 0, 4) is None
+
+    def test_structured_parser_is_incremental(self):
+        response = (
+            'Sure! {"version_1": [0], "version_2": [0]}\n'
+            '{"version_1": [1, 2], "version_2": [1], "note": "a } in a \\"string\\""}\n'
+            '{"version_1": [3, 5], "version_2": [2]}\n'
+            '{"version_1": [9], "version_2": [2]}\n'
+            '{"version_1": [3], "version_2": '
+            '[2]}'
+        )
+        parser = StructuredAlignmentParser(length_1=4, length_2=3)
+        span_alignments = []
+        for character in response:
+            parsed = parser.feed(character)
+            # an alignment is available as soon as its closing brace arrives
+            assert not parsed or character == "}"
+            span_alignments.extend(parsed)
+
+        assert span_alignments == [
+            SpanAlignment(Span(0, 1), Span(0, 1)),
+            SpanAlignment(Span(1, 3), Span(1, 2)),
+            SpanAlignment(Span(3, 4), Span(2, 3)),
+        ]
+
+    def test_stream_span_alignments(self, tmp_path):
+        response = '{"version_1": [0], "version_2": [0]}\n{"version_1": [1, 2], "version_2": [1]}\n'
+        cache = ResponseCache(tmp_path / "responses.sqlite")
+        with StubOpenAIServer(response) as server:
+            aligner = AsyncOpenAIAligner(server.client(), deployment="stub", cache=cache)
+            span_alignments = asyncio.run(aligner.align_spans(["a", "b", "c"], ["A", "BC"]))
+            cached_span_alignments = asyncio.run(aligner.align_spans(["a", "b", "c"], ["A", "BC"]))
+
+        assert span_alignments == cached_span_alignments == [
+            SpanAlignment(Span(0, 1), Span(0, 1)),
+            SpanAlignment(Span(1, 3), Span(1, 2)),
+        ]
+        assert len(server.paths) == 1
@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from alignment.approaches.approach_05 import Bead, BeadScorer, align_beads, align_sequences, generate_bead_shapes
+
+
+class TestBeadShapes:
+    def test_default_bead_shapes(self):
+        assert generate_bead_shapes() == [(1, 1), (1, 0), (0, 1), (1, 2), (2, 1), (2, 2)]
+
+    def test_larger_bead_shapes(self):
+        assert (3, 1) in generate_bead_shapes((3, 1))
+        assert (1, 2) not in generate_bead_shapes((3, 1))
+
+
+class TestAlignBeads:
+    def test_merges_and_deletions(self):
+        sequence_1 = ["the cat sat on the mat", "it was a sunny day", "and the birds sang", "nothing like this"]
+        sequence_2 = ["The cat sat on the mat.", "It was a sunny day, and the birds sang."]
+
+        beads = align_beads(sequence_1, sequence_2)
+        assert beads == [Bead(0, 1, 0, 1), Bead(1, 3, 1, 2), Bead(3, 4, 2, 2)]
+
+        alignments = align_sequences(sequence_1, sequence_2)
+        assert alignments == [
+            (["the cat sat on the mat"], ["The cat sat on the mat."]),
+            (["it was a sunny day", "and the birds sang"], ["It was a sunny day, and the birds sang."]),
+        ]
+
+    def test_empty_sequences(self):
+        assert align_beads([], ["a sentence"]) == [Bead(0, 0, 0, 1)]
+        assert align_sequences([], []) == []
+
+    def test_linear_memory_finds_an_optimal_alignment(self):
+        random.seed(0)
+        words = "alpha beta gamma delta epsilon zeta eta theta iota kappa".split()
+        sequence_1 = [" ".join(random.choices(words, k=5)) for _ in range(30)]
+        sequence_2 = [sentence.upper() if random.random() < 0.3 else sentence for sentence in sequence_1]
+        sequence_2[10:12] = [sequence_2[10] + " " + sequence_2[11]]
+        del sequence_2[20]
+
+        scorer = BeadScorer(sequence_1, sequence_2, generate_bead_shapes(), 0.5, 0.0, 0.0)
+        beads = align_beads(sequence_1, sequence_2)
+        linear_memory_beads = align_beads(sequence_1, sequence_2, linear_memory=True)
+
+        assert linear_memory_beads[0].start_1 == linear_memory_beads[0].start_2 == 0
+        assert linear_memory_beads[-1].end_1 == len(sequence_1)
+        assert linear_memory_beads[-1].end_2 == len(sequence_2)
+        assert all(
+            a.end_1 == b.start_1 and a.end_2 == b.start_2
+            for a, b in zip(linear_memory_beads, linear_memory_beads[1:])
+        )
+        assert (
+            sum(scorer.score_bead(bead) for bead in linear_memory_beads) ==
+            sum(scorer.score_bead(bead) for bead in beads)
+        )
+
+    def test_beads_are_optimal_with_skip_score_and_merge_penalty(self):
+        random.seed(1)
+        words = "alpha beta gamma delta epsilon".split()
+        for _ in range(150):
+            sequence_1 = [" ".join(random.choices(words, k=3)) for _ in range(random.randint(1, 4))]
+            sequence_2 = [" ".join(random.choices(words, k=3)) for _ in range(random.randint(1, 4))]
+            skip_score = random.choice([-0.3, -0.2, -0.05, 0.1])
+            merge_penalty = random.choice([0.0, 0.1, 0.3])
+            shapes = generate_bead_shapes()
+            scorer = BeadScorer(sequence_1, sequence_2, shapes, 0.5, skip_score, merge_penalty)
+
+            def best_score(i, j):
+                # brute force over every path of beads from (i, j) to the end of both sequences
+                if (i, j) == (len(sequence_1), len(sequence_2)):
+                    return 0.0
+                scores = [
+                    scorer.score_bead(Bead(i, i + length_1, j, j + length_2)) + best_score(i + length_1, j + length_2)
+                    for length_1, length_2 in shapes
+                    if i + length_1 <= len(sequence_1) and j + length_2 <= len(sequence_2)
+                ]
+                return max(scores, default=-float("inf"))
+
+            expected = best_score(0, 0)
+            for linear_memory in (False, True):
+                beads = align_beads(
+                    sequence_1, sequence_2, skip_score=skip_score, merge_penalty=merge_penalty,
+                    linear_memory=linear_memory,
+                )
+                assert sum(scorer.score_bead(bead) for bead in beads) == pytest.approx(expected)
@@ -0,0 +1,74 @@
+import asyncio
+
+from alignment import example
+from alignment.approaches.approach_03 import Span, SpanAlignment, span_alignments_to_string_alignments
+from alignment.approaches.approach_04 import AsyncOpenAIAligner
+from alignment.approaches.approach_06 import (
+    Gap,
+    align_span_sequences_with_cascade,
+    choose_confident_span_alignments,
+    find_gaps,
+    offset_gap_span_alignments,
+)
+from stub_openai import StubOpenAIServer
+
+
+def span_alignment(start_1, end_1, start_2, end_2, score=None):
+    return SpanAlignment(Span(start_1, end_1), Span(start_2, end_2), score)
+
+
+class TestGaps:
+    def test_confident_alignments_are_monotone(self):
+        span_alignments = [
+            span_alignment(0, 1, 0, 1, 0.95),
+            span_alignment(1, 2, 4, 5, 0.95),
+            span_alignment(2, 3, 1, 2, 0.95),
+            span_alignment(3, 4, 2, 3, 0.95),
+            span_alignment(4, 5, 3, 4, 0.5),
+        ]
+        assert choose_confident_span_alignments(span_alignments, 0.9) == [
+            span_alignments[0], span_alignments[2], span_alignments[3],
+        ]
+
+    def test_find_gaps(self):
+        confident_span_alignments = [span_alignment(1, 2, 0, 1), span_alignment(2, 4, 1, 2), span_alignment(6, 7, 4, 5)]
+        assert find_gaps(confident_span_alignments, 9, 5) == [Gap(4, 6, 2, 4)]
+        assert find_gaps([], 2, 3) == [Gap(0, 2, 0, 3)]
+
+    def test_offset_gap_span_alignments(self):
+        gap_span_alignments = [span_alignment(2, 3, 1, 2), span_alignment(0, 2, 0, 1), span_alignment(1, 3, 1, 2)]
+        assert offset_gap_span_alignments(gap_span_alignments, Gap(1, 4, 1, 3)) == [
+            span_alignment(1, 3, 1, 2), span_alignment(3, 4, 2, 3),
+        ]
+
+
+def answer_gaps(prompt: str) -> str:
+    # the gap around the merged sentences, if it starts with them in both versions; any other gap gets an answer that
+    # points outside it
+    assignment = prompt.split("ASSIGNMENT:")[1]
+    if "0: this is my 2nd sentence" in assignment and "0: This is my second sentence," in assignment:
+        return '{"version_1": [0, 1], "version_2": [0]}\n'
+    return '{"version_1": [0], "version_2": [5]}\n'
+
+
+class TestCascade:
+    def test_only_gaps_reach_the_llm(self):
+        with StubOpenAIServer(answer_gaps) as server:
+            aligner = AsyncOpenAIAligner(server.client(), deployment="stub", requests_per_second=100)
+            span_alignments = asyncio.run(align_span_sequences_with_cascade(
+                example.sequence_1,
+                example.sequence_2,
+                seed_weights={"fuzz": 1.0, "distance": 0.05},
+                improvement_weights={"fuzz": 1.0},
+                aligner=aligner,
+                confidence=0.9,
+            ))
+
+        # the merged sentences, and whichever sentence is out of order after the swap of the fifth and sixth
+        assert 1 <= len(server.paths) <= 2
+        starts = [(alignment.span_1.start, alignment.span_2.start) for alignment in span_alignments]
+        assert starts == sorted(starts) and sorted(start for _, start in starts) == [start for _, start in starts]
+
+        alignments = span_alignments_to_string_alignments(span_alignments, example.sequence_1, example.sequence_2)
+        assert (example.sequence_1[1:3], example.sequence_2[1:2]) in alignments
+        assert sum(alignment in example.expected_alignments for alignment in alignments) >= 4
@@ -0,0 +1,48 @@
+import threading
+
+from alignment import example
+from alignment.approaches.approach_03 import align_sequences
+from alignment.batch import align_many, iter_align_many
+
+
+class TestAlignMany:
+    weights = {"seed_weights": {"fuzz": 1.0, "distance": 0.05}, "improvement_weights": {"fuzz": 1.0}}
+    pairs = [
+        (example.sequence_1, example.sequence_2),
+        (example.sequence_1[:4], example.sequence_2[:3]),
+        # approach_03 cannot align against an empty sequence
+        (example.sequence_1, []),
+        (example.sequence_2, example.sequence_1),
+    ]
+
+    def expected_alignments(self):
+        return [align_sequences(*pair, **self.weights) for pair in [self.pairs[0], self.pairs[1], self.pairs[3]]]
+
+    def test_serial(self):
+        results = align_many(self.pairs, "approach_03", chunk_size=3, **self.weights)
+
+        assert [result.index for result in results] == [0, 1, 2, 3]
+        assert [result.ok for result in results] == [True, True, False, True]
+        assert "ValueError" in results[2].error
+        assert [results[0].alignments, results[1].alignments, results[3].alignments] == self.expected_alignments()
+
+    def test_process_pool(self):
+        results = align_many(iter(self.pairs), "approach_03", workers=2, chunk_size=1, **self.weights)
+
+        assert [result.index for result in results] == [0, 1, 2, 3]
+        assert [result.ok for result in results] == [True, True, False, True]
+        assert [results[0].alignments, results[1].alignments, results[3].alignments] == self.expected_alignments()
+
+    def test_unordered(self):
+        results = align_many(self.pairs, "approach_00", workers=2, chunk_size=1, ordered=False)
+        assert sorted(result.index for result in results) == [0, 1, 2, 3]
+        assert all(result.ok for result in results)
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        results = []
+        for result in iter_align_many(self.pairs * 10, "approach_00", chunk_size=2, cancel=cancel):
+            results.append(result)
+            if len(results) == 3:
+                cancel.set()
+        assert [result.index for result in results] == [0, 1, 2, 3]
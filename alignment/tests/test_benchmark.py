@@ -0,0 +1,79 @@
+import collections
+
+from alignment.benchmark import (
+    BenchmarkResult,
+    SyntheticRates,
+    compare_results,
+    generate_document_pair,
+    load_results,
+    run_benchmarks,
+    save_results,
+)
+
+
+class TestGenerateDocumentPair:
+    def test_same_seed_same_pair(self):
+        assert generate_document_pair(50, seed=3) == generate_document_pair(50, seed=3)
+        assert generate_document_pair(50, seed=3) != generate_document_pair(50, seed=4)
+
+    def test_without_edits_every_sentence_is_aligned_in_order(self):
+        rates = SyntheticRates(split=0, merge=0, delete=0, reorder=0, paraphrase=0)
+        pair = generate_document_pair(20, rates)
+
+        assert len(pair.sequence_2) == 20
+        assert pair.expected_alignments == [([s1], [s2]) for s1, s2 in zip(pair.sequence_1, pair.sequence_2)]
+        assert all(s2 == s1.capitalize() + "." for s1, s2 in zip(pair.sequence_1, pair.sequence_2))
+
+    def test_expected_alignments_partition_both_sequences(self):
+        rates = SyntheticRates(split=0.2, merge=0.2, delete=0.1, reorder=0.2, paraphrase=0.3)
+        pair = generate_document_pair(300, rates)
+
+        aligned_1 = [sentence for sentences_1, _ in pair.expected_alignments for sentence in sentences_1]
+        aligned_2 = [sentence for _, sentences_2 in pair.expected_alignments for sentence in sentences_2]
+        assert collections.Counter(aligned_2) == collections.Counter(pair.sequence_2)
+        assert set(aligned_1) <= set(pair.sequence_1)
+        assert len(aligned_1) == len(set(aligned_1)) < len(pair.sequence_1)
+
+        shapes = collections.Counter((len(s1), len(s2)) for s1, s2 in pair.expected_alignments)
+        assert shapes[(1, 2)] and shapes[(2, 1)] and shapes[(1, 1)]
+
+    def test_reordering_moves_blocks(self):
+        pair = generate_document_pair(200, SyntheticRates(split=0, merge=0, delete=0, reorder=0.3, paraphrase=0))
+        positions = {sentence: i for i, sentence in enumerate(pair.sequence_2)}
+        order = [positions[sentences_2[0]] for _, sentences_2 in pair.expected_alignments]
+        assert order != sorted(order)
+
+
+class TestRunBenchmarks:
+    def test_every_approach_runs(self):
+        results = run_benchmarks([10, 30])
+
+        assert [(result.approach, result.n_sentences) for result in results] == [
+            (f"approach_0{i}", n) for n in (10, 30) for i in range(5)
+        ]
+        for result in results:
+            assert result.error is None
+            assert result.seconds >= 0
+            assert result.peak_memory > 0
+            assert 0 <= result.f1 <= 1
+
+    def test_stub_model_aligns_unedited_documents_perfectly(self):
+        rates = SyntheticRates(split=0, merge=0, delete=0, reorder=0, paraphrase=0)
+        [result] = run_benchmarks([100], ["approach_04"], rates, trace_memory=False)
+        assert result.f1 == 1.0
+        assert result.peak_memory is None
+
+    def test_large_documents_are_skipped_for_quadratic_approaches(self):
+        results = run_benchmarks([20], ["approach_00", "approach_02"], max_sentences={"approach_02": 10})
+        assert [result.skipped for result in results] == [False, True]
+
+    def test_results_round_trip_and_compare(self, tmp_path):
+        results = run_benchmarks([10], ["approach_00", "approach_01"], trace_memory=False)
+        save_results(results, tmp_path / "results.json")
+        assert load_results(tmp_path / "results.json") == results
+
+        slower = [BenchmarkResult(**{**vars(result), "seconds": result.seconds * 2}) for result in results]
+        comparisons = compare_results(results, slower)
+        assert [comparison["approach"] for comparison in comparisons] == ["approach_00", "approach_01"]
+        assert all(abs(comparison["seconds_ratio"] - 2) < 1e-9 for comparison in comparisons)
+        assert all(comparison["f1_change"] == 0 for comparison in comparisons)
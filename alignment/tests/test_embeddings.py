@@ -0,0 +1,138 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from alignment.embeddings import (
+    CACHE_DIRECTORY_VARIABLE,
+    EmbeddingCache,
+    SentenceEmbedder,
+    generate_embedding_similarity_matrix,
+)
+
+
+class LetterCounts:
+    # a tiny stand-in for a language model, which counts the calls and sentences it embeds
+    def __init__(self):
+        self.embedded = []
+
+    def __call__(self, sentences):
+        self.embedded.extend(sentences)
+        return [[sentence.lower().count(letter) for letter in "abcdefghijklmnopqrstuvwxyz"] for sentence in sentences]
+
+
+class TestEmbeddingCache:
+    def test_persists_between_instances(self, tmp_path):
+        cache = EmbeddingCache(tmp_path)
+        cache.add(["a", "b"], np.array([[1, 0], [0, 1]], dtype=np.float32))
+        cache.add(["c"], np.array([[1, 1]], dtype=np.float32))
+
+        reopened = EmbeddingCache(tmp_path)
+        assert len(reopened) == 3
+        vectors = reopened.get(["c", "a", "c"])
+        assert vectors.dtype == np.float32
+        assert (vectors == [[1, 1], [1, 0], [1, 1]]).all()
+
+    def test_concurrent_writers_keep_each_others_shards(self, tmp_path):
+        # two processes sharing the cache directory, each unaware of the other's shards
+        writer_1 = EmbeddingCache(tmp_path)
+        writer_2 = EmbeddingCache(tmp_path)
+        writer_1.add(["k1"], np.array([[1, 0]], dtype=np.float32))
+        writer_2.add(["k2"], np.array([[0, 1]], dtype=np.float32))
+
+        reopened = EmbeddingCache(tmp_path)
+        assert len(reopened) == 2
+        assert (reopened.get(["k1", "k2"]) == [[1, 0], [0, 1]]).all()
+        assert not list(tmp_path.glob("*.tmp"))
+
+    def test_shards_are_merged(self, tmp_path):
+        cache = EmbeddingCache(tmp_path, merge_factor=4)
+        for i in range(100):
+            cache.add([f"k{i}"], np.array([[i, 1]], dtype=np.float32))
+            assert len(cache.shards) <= 3 * 4
+
+        assert len(list(tmp_path.glob("*.keys.npy"))) == len(cache.shards) < 10
+        reopened = EmbeddingCache(tmp_path, merge_factor=4)
+        assert len(reopened) == 100
+        assert (reopened.get([f"k{i}" for i in range(100)]) == [[i, 1] for i in range(100)]).all()
+
+    def test_readers_keep_shards_merged_by_another_process(self, tmp_path):
+        writer = EmbeddingCache(tmp_path, merge_factor=2)
+        writer.add(["a"], np.array([[1, 0]], dtype=np.float32))
+        reader = EmbeddingCache(tmp_path, merge_factor=2)
+        writer.add(["b"], np.array([[0, 1]], dtype=np.float32))
+
+        assert len(list(tmp_path.glob("*.keys.npy"))) == 1
+        assert (reader.get(["a"]) == [[1, 0]]).all()
+        assert len(EmbeddingCache(tmp_path)) == 2
+
+
+class TestSentenceEmbedder:
+    def test_vectors_are_normalized(self, tmp_path):
+        embedder = SentenceEmbedder(cache_directory=tmp_path, embed=LetterCounts())
+        vectors = embedder.embed(["hello world", "", "abc"])
+
+        assert vectors.shape == (3, 26)
+        assert vectors.flags.c_contiguous
+        assert np.allclose(np.linalg.norm(vectors, axis=1), [1, 0, 1])
+
+    def test_only_new_sentences_are_embedded(self, tmp_path):
+        letter_counts = LetterCounts()
+        SentenceEmbedder(cache_directory=tmp_path, embed=letter_counts).embed(["one", "two", "one"])
+        assert letter_counts.embedded == ["one", "two"]
+
+        # a new revision, embedded by a new process sharing the same cache directory
+        embedder = SentenceEmbedder(cache_directory=tmp_path, embed=letter_counts, batch_size=1)
+        embedder.embed(["one", "three", "two", "four"])
+        assert letter_counts.embedded == ["one", "two", "three", "four"]
+
+    def test_models_have_separate_caches(self, tmp_path):
+        letter_counts = LetterCounts()
+        SentenceEmbedder("model_a", cache_directory=tmp_path, embed=letter_counts).embed(["one"])
+        SentenceEmbedder("model_b", cache_directory=tmp_path, embed=letter_counts).embed(["one"])
+        assert letter_counts.embedded == ["one", "one"]
+
+
+    def test_cache_directory_is_read_when_an_embedder_is_created(self, tmp_path, monkeypatch):
+        monkeypatch.setenv(CACHE_DIRECTORY_VARIABLE, str(tmp_path))
+        SentenceEmbedder("model", embed=LetterCounts()).embed(["one"])
+        assert len(EmbeddingCache(tmp_path / "model")) == 1
+
+    def test_importing_does_not_read_dotenv(self):
+        code = "import sys, alignment.approaches.approach_03; print('dotenv' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        assert result.stdout == "False\n"
+
+    def test_spacy_pipeline(self, tmp_path, monkeypatch):
+        spacy = pytest.importorskip("spacy")
+        nlp = spacy.blank("en")
+        for word, vector in {"cat": [3, 4, 0], "dog": [0, 0, 2]}.items():
+            nlp.vocab.set_vector(word, np.array(vector, dtype=np.float32))
+        nlp.to_disk(tmp_path / "model")
+        # spaCy loads a pipeline from a directory given in place of a package name
+        monkeypatch.chdir(tmp_path)
+
+        embedder = SentenceEmbedder("model", cache_directory=tmp_path / "cache", batch_size=1)
+        vectors = embedder.embed(["cat", "dog", "cat dog", "unknown"])
+        # a sentence is the mean of its word vectors
+        assert np.allclose(vectors, [[0.6, 0.8, 0], [0, 0, 1], np.array([3, 4, 2]) / 29 ** 0.5, [0, 0, 0]])
+        assert len(list((tmp_path / "cache" / "model").glob("*.keys.npy"))) == 1
+
+        cached_embedder = SentenceEmbedder("model", cache_directory=tmp_path / "cache")
+        assert np.array_equal(cached_embedder.embed(["dog", "cat"]), vectors[[1, 0]])
+        assert cached_embedder.nlp is None
+
+
+class TestEmbeddingSimilarityMatrix:
+    def test_similarity_matrix(self, tmp_path):
+        embedder = SentenceEmbedder(cache_directory=tmp_path, embed=LetterCounts())
+        sequence_1 = ["aaa", "bbb", "abab"]
+        sequence_2 = ["bb", "a", "zz"]
+        similarities = generate_embedding_similarity_matrix(sequence_1, sequence_2, embedder=embedder)
+
+        assert np.allclose(similarities, [[0, 1, 0], [1, 0, 0], [0.5 ** 0.5, 0.5 ** 0.5, 0]], atol=1e-6)
+
+        columns = np.array([[2, 1], [0, 0], [1, 2]])
+        sparse_similarities = generate_embedding_similarity_matrix(sequence_1, sequence_2, columns, embedder=embedder)
+        assert np.allclose(sparse_similarities, np.take_along_axis(similarities, columns, axis=1))
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from alignment import example, score_quality
+from alignment.approaches.approach_03 import Span, SpanAlignment
+from alignment.evaluation import Evaluation, canonicalize, evaluate, evaluate_documents, sort_alignments
+
+
+def count_alignments_by_scanning(alignments, expected_alignments):
+    # the original list-based implementation of score_quality.count_alignments
+    counts = {"expected": 0, "unexpected": 0, "unique": 0, "total": 0}
+    for i, alignment in enumerate(alignments):
+        counts["total"] += 1
+        if alignment in expected_alignments:
+            counts["expected"] += 1
+        else:
+            counts["unexpected"] += 1
+        if alignment not in alignments[:i]:
+            counts["unique"] += 1
+    return counts
+
+
+def generate_alignments(n):
+    sentences = [f"sentence {i}" for i in range(20)]
+    return [
+        (random.sample(sentences, random.randint(1, 2)), random.sample(sentences, random.randint(1, 2)))
+        for _ in range(n)
+    ]
+
+
+class TestEvaluate:
+    def test_counts_match_list_based_implementation(self):
+        random.seed(0)
+        for _ in range(20):
+            alignments = generate_alignments(30)
+            alignments += random.sample(alignments, 5)
+            expected_alignments = random.sample(alignments, 10) + generate_alignments(10)
+            assert (
+                score_quality.count_alignments(alignments, expected_alignments)
+                == count_alignments_by_scanning(alignments, expected_alignments)
+            )
+
+    def test_example(self):
+        alignments = example.expected_alignments[:-2] + [(["not expected"], ["at all"])]
+        result = evaluate(alignments, example.expected_alignments)
+
+        assert result.counts() == {"expected": 4, "unexpected": 1, "unique": 5, "total": 5}
+        assert result.missing == 2
+        assert result.precision == pytest.approx(4 / 5)
+        assert result.recall == pytest.approx(4 / 6)
+        assert result.f1 == pytest.approx(2 * (4 / 5) * (4 / 6) / (4 / 5 + 4 / 6))
+
+    def test_repeated_alignments_count_once_for_precision(self):
+        alignment = (["a"], ["A."])
+        result = evaluate([alignment, alignment], [alignment])
+
+        assert result.counts() == {"expected": 2, "unexpected": 0, "unique": 1, "total": 2}
+        assert result.precision == result.recall == result.f1 == 1.0
+
+    def test_empty(self):
+        result = evaluate([], [])
+        assert result.precision == result.recall == result.f1 == 0.0
+
+    def test_span_alignments(self):
+        alignments = [SpanAlignment(Span(0), Span(0), 0.9), SpanAlignment(Span(1, 3), Span(1))]
+        expected_alignments = [SpanAlignment(Span(0), Span(0)), SpanAlignment(Span(1), Span(1))]
+
+        assert canonicalize(alignments[1]) == ((1, 3), (1, 2))
+        result = evaluate(alignments, expected_alignments)
+        assert (result.matched, result.unexpected, result.missing) == (1, 1, 1)
+
+    def test_lists_and_tuples_are_equal(self):
+        assert canonicalize((["a", "b"], ["c"])) == canonicalize([("a", "b"), ("c",)])
+
+
+class TestEvaluateDocuments:
+    def test_total_is_micro_average(self):
+        documents = {
+            "first": ([(["a"], ["A"]), (["b"], ["C"])], [(["a"], ["A"]), (["b"], ["B"])]),
+            "second": ([(["x"], ["X"])], [(["x"], ["X"])]),
+        }
+        evaluations, total = evaluate_documents(documents)
+
+        assert evaluations["first"].f1 == pytest.approx(0.5)
+        assert evaluations["second"].f1 == 1.0
+        assert total == Evaluation(total=3, unique=3, expected=2, unexpected=1, matched=2, missing=1)
+        assert total.as_dict()["precision"] == pytest.approx(2 / 3)
+
+
+class TestSortAlignments:
+    def test_matches_score_quality_order(self):
+        alignments = [example.expected_alignments[2], (["nope"], ["no"]), example.expected_alignments[0]]
+        sorts = sort_alignments(alignments, example.expected_alignments)
+
+        assert sorts["expected"] == [example.expected_alignments[2], example.expected_alignments[0]]
+        assert sorts["unexpected"] == [(["nope"], ["no"])]
+        assert sorts["missing"] == [
+            alignment for i, alignment in enumerate(example.expected_alignments) if i not in (0, 2)
+        ]
@@ -0,0 +1,30 @@
+from alignment import example
+from alignment.approaches import approach_03
+from alignment.lsh import MinHashLSHIndex, align_sequences, generate_lsh_columns, shingle
+
+
+class TestMinHashLSHIndex:
+    def test_shingle(self):
+        assert shingle("Ab  cd", size=3) == {"ab ", "b c", " cd"}
+        assert shingle("ab", size=3) == {"ab"}
+
+    def test_query_finds_near_duplicates(self):
+        index = MinHashLSHIndex()
+        index.add(example.sequence_2)
+        assert 2 in index.query("this is my fourth sentence", top_k=3)
+        assert index.query("a completely unrelated line of text", top_k=3) == []
+
+
+class TestLSHColumns:
+    def test_columns_are_padded_and_sorted(self):
+        columns = generate_lsh_columns(example.sequence_1, example.sequence_2, top_k=4)
+        assert columns.shape == (len(example.sequence_1), 4)
+        assert (columns[:, 1:] >= columns[:, :-1]).all()
+        assert 0 in columns[0]
+
+    def test_small_inputs_use_dense_seeds(self):
+        weights = {"fuzz": 1.0, "distance": 0.05}, {"fuzz": 1.0}
+        assert (
+            align_sequences(example.sequence_1, example.sequence_2, *weights) ==
+            approach_03.align_sequences(example.sequence_1, example.sequence_2, *weights)
+        )
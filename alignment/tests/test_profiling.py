@@ -0,0 +1,101 @@
+import json
+import threading
+
+import pytest
+
+from alignment import example, profiling
+from alignment.approaches.approach_03 import align_sequences
+from alignment.benchmark import run_benchmarks
+from alignment.profiling import NULL_STAGE, Profiler
+
+
+class TestProfiler:
+    seed_weights = {"fuzz": 1.0, "distance": 0.05}
+    improvement_weights = {"fuzz": 1.0}
+
+    def align_example(self):
+        return align_sequences(example.sequence_1, example.sequence_2, self.seed_weights, self.improvement_weights)
+
+    def test_disabled_stages_do_nothing(self):
+        assert profiling.get_profiler() is None
+        assert profiling.stage("anything", cells=3) is NULL_STAGE
+
+    def test_records_every_stage_of_approach_03(self):
+        with Profiler() as profiler:
+            alignments = self.align_example()
+
+        assert alignments == self.align_example()
+        stats = profiler.stats
+        assert set(stats) == {
+            "align_sequences",
+            "seed_matrix",
+            "combination.fuzz",
+            "update.distance",
+            "seed_selection",
+            "suggestion",
+            "rescoring",
+            "selection",
+        }
+        assert stats["align_sequences"].calls == 1
+        assert stats["seed_matrix"].counts == {"rows": 8, "columns": 7, "cells": 56}
+        assert stats["seed_selection"].counts == {"seeds": 8}
+        assert stats["rescoring"].counts["alignments"] == stats["suggestion"].counts["candidates"] + 8
+        assert stats["selection"].counts["chosen"] == len(alignments)
+        # the seed matrix and every re-scored batch run the combination function
+        assert stats["combination.fuzz"].calls == 1 + stats["rescoring"].calls
+        assert stats["align_sequences"].seconds >= stats["seed_matrix"].seconds > 0
+
+    def test_profiler_is_only_active_inside_its_context(self):
+        with Profiler() as profiler:
+            assert profiling.get_profiler() is profiler
+        self.align_example()
+        assert profiling.get_profiler() is None
+        assert profiler.stats == {}
+
+    def test_nested_profilers(self):
+        with Profiler() as outer:
+            with Profiler() as inner:
+                self.align_example()
+            assert profiling.get_profiler() is outer
+        assert inner.stats and not outer.stats
+
+    def test_other_threads_are_not_profiled(self):
+        with Profiler() as profiler:
+            thread = threading.Thread(target=self.align_example)
+            thread.start()
+            thread.join()
+        assert profiler.stats == {}
+
+    def test_callback_and_exceptions(self):
+        records = []
+        with Profiler(callback=records.append, keep_records=False) as profiler:
+            with pytest.raises(ValueError):
+                with profiling.stage("failing", items=2) as stage:
+                    stage.count(items=1)
+                    raise ValueError
+
+        assert [(record.name, record.counts) for record in records] == [("failing", {"items": 3})]
+        assert profiler.records == []
+        assert profiler.as_dict() == {"failing": {"calls": 1, "seconds": records[0].seconds, "counts": {"items": 3}}}
+
+    def test_chrome_trace(self, tmp_path):
+        with Profiler() as profiler:
+            self.align_example()
+        profiler.save_chrome_trace(tmp_path / "trace.json")
+
+        with open(tmp_path / "trace.json") as file:
+            events = json.load(file)["traceEvents"]
+        assert len(events) == len(profiler.records)
+        assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+
+        # every stage lies within the whole run
+        [outer] = [event for event in events if event["name"] == "align_sequences"]
+        for event in events:
+            assert outer["ts"] <= event["ts"] and event["ts"] + event["dur"] <= outer["ts"] + outer["dur"] + 1e-3
+
+
+class TestBenchmarkStages:
+    def test_benchmark_reports_stages_of_approach_03(self):
+        [result_00, result_03] = run_benchmarks([20], ["approach_00", "approach_03"], trace_memory=False)
+        assert result_00.stages is None
+        assert result_03.stages["seed_matrix"]["counts"]["rows"] == 20
@@ -0,0 +1,62 @@
+import sqlite3
+import time
+
+import pytest
+
+from alignment.response_cache import ResponseCache, response_cache_key
+
+
+class TestResponseCache:
+    def test_key(self):
+        key = response_cache_key("prompt", "deployment", "1")
+        assert key == response_cache_key("prompt", "deployment", "1")
+        assert key != response_cache_key("prompt", "other deployment", "1")
+        assert key != response_cache_key("prompt", "deployment", "2")
+        assert key != response_cache_key("other prompt", "deployment", "1")
+
+    def test_persists(self, tmp_path):
+        cache = ResponseCache(tmp_path / "responses.sqlite")
+        assert cache.get("key") is None
+        cache.set("key", "response")
+        cache.close()
+
+        cache = ResponseCache(tmp_path / "responses.sqlite")
+        assert cache.get("key") == "response"
+        assert (cache.hits, cache.misses) == (1, 0)
+
+    def test_ttl(self, tmp_path):
+        cache = ResponseCache(tmp_path / "responses.sqlite", ttl=0.05)
+        cache.set("key", "response")
+        assert cache.get("key") == "response"
+        time.sleep(0.1)
+        assert cache.get("key") is None
+
+        # expired entries are dropped on the next write
+        cache.set("other key", "response")
+        assert len(cache) == 1
+
+    def test_least_recently_used_entries_are_evicted(self, tmp_path):
+        cache = ResponseCache(tmp_path / "responses.sqlite", max_entries=2)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        time.sleep(0.01)
+        cache.get("a")
+        cache.set("c", "3")
+
+        assert len(cache) == 2
+        assert cache.get("b") is None
+        assert cache.get("a") == "1"
+        assert cache.get("c") == "3"
+
+    def test_read_only(self, tmp_path):
+        path = tmp_path / "responses.sqlite"
+        assert ResponseCache(path, read_only=True).get("key") is None
+        assert not path.exists()
+
+        ResponseCache(path).set("key", "response")
+        cache = ResponseCache(path, read_only=True)
+        cache.set("other key", "response")
+        assert cache.get("key") == "response"
+        assert cache.get("other key") is None
+        with pytest.raises(sqlite3.OperationalError):
+            cache.connection.execute("DELETE FROM responses")
@@ -0,0 +1,36 @@
+import numpy as np
+from fuzzywuzzy import fuzz
+
+from alignment.score_matrix import generate_fuzz_ratio_matrix
+
+
+class TestFuzzRatioMatrix:
+    sequence_1 = ["hello", "world", "hello", "", "a longer sentence with words"]
+    sequence_2 = ["hollow", "word", "hello", "sentence with longer words"]
+
+    def expected_score_matrix(self):
+        return np.array([
+            [fuzz.ratio(string_1, string_2) / 100 for string_2 in self.sequence_2]
+            for string_1 in self.sequence_1
+        ])
+
+    def test_matches_fuzz_ratio(self):
+        score_matrix = generate_fuzz_ratio_matrix(self.sequence_1, self.sequence_2)
+        assert (score_matrix == self.expected_score_matrix()).all()
+
+    def test_unnormalized(self):
+        score_matrix = generate_fuzz_ratio_matrix(self.sequence_1, self.sequence_2, normalize=False)
+        assert (score_matrix == 100 * self.expected_score_matrix()).all()
+
+    def test_preallocated_float32_buffer(self):
+        out = np.full((len(self.sequence_1), len(self.sequence_2)), -1, dtype=np.float32)
+        score_matrix = generate_fuzz_ratio_matrix(self.sequence_1, self.sequence_2, out=out)
+        assert score_matrix is out
+        assert (score_matrix == self.expected_score_matrix().astype(np.float32)).all()
+
+    def test_process_pool(self):
+        score_matrix = generate_fuzz_ratio_matrix(self.sequence_1, self.sequence_2, workers=2, block_size=1)
+        assert (score_matrix == self.expected_score_matrix()).all()
+
+    def test_empty_sequence(self):
+        assert generate_fuzz_ratio_matrix([], self.sequence_2).shape == (0, len(self.sequence_2))
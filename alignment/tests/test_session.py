@@ -0,0 +1,120 @@
+import random
+
+import numpy as np
+import pytest
+
+from alignment import example
+from alignment.approaches import approach_03
+from alignment.approaches.approach_03 import align_span_sequences, generate_combination_score_matrix
+from alignment.session import AlignmentSession
+
+
+def normalize(sentences):
+    return " ".join(sentence.lower().rstrip(".") for sentence in sentences)
+
+
+class TestAlignmentSession:
+    seed_weights = {"fuzz": 1.0, "distance": 0.05}
+    improvement_weights = {"fuzz": 1.0}
+
+    def generate_sequences(self, length):
+        random.seed(0)
+        words = "apple river stone cloud forest engine garden silver market window candle bridge".split()
+        sequence_1 = [f"sentence {i} mentions the {' '.join(random.sample(words, 3))}" for i in range(length)]
+        sequence_2 = [sentence.capitalize() + "." for sentence in sequence_1]
+        return sequence_1, sequence_2
+
+    def test_initial_alignments_match_approach_03(self):
+        session = AlignmentSession(example.sequence_1, example.sequence_2, self.seed_weights, self.improvement_weights)
+        expected_span_alignments = align_span_sequences(
+            example.sequence_1, example.sequence_2, self.seed_weights, self.improvement_weights,
+        )
+        assert session.span_alignments == sorted(expected_span_alignments)
+
+    def test_score_matrix_matches_full_recomputation_after_edits(self):
+        sequence_1, sequence_2 = self.generate_sequences(30)
+        session = AlignmentSession(sequence_1, sequence_2, self.seed_weights, self.improvement_weights)
+        session.insert(1, 4, ["A new sentence.", "And another one."])
+        session.delete(2, 10, 13)
+        session.replace(2, 0, 1, ["A rewritten first sentence."])
+        session.replace(1, 20, 22, ["Two sentences became one."])
+
+        assert session.sequence_1[4:6] == ["A new sentence.", "And another one."]
+        assert len(session.sequence_2) == 27
+        np.testing.assert_allclose(
+            session.score_matrix,
+            generate_combination_score_matrix(session.sequence_1, session.sequence_2, self.seed_weights),
+        )
+
+    def test_edit_only_scores_new_sentences(self, monkeypatch):
+        sequence_1, sequence_2 = self.generate_sequences(30)
+        session = AlignmentSession(sequence_1, sequence_2, self.seed_weights, self.improvement_weights)
+
+        scored_shapes = []
+        generate_fuzz_score_matrix = approach_03.COMBINATION_FUNCTIONS["fuzz"]
+
+        def record_shape(sequence_1, sequence_2, columns=None):
+            scored_shapes.append((len(sequence_1), len(sequence_2)))
+            return generate_fuzz_score_matrix(sequence_1, sequence_2, columns)
+
+        monkeypatch.setitem(approach_03.COMBINATION_FUNCTIONS, "fuzz", record_shape)
+        session.insert(2, 7, ["An inserted sentence."])
+        # the new column against the whole document, then only the candidates around the edit
+        assert scored_shapes[0] == (30, 1)
+        assert all(length_1 < 30 and length_2 < 30 for length_1, length_2 in scored_shapes[1:])
+
+    def test_inserted_sentences_are_aligned_in_place(self):
+        sequence_1, sequence_2 = self.generate_sequences(30)
+        session = AlignmentSession(sequence_1, sequence_2, self.seed_weights, self.improvement_weights)
+        session.insert(1, 12, ["the inserted sentence about a lighthouse"])
+        session.insert(2, 12, ["The inserted sentence about a lighthouse."])
+
+        assert any(
+            "the inserted sentence about a lighthouse" in sentences_1
+            and "The inserted sentence about a lighthouse." in sentences_2
+            for sentences_1, sentences_2 in session.string_alignments()
+        )
+        assert all(normalize(alignment[0]) == normalize(alignment[1]) for alignment in session.string_alignments())
+
+    def test_deleted_sentence_is_no_longer_aligned(self):
+        sequence_1, sequence_2 = self.generate_sequences(30)
+        session = AlignmentSession(sequence_1, sequence_2, self.seed_weights, self.improvement_weights)
+        deleted = session.sequence_2[5]
+        session.delete(2, 5, 6)
+
+        aligned_2 = [sentence for _, sentences_2 in session.string_alignments() for sentence in sentences_2]
+        assert deleted not in aligned_2
+        assert len(aligned_2) == 29
+
+    def test_random_edits_cover_as_much_as_full_realignment(self):
+        sequence_1, sequence_2 = self.generate_sequences(80)
+        session = AlignmentSession(sequence_1, sequence_2, self.seed_weights, self.improvement_weights)
+        for k in range(15):
+            side = random.choice([1, 2])
+            sequence = session.sequence_1 if side == 1 else session.sequence_2
+            index = random.randrange(len(sequence))
+            edit = random.choice(["insert", "delete", "replace"])
+            if edit == "insert":
+                session.insert(side, index, [f"new sentence {k}"])
+            elif edit == "delete":
+                session.delete(side, index, index + 1)
+            else:
+                session.replace(side, index, index + 1, [sequence[index] + " with an edit"])
+
+        span_alignments = align_span_sequences(
+            session.sequence_1, session.sequence_2, self.seed_weights, self.improvement_weights,
+        )
+        covered = sum(i.span_1.end - i.span_1.start for i in session.span_alignments)
+        expected_covered = sum(i.span_1.end - i.span_1.start for i in span_alignments)
+        assert covered >= expected_covered - 2
+
+        for span_alignment in session.span_alignments:
+            others = [i for i in session.span_alignments if i is not span_alignment]
+            assert not any(span_alignment.overlaps(i) for i in others)
+
+    def test_invalid_edits_raise(self):
+        session = AlignmentSession(example.sequence_1, example.sequence_2, self.seed_weights, self.improvement_weights)
+        with pytest.raises(ValueError):
+            session.insert(3, 0, ["A sentence."])
+        with pytest.raises(ValueError):
+            session.delete(1, 5, 100)
@@ -0,0 +1,98 @@
+import itertools
+import random
+import string
+
+from alignment import example
+from alignment.approaches.approach_03 import align_sequences
+from alignment.streaming import align_sequence_streams
+
+
+class TestAlignSequenceStreams:
+    seed_weights = {"fuzz": 1.0, "distance": 0.05}
+    improvement_weights = {"fuzz": 1.0}
+
+    def test_single_window_matches_approach_03(self):
+        alignments = align_sequence_streams(
+            iter(example.sequence_1), iter(example.sequence_2), self.seed_weights, self.improvement_weights,
+        )
+        expected_alignments = align_sequences(
+            example.sequence_1, example.sequence_2, self.seed_weights, self.improvement_weights,
+        )
+        assert sorted(alignments) == sorted(expected_alignments)
+
+    def test_small_windows_mostly_match_single_window(self):
+        random.seed(0)
+        words = "apple river stone cloud forest engine garden silver market window candle bridge".split()
+        sequence_1 = [f"sentence {i} mentions the {' '.join(random.sample(words, 3))}" for i in range(60)]
+        sequence_2 = []
+        for i, sentence in enumerate(sequence_1):
+            if i % 7 == 3:
+                continue
+            if i % 9 == 4:
+                sequence_2[-1] = sequence_2[-1][:-1] + ", and " + sentence + "."
+            else:
+                sequence_2.append(sentence.capitalize() + ".")
+
+        alignments = list(align_sequence_streams(
+            iter(sequence_1), iter(sequence_2), self.seed_weights, self.improvement_weights,
+            window_size=12,
+            overlap=4,
+        ))
+        expected_alignments = align_sequences(sequence_1, sequence_2, self.seed_weights, self.improvement_weights)
+
+        # alignments are yielded in document order, and only differ from a single window near window boundaries
+        positions = [sequence_1.index(alignment[0][0]) for alignment in alignments]
+        assert positions == sorted(positions)
+        assert sum(alignment in expected_alignments for alignment in alignments) >= 0.9 * len(expected_alignments)
+
+    def test_streams_are_read_lazily(self):
+        stream_1 = iter(example.sequence_1 * 100)
+        stream_2 = iter(example.sequence_2 * 100)
+        alignments = align_sequence_streams(
+            stream_1, stream_2, self.seed_weights, self.improvement_weights, window_size=16, overlap=4,
+        )
+        next(alignments)
+        assert len(list(itertools.islice(stream_1, 1000))) > 700
+
+    def count_expected_alignments(self, alignments, expected_pairs):
+        # the number of alignments each expected pair of sentences is found in; neighbouring pairs may be merged
+        return [
+            sum(s1 in sentences_1 and s2 in sentences_2 for sentences_1, sentences_2 in alignments)
+            for s1, s2 in expected_pairs
+        ]
+
+    def test_uneven_stream_lengths(self):
+        sequence_1 = [f"sentence number {i} is about the {word}" for i, word in enumerate("abcdefghij")]
+        sequence_2 = [sentence.capitalize() + "." for sentence in sequence_1]
+        expected_pairs = list(zip(sequence_1, sequence_2))
+        sequence_2 += [f"filler {i} has nothing in common with anything" for i in range(10)]
+
+        for window_size, overlap in [(6, 2), (12, 4), (40, 10)]:
+            alignments = list(align_sequence_streams(
+                iter(sequence_1), iter(sequence_2), self.seed_weights, self.improvement_weights,
+                window_size=window_size,
+                overlap=overlap,
+            ))
+            # no sentence of the shorter stream is dropped or aligned twice
+            aligned_1 = sorted(sentence for sentences_1, _ in alignments for sentence in sentences_1)
+            assert aligned_1 == sorted(sequence_1)
+            assert self.count_expected_alignments(alignments, expected_pairs) == [1] * len(expected_pairs)
+
+    def test_sentences_moved_across_window_boundaries(self):
+        random.seed(0)
+        sequence_1 = [
+            " ".join("".join(random.choices(string.ascii_lowercase, k=random.randint(3, 8))) for _ in range(6))
+            for _ in range(40)
+        ]
+        sequence_2 = [sentence.capitalize() + "." for sentence in sequence_1]
+        expected_pairs = list(zip(sequence_1, sequence_2))
+        for source, destination in [(7, 10), (15, 12), (25, 29)]:
+            sequence_2.insert(destination, sequence_2.pop(source))
+
+        for window_size, overlap in [(6, 2), (8, 2), (10, 3), (12, 4), (16, 6), (50, 10)]:
+            alignments = list(align_sequence_streams(
+                iter(sequence_1), iter(sequence_2), self.seed_weights, self.improvement_weights,
+                window_size=window_size,
+                overlap=overlap,
+            ))
+            assert self.count_expected_alignments(alignments, expected_pairs) == [1] * len(expected_pairs)
@@ -0,0 +1,94 @@
+import numpy as np
+
+from alignment import example
+from alignment.approaches.approach_03 import align_sequences
+from alignment.tfidf import (
+    TermMatrix,
+    char_ngrams,
+    fit_tfidf,
+    generate_term_matrices,
+    generate_tfidf_similarity_matrix,
+    multiply_transposed,
+    word_ngrams,
+)
+
+
+def to_dense(matrix: TermMatrix) -> np.array:
+    dense = np.zeros((len(matrix), matrix.n_terms))
+    dense[matrix.row_indices(), matrix.indices] = matrix.data
+    return dense
+
+
+class TestTfidfSimilarityMatrix:
+    sequence_1 = ["The cat sat on the mat.", "A dog barked loudly", "", "the cat sat on the mat"]
+    sequence_2 = ["the cat sat on a mat", "Dogs bark loudly!", "something else entirely"]
+
+    def test_ngrams(self):
+        assert word_ngrams("The cat, sat") == ["the", "cat", "sat", "the cat", "cat sat"]
+        assert char_ngrams("Cat sat") == [" ca", "cat", "at ", " sa", "sat", "at "]
+
+    def test_rows_are_normalized(self):
+        matrix_1, matrix_2 = generate_term_matrices(self.sequence_1, self.sequence_2, char_ngrams)
+        norms = np.linalg.norm(to_dense(matrix_1), axis=1)
+        assert np.allclose(norms, [1, 1, 0, 1])
+        assert np.allclose(np.linalg.norm(to_dense(matrix_2), axis=1), 1)
+
+    def test_sparse_product_matches_dense_product(self):
+        for analyzer in (word_ngrams, char_ngrams):
+            matrix_1, matrix_2 = generate_term_matrices(self.sequence_1, self.sequence_2, analyzer)
+            expected = to_dense(matrix_1) @ to_dense(matrix_2).T
+            # every term scattered cell by cell in tiny chunks, and every term multiplied densely
+            assert np.allclose(multiply_transposed(matrix_1, matrix_2, dense_fraction=1.0, chunk_size=3), expected)
+            assert np.allclose(multiply_transposed(matrix_1, matrix_2, dense_fraction=0.0), expected)
+
+    def test_similarity_matrix(self):
+        similarities = generate_tfidf_similarity_matrix(self.sequence_1, self.sequence_2)
+
+        assert similarities.shape == (4, 3)
+        assert similarities[0].argmax() == 0
+        assert similarities[1].argmax() == 1
+        assert (similarities[2] == 0).all()
+        # case and punctuation are not terms
+        assert similarities[3, 0] == similarities[0, 0]
+        assert (0 <= similarities).all() and (similarities <= 1).all()
+
+    def test_columns_match_full_matrix(self):
+        similarities = generate_tfidf_similarity_matrix(self.sequence_1, self.sequence_2)
+        columns = np.array([[0, 2], [1, 2], [0, 1], [0, 0]])
+        sparse_similarities = generate_tfidf_similarity_matrix(self.sequence_1, self.sequence_2, columns=columns)
+        assert np.allclose(sparse_similarities, np.take_along_axis(similarities, columns, axis=1))
+
+    def test_fitted_weights_score_pairs_independently_of_the_batch(self):
+        term_weights = fit_tfidf([*self.sequence_1, *self.sequence_2])
+        batch_1 = [self.sequence_1[0], self.sequence_1[0] + " " + self.sequence_1[1], self.sequence_1[3]]
+        batch_2 = [self.sequence_2[0], "the cat and the dog", "an unseen sentence"]
+        columns = np.arange(3)[:, np.newaxis]
+
+        batch_scores = generate_tfidf_similarity_matrix(batch_1, batch_2, columns=columns, term_weights=term_weights)
+        for string_1, string_2, score in zip(batch_1, batch_2, batch_scores[:, 0]):
+            pair_score = generate_tfidf_similarity_matrix([string_1], [string_2], term_weights=term_weights)[0, 0]
+            assert pair_score == score
+
+        # weights fitted on both sequences are the ones the sequences would be scored with anyway
+        similarities = generate_tfidf_similarity_matrix(self.sequence_1, self.sequence_2)
+        assert np.array_equal(
+            similarities,
+            generate_tfidf_similarity_matrix(self.sequence_1, self.sequence_2, term_weights=term_weights),
+        )
+
+    def test_alignments_do_not_depend_on_the_batch_size(self):
+        weights = {"seed_weights": {"tfidf": 1.0, "distance": 0.05}, "improvement_weights": {"tfidf": 1.0}}
+        alignments = align_sequences(example.sequence_1, example.sequence_2, **weights)
+        for batch_size in (1, 3, 7):
+            batched_alignments = align_sequences(example.sequence_1, example.sequence_2, **weights, batch_size=batch_size)
+            assert batched_alignments == alignments
+
+    def test_align_sequences(self):
+        alignments = align_sequences(
+            example.sequence_1,
+            example.sequence_2,
+            seed_weights={"tfidf": 1.0, "distance": 0.05},
+            improvement_weights={"tfidf": 1.0},
+        )
+        matches = [alignment for alignment in alignments if alignment in example.expected_alignments]
+        assert len(matches) >= 5
@@ -0,0 +1,223 @@
+import collections
+import dataclasses
+import math
+import re
+from typing import List, Tuple, Optional, Callable, Dict
+
+import numpy as np
+
+Analyzer = Callable[[str], List[str]]
+
+
+@dataclasses.dataclass
+class TermMatrix:
+    # a sparse document-term matrix in CSR layout: row i holds the weights data[indptr[i]:indptr[i + 1]] of the terms
+    # indices[indptr[i]:indptr[i + 1]], sorted by term
+    indptr: np.array
+    indices: np.array
+    data: np.array
+    n_terms: int
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def row_indices(self) -> np.array:
+        return np.repeat(np.arange(len(self)), np.diff(self.indptr))
+
+
+def tokenize(sentence: str) -> List[str]:
+    return re.findall(r"\w+", sentence.lower())
+
+
+def word_ngrams(sentence: str, sizes: Tuple[int, ...] = (1, 2)) -> List[str]:
+    words = tokenize(sentence)
+    return [" ".join(words[i:i + size]) for size in sizes for i in range(len(words) - size + 1)]
+
+
+def char_ngrams(sentence: str, sizes: Tuple[int, ...] = (3,)) -> List[str]:
+    # n-grams never cross word boundaries, and padding each word with spaces marks its first and last characters
+    padded_words = [f" {word} " for word in tokenize(sentence)]
+    return [word[i:i + size] for word in padded_words for size in sizes for i in range(len(word) - size + 1)]
+
+
+@dataclasses.dataclass
+class TermWeights:
+    # the vocabulary and inverse document frequencies of one analyzer, fitted once on a set of documents so that
+    # strings scored in different batches are weighted alike; terms not seen when fitting are weighted as if they were
+    # found in no document
+    analyzer: Analyzer
+    vocabulary: Dict[str, int]
+    idf: np.array
+    unseen_idf: float
+
+
+def fit_term_weights(documents: List[str], analyzer: Analyzer) -> TermWeights:
+    vocabulary: Dict[str, int] = {}
+    terms = [{vocabulary.setdefault(term, len(vocabulary)) for term in analyzer(document)} for document in documents]
+    document_frequencies = np.bincount(
+        np.fromiter((term for document_terms in terms for term in document_terms), dtype=np.intp),
+        minlength=len(vocabulary),
+    )
+    idf = np.log((1 + len(documents)) / (1 + document_frequencies)) + 1
+    return TermWeights(analyzer, vocabulary, idf, math.log(1 + len(documents)) + 1)
+
+
+def generate_term_matrices(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        analyzer: Analyzer,
+        term_weights: Optional[TermWeights] = None,
+) -> Tuple[TermMatrix, TermMatrix]:
+    # both sequences share one vocabulary and one set of document frequencies, so their rows are comparable; unless
+    # term weights are given, they are fitted on both sequences
+    if term_weights is None:
+        term_weights = fit_term_weights([*sequence_1, *sequence_2], analyzer)
+    vocabulary = term_weights.vocabulary
+    unseen_terms: Dict[str, int] = {}
+
+    def term_index(term: str) -> int:
+        index = vocabulary.get(term)
+        if index is None:
+            index = unseen_terms.setdefault(term, len(vocabulary) + len(unseen_terms))
+        return index
+
+    counts = [collections.Counter(map(term_index, analyzer(sentence))) for sentence in [*sequence_1, *sequence_2]]
+    idf = np.concatenate([term_weights.idf, np.full(len(unseen_terms), term_weights.unseen_idf)])
+
+    matrix = build_term_matrix(counts, idf)
+    split = matrix.indptr[len(sequence_1)]
+    return (
+        TermMatrix(matrix.indptr[:len(sequence_1) + 1], matrix.indices[:split], matrix.data[:split], len(idf)),
+        TermMatrix(
+            matrix.indptr[len(sequence_1):] - split,
+            matrix.indices[split:],
+            matrix.data[split:],
+            len(idf),
+        ),
+    )
+
+
+def build_term_matrix(counts: List[collections.Counter], idf: np.array) -> TermMatrix:
+    indptr = np.zeros(len(counts) + 1, dtype=np.intp)
+    np.cumsum([len(row_counts) for row_counts in counts], out=indptr[1:])
+    indices = np.fromiter((term for row_counts in counts for term in sorted(row_counts)), dtype=np.intp)
+    data = np.fromiter(
+        (row_counts[term] for row_counts in counts for term in sorted(row_counts)),
+        dtype=np.float64,
+        count=len(indices),
+    )
+    data *= idf[indices]
+
+    # rows are L2-normalized, so the dot product of two rows is their cosine similarity
+    row_indices = np.repeat(np.arange(len(counts)), np.diff(indptr))
+    norms = np.sqrt(np.bincount(row_indices, data ** 2, minlength=len(counts)))
+    data /= norms[row_indices]
+    return TermMatrix(indptr, indices, data, len(idf))
+
+
+def multiply_transposed(
+        matrix_1: TermMatrix,
+        matrix_2: TermMatrix,
+        dense_fraction: float = 0.01,
+        chunk_size: int = 1 << 22,
+) -> np.array:
+    # matrix_1 @ matrix_2.T as a dense array; only terms found in both matrices contribute
+    products = np.zeros((len(matrix_1), len(matrix_2)))
+    rows_1, data_1, starts_1 = group_by_term(matrix_1)
+    rows_2, data_2, starts_2 = group_by_term(matrix_2)
+    counts_1, counts_2 = np.diff(starts_1), np.diff(starts_2)
+    pair_counts = counts_1 * counts_2
+
+    # terms shared by many rows would touch a large part of the output one cell at a time, so they are multiplied
+    # as dense columns instead
+    frequent = pair_counts > dense_fraction * products.size
+    if frequent.any():
+        products += to_dense_columns(matrix_1, frequent) @ to_dense_columns(matrix_2, frequent).T
+
+    # every other term adds the outer product of its weights in both matrices, scattered in chunks of cells
+    terms = np.flatnonzero(pair_counts * ~frequent)
+    chunk_ends = np.searchsorted(np.cumsum(pair_counts[terms]), np.arange(chunk_size, pair_counts.sum(), chunk_size))
+    for chunk in np.split(terms, np.unique(chunk_ends)):
+        chunk_pair_counts = pair_counts[chunk]
+        if not chunk_pair_counts.sum():
+            continue
+        pair_terms = np.repeat(chunk, chunk_pair_counts)
+        pair_offsets = np.arange(chunk_pair_counts.sum()) - np.repeat(
+            np.cumsum(chunk_pair_counts) - chunk_pair_counts,
+            chunk_pair_counts,
+        )
+        entries_1 = starts_1[pair_terms] + pair_offsets // counts_2[pair_terms]
+        entries_2 = starts_2[pair_terms] + pair_offsets % counts_2[pair_terms]
+        np.add.at(
+            products.ravel(),
+            rows_1[entries_1] * len(matrix_2) + rows_2[entries_2],
+            data_1[entries_1] * data_2[entries_2],
+        )
+    return products
+
+
+def group_by_term(matrix: TermMatrix) -> Tuple[np.array, np.array, np.array]:
+    # the CSC layout of the matrix: rows[starts[t]:starts[t + 1]] are the rows containing term t
+    order = np.argsort(matrix.indices, kind="stable")
+    starts = np.zeros(matrix.n_terms + 1, dtype=np.intp)
+    np.cumsum(np.bincount(matrix.indices, minlength=matrix.n_terms), out=starts[1:])
+    return matrix.row_indices()[order], matrix.data[order], starts
+
+
+def to_dense_columns(matrix: TermMatrix, terms: np.array) -> np.array:
+    # the columns of the matrix selected by the boolean mask `terms`, as a dense array
+    selected = terms[matrix.indices]
+    dense = np.zeros((len(matrix), terms.sum()))
+    dense[matrix.row_indices()[selected], (np.cumsum(terms) - 1)[matrix.indices[selected]]] = matrix.data[selected]
+    return dense
+
+
+def multiply_transposed_pairs(matrix_1: TermMatrix, matrix_2: TermMatrix, columns: np.array) -> np.array:
+    # products[i, k] is the dot product of row i of matrix_1 with row columns[i, k] of matrix_2; every term of row i is
+    # looked up in row columns[i, k] at once by binary search over the (row, term) keys of matrix_2
+    pair_rows = np.repeat(np.arange(len(columns)), columns.shape[1])
+    pair_columns = columns.ravel()
+    lengths = np.diff(matrix_1.indptr)[pair_rows]
+    pair_indices = np.repeat(np.arange(len(pair_rows)), lengths)
+    entries = np.repeat(matrix_1.indptr[pair_rows] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+    keys_2 = matrix_2.row_indices() * matrix_2.n_terms + matrix_2.indices
+    if len(keys_2) == 0:
+        return np.zeros(columns.shape)
+
+    keys = pair_columns[pair_indices] * matrix_2.n_terms + matrix_1.indices[entries]
+    positions = np.minimum(np.searchsorted(keys_2, keys), len(keys_2) - 1)
+    found = keys_2[positions] == keys
+    products = matrix_1.data[entries] * np.where(found, matrix_2.data[positions], 0)
+    return np.bincount(pair_indices, products, minlength=len(pair_rows)).reshape(columns.shape)
+
+
+ANALYZERS: Tuple[Analyzer, ...] = (word_ngrams, char_ngrams)
+
+
+def fit_tfidf(documents: List[str], analyzers: Tuple[Analyzer, ...] = ANALYZERS) -> List[TermWeights]:
+    return [fit_term_weights(documents, analyzer) for analyzer in analyzers]
+
+
+def generate_tfidf_similarity_matrix(
+        sequence_1: List[str],
+        sequence_2: List[str],
+        columns: Optional[np.array] = None,
+        analyzers: Tuple[Analyzer, ...] = ANALYZERS,
+        term_weights: Optional[List[TermWeights]] = None,
+) -> np.array:
+    # the mean cosine similarity over the analyzers: words reward shared phrasing, characters tolerate spelling and
+    # inflection changes. Term weights from fit_tfidf replace the analyzers, and keep the score of a pair of strings
+    # from depending on the other strings scored with it
+    if term_weights is None:
+        term_weights = fit_tfidf([*sequence_1, *sequence_2], analyzers)
+    similarities = np.zeros((len(sequence_1), len(sequence_2)) if columns is None else columns.shape)
+    for weights in term_weights:
+        matrix_1, matrix_2 = generate_term_matrices(sequence_1, sequence_2, weights.analyzer, weights)
+        if columns is None:
+            similarities += multiply_transposed(matrix_1, matrix_2)
+        else:
+            similarities += multiply_transposed_pairs(matrix_1, matrix_2, columns)
+    similarities /= len(term_weights)
+    # rounding can push the similarity of identical sentences just past 1
+    return np.minimum(similarities, 1.0, out=similarities)